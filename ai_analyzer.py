@@ -1,49 +1,111 @@
 import requests
+import contextvars
+import hashlib
 import json
+import itertools
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import config
+import database
+import email_templates
+import email_text
+import metrics
+from pre_classifier import classify_email
 
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "llama3.2:3b"
 
-def call_ollama(prompt):
-    """Call Ollama API to analyze text"""
-    try:
-        response = requests.post(
-            OLLAMA_API_URL,
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "num_predict": 200
-                }
-            },
-            timeout=300
-        )
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Get the shared keep-alive HTTP session used for Ollama calls"""
+    global _session
+    
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=max(config.OLLAMA_CONCURRENCY, 1)
+            )
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+def record_usage(result):
+    """Record the token counts and timings Ollama reports with a response"""
+    if 'prompt_eval_count' in result:
+        metrics.OLLAMA_PROMPT_TOKENS.observe(result['prompt_eval_count'])
+    if 'eval_count' in result:
+        metrics.OLLAMA_EVAL_TOKENS.observe(result['eval_count'])
+    # Durations are reported in nanoseconds
+    if 'prompt_eval_duration' in result:
+        metrics.OLLAMA_PROMPT_EVAL_SECONDS.inc(result['prompt_eval_duration'] / 1e9)
+    if 'eval_duration' in result:
+        metrics.OLLAMA_EVAL_SECONDS.inc(result['eval_duration'] / 1e9)
+
+def call_ollama(prompt, num_predict=200, num_ctx=None, schema=None):
+    """Call Ollama API to analyze text.
+    
+    With a JSON schema the reply is constrained to match it (or to plain
+    JSON when OLLAMA_STRUCTURED_OUTPUT is off).
+    """
+    session = get_session()
+    
+    options = {
+        "temperature": 0.1,
+        "num_predict": num_predict
+    }
+    if num_ctx:
+        options["num_ctx"] = num_ctx
+    
+    request = {
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": False,
+        "options": options
+    }
+    if schema:
+        request["format"] = schema if config.OLLAMA_STRUCTURED_OUTPUT else "json"
+    
+    for attempt in range(config.OLLAMA_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(config.OLLAMA_RETRY_BACKOFF * (2 ** (attempt - 1)))
         
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', '').strip()
-        else:
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = session.post(OLLAMA_API_URL, json=request, timeout=config.OLLAMA_TIMEOUT)
+            
+            if response.status_code == 200:
+                result = response.json()
+                outcome = 'ok'
+                record_usage(result)
+                return result.get('response', '').strip()
+            
+            outcome = 'http_error'
             print(f"Ollama API error: {response.status_code}")
+            if response.status_code < 500:
+                return None
+                
+        except requests.exceptions.Timeout:
+            outcome = 'timeout'
+            print("Ollama API timeout")
+        except requests.exceptions.ConnectionError as e:
+            outcome = 'connection_error'
+            print(f"Ollama connection error: {e}")
+        except Exception as e:
+            print(f"Error calling Ollama: {e}")
             return None
-            
-    except requests.exceptions.Timeout:
-        print("Ollama API timeout")
-        return None
-    except Exception as e:
-        print(f"Error calling Ollama: {e}")
-        return None
-
-def extract_job_info(email_data):
-    """Extract job application info using AI"""
-    
-    subject = email_data.get('subject', '')
-    sender = email_data.get('from', '')
-    body = email_data.get('body', '')[:2000]
+        finally:
+            metrics.OLLAMA_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
     
-    prompt = f"""Extract job info from this email as JSON only:
+    return None
+
+PROMPT_TEMPLATE = """Extract job info from this email as JSON only:
 
 Subject: {subject}
 From: {sender}
@@ -60,50 +122,410 @@ Rules:
 
 JSON:"""
 
-    response = call_ollama(prompt)
+BATCH_PROMPT_TEMPLATE = """Extract job info from each of the {count} emails below as JSON only.
+
+{emails}
+Return a JSON array with exactly one object per email, in the same order:
+[{{"index": 1, "company": "name", "role": "title", "status": "Applied|Interview|Assessment|Rejected|Offer|Other", "is_job_related": true}}]
+
+Rules:
+- index: the email number
+- company: extract from sender or body
+- role: job position title
+- status: Applied if confirmation, Interview if scheduling, Rejected if "unfortunately", Other if unclear
+- is_job_related: false only for spam/promotions
+
+JSON:"""
+
+BATCH_EMAIL_TEMPLATE = """Email {index}:
+Subject: {subject}
+From: {sender}
+Body: {body}
+"""
+
+REPAIR_PROMPT_TEMPLATE = """{prompt} {reply}
+
+These fields were missing or invalid: {fields}. Reply with JSON containing only those fields.
+
+JSON:"""
+
+EXTRACTED_FIELDS = ['company', 'role', 'status', 'is_job_related']
+STATUSES = ['Applied', 'Interview', 'Assessment', 'Rejected', 'Offer', 'Other']
+# Free-form statuses mapped onto STATUSES, checked in this order
+STATUS_KEYWORDS = [
+    ('Rejected', ('reject', 'declin', 'unsuccessful', 'not selected', 'not moving')),
+    ('Offer', ('offer',)),
+    ('Interview', ('interview', 'screen', 'call')),
+    ('Assessment', ('assess', 'test', 'challenge', 'assignment')),
+    ('Applied', ('appl', 'receiv', 'submit', 'confirm')),
+    ('Other', ('other', 'unknown', 'unclear', 'n/a', 'none'))
+]
+# Placeholders models write instead of leaving a field empty
+EMPTY_VALUES = {'unknown', 'n/a', 'na', 'none', 'null', 'not specified', 'not mentioned'}
+
+FIELD_SCHEMAS = {
+    'company': {'type': 'string', 'maxLength': 60},
+    'role': {'type': 'string', 'maxLength': 80},
+    'status': {'type': 'string', 'enum': STATUSES},
+    'is_job_related': {'type': 'boolean'}
+}
+# Generation cap for one extraction; the schema's maxLengths keep a reply within it
+ITEM_TOKENS = 64
+
+def object_schema(fields):
+    """JSON schema for an object with exactly these extraction fields"""
+    return {
+        'type': 'object',
+        'properties': {field: FIELD_SCHEMAS[field] for field in fields},
+        'required': list(fields)
+    }
+
+EXTRACTION_SCHEMA = object_schema(EXTRACTED_FIELDS)
+BATCH_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': dict({'index': {'type': 'integer'}}, **EXTRACTION_SCHEMA['properties']),
+        'required': ['index'] + EXTRACTED_FIELDS
+    }
+}
+
+# Changes whenever a template or schema is edited, invalidating cached extractions
+PROMPT_VERSION = hashlib.sha256(
+    (PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE + BATCH_EMAIL_TEMPLATE + REPAIR_PROMPT_TEMPLATE
+     + json.dumps([EXTRACTION_SCHEMA, BATCH_SCHEMA], sort_keys=True)).encode('utf-8')
+).hexdigest()[:12]
+
+def extraction_hash(subject, sender, body):
+    """Hash everything that influences an extraction result"""
+    key = '\x1f'.join([subject, sender, body, PROMPT_VERSION, MODEL_NAME])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def email_fields(email_data):
+    """The (subject, sender, body excerpt) that go into a prompt"""
+    return (
+        email_data.get('subject', ''),
+        email_data.get('from', ''),
+        email_text.prompt_excerpt(email_data.get('body', ''))
+    )
+
+def extract_without_llm(email_data):
+    """Answer from the extraction cache, the rule-based classifier or a
+    template learned from the sender's earlier emails.
+    
+    Returns (data, source), or (None, None) if the LLM is needed.
+    """
+    message_id = email_data.get('id')
+    if message_id:
+        data = database.get_cached_extraction(message_id, extraction_hash(*email_fields(email_data)))
+        if data is not None:
+            return data, 'cache'
+    
+    data = classify_email(email_data)
+    if data is not None:
+        return data, 'rules'
+    
+    data = email_templates.match_template(email_data)
+    if data is not None:
+        return data, 'template'
+    
+    return None, None
+
+def finish_extraction(email_data, data, source):
+    """Cache and learn from a fresh LLM result, and attach the email metadata"""
+    subject, sender, body = email_fields(email_data)
+    message_id = email_data.get('id')
+    
+    if source == 'llm':
+        result = {key: data[key] for key in EXTRACTED_FIELDS}
+        email_templates.learn_template(email_data, result)
+        if message_id:
+            database.save_cached_extraction(
+                message_id, extraction_hash(subject, sender, body), PROMPT_VERSION, MODEL_NAME, result
+            )
+    
+    data['email_subject'] = subject
+    data['email_from'] = sender
+    data['email_date'] = email_data.get('date', '')
+    data['email_body'] = email_data.get('body', '')
+    data['source'] = source
+    data['message_id'] = message_id
+    
+    return data
+
+def extract_job_info(email_data):
+    """Extract job application info using AI"""
+    data, source = extract_without_llm(email_data)
+    
+    if data is None:
+        subject, sender, body = email_fields(email_data)
+        data = request_extraction(PROMPT_TEMPLATE.format(
+            subject=subject, sender=sender, body=body
+        ))
+        source = 'llm'
+        
+        if data is None:
+            return None
+    
+    return finish_extraction(email_data, data, source)
+
+def normalize_status(value):
+    """Map a status reply onto STATUSES, or None if it can't be placed"""
+    if not isinstance(value, str):
+        return None
     
+    text = value.strip().lower()
+    for status in STATUSES:
+        if text == status.lower():
+            return status
+    for status, keywords in STATUS_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return status
+    return None
+
+def validate_extraction(data):
+    """Check and normalize a parsed extraction.
+    
+    Returns (clean fields, names of the fields that are missing or
+    invalid). A job-related email also needs a company to be filed under.
+    """
+    if not isinstance(data, dict):
+        return {}, list(EXTRACTED_FIELDS)
+    
+    clean, invalid = {}, []
+    
+    is_job = data.get('is_job_related')
+    if isinstance(is_job, str) and is_job.strip().lower() in ('true', 'false'):
+        is_job = is_job.strip().lower() == 'true'
+    if isinstance(is_job, bool):
+        clean['is_job_related'] = is_job
+    else:
+        invalid.append('is_job_related')
+    
+    for field in ('company', 'role'):
+        value = data.get(field)
+        if value is None and is_job is False:
+            value = ''
+        if not isinstance(value, str):
+            invalid.append(field)
+            continue
+        value = ' '.join(value.split())
+        clean[field] = '' if value.lower() in EMPTY_VALUES else value[:FIELD_SCHEMAS[field]['maxLength']]
+    
+    status = normalize_status(data.get('status'))
+    if status:
+        clean['status'] = status
+    else:
+        invalid.append('status')
+    
+    if clean.get('is_job_related') and clean.get('company') == '':
+        invalid.append('company')
+    
+    return ({field: clean[field] for field in EXTRACTED_FIELDS if field in clean},
+            [field for field in EXTRACTED_FIELDS if field in invalid])
+
+def parse_extraction(response):
+    """Parse the model's JSON object reply, or None if there isn't one"""
     if not response:
         return None
     
+    # Replies without a schema may still come wrapped in prose or code fences
+    response = re.sub(r'```json\n?|\n?```', '', response).strip()
+    json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
+    if json_match:
+        response = json_match.group()
+    
     try:
-        response = re.sub(r'```json\n?|\n?```', '', response)
-        response = response.strip()
-        
-        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
-        if json_match:
-            response = json_match.group()
-        
         data = json.loads(response)
-        
-        if not all(key in data for key in ['company', 'role', 'status', 'is_job_related']):
-            print(f"Missing fields in: {response[:100]}")
-            return None
-        
-        data['email_subject'] = subject
-        data['email_from'] = sender
-        data['email_date'] = email_data.get('date', '')
-        
-        return data
-        
-    except json.JSONDecodeError as e:
-        print(f"JSON parse error: {response[:150]}")
+    except json.JSONDecodeError:
         return None
-    except Exception as e:
-        print(f"Error: {e}")
+    return data if isinstance(data, dict) else None
+
+def request_extraction(prompt):
+    """Ask the model for one extraction, repairing invalid fields once.
+    
+    The reply is constrained to EXTRACTION_SCHEMA. Fields that still fail
+    validation are asked for again on their own, continuing the original
+    prompt so Ollama can reuse its cached prefix. Returns the clean
+    fields, or None.
+    """
+    reply = call_ollama(prompt, num_predict=ITEM_TOKENS, schema=EXTRACTION_SCHEMA)
+    if reply is None:
         return None
+    
+    data, invalid = validate_extraction(parse_extraction(reply))
+    if not invalid:
+        return data
+    
+    metrics.LLM_PARSE_FAILURES.inc(kind='single')
+    print(f"Invalid {', '.join(invalid)} in: {reply[:100]}")
+    
+    repair_prompt = REPAIR_PROMPT_TEMPLATE.format(prompt=prompt, reply=reply, fields=', '.join(invalid))
+    repaired = parse_extraction(call_ollama(repair_prompt, num_predict=ITEM_TOKENS, schema=object_schema(invalid)))
+    if repaired:
+        data, invalid = validate_extraction(dict(data, **{field: repaired[field] for field in invalid if field in repaired}))
+    
+    metrics.LLM_REPAIRS.inc(result='failed' if invalid else 'fixed')
+    return None if invalid else data
+
+def parse_batch_extraction(response, count):
+    """Parse a JSON array reply into a list of `count` extractions.
+    
+    Items that are missing or invalid come back as None so they can be
+    retried on their own.
+    """
+    results = [None] * count
+    if not response:
+        return results
+    
+    response = re.sub(r'```json\n?|\n?```', '', response)
+    start, end = response.find('['), response.rfind(']')
+    if start == -1 or end <= start:
+        metrics.LLM_PARSE_FAILURES.inc(kind='batch')
+        print(f"JSON parse error: {response[:150]}")
+        return results
+    
+    try:
+        items = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        metrics.LLM_PARSE_FAILURES.inc(kind='batch')
+        print(f"JSON parse error: {response[:150]}")
+        return results
+    
+    if not isinstance(items, list):
+        metrics.LLM_PARSE_FAILURES.inc(kind='batch')
+        return results
+    
+    for position, item in enumerate(items):
+        data, invalid = validate_extraction(item)
+        if invalid:
+            continue
+        index = item.get('index', position + 1)
+        if isinstance(index, int) and 1 <= index <= count and results[index - 1] is None:
+            results[index - 1] = data
+    
+    if None in results:
+        metrics.LLM_PARSE_FAILURES.inc(results.count(None), kind='batch_item')
+    return results
+
+def extract_job_info_batch(emails):
+    """Extract job info for several emails with a single prompt.
+    
+    The instructions are sent once for the whole batch, so prompt prefill
+    is shared. Emails the cache or rules can answer never reach the
+    model, and items the model gets wrong fall back to extract_job_info.
+    Returns a list of (email, job_info) pairs.
+    """
+    results = []
+    pending = []
+    
+    for email in emails:
+        data, source = extract_without_llm(email)
+        if data is None:
+            pending.append(email)
+        else:
+            results.append((email, finish_extraction(email, data, source)))
+    
+    if not pending:
+        return results
+    
+    blocks = []
+    for index, email in enumerate(pending, 1):
+        subject, sender, body = email_fields(email)
+        blocks.append(BATCH_EMAIL_TEMPLATE.format(index=index, subject=subject, sender=sender, body=body))
+    prompt = BATCH_PROMPT_TEMPLATE.format(count=len(pending), emails='\n'.join(blocks))
+    
+    num_predict = ITEM_TOKENS * len(pending) + 16
+    # Ollama truncates prompts beyond num_ctx (2048 tokens by default)
+    num_ctx = len(prompt) // 3 + num_predict
+    
+    reply = call_ollama(prompt, num_predict=num_predict, num_ctx=num_ctx, schema=BATCH_SCHEMA)
+    parsed = parse_batch_extraction(reply, len(pending))
+    
+    for email, data in zip(pending, parsed):
+        if data is None:
+            results.append((email, extract_job_info(email)))
+        else:
+            results.append((email, finish_extraction(email, data, 'llm')))
+    
+    return results
+
+def extract_group(group):
+    """Worker task: extract one group of emails, batched if it has several"""
+    if len(group) > 1:
+        return extract_job_info_batch(group)
+    return [(group[0], extract_job_info(group[0]))]
+
+def iter_job_info(emails, max_workers=None, batch_size=None):
+    """Extract job info from emails in parallel.
+    
+    `emails` may be any iterable, including a generator that is still
+    fetching; it is consumed lazily so only a few groups per worker are
+    in memory at once. Yields (email, job_info) pairs in completion
+    order, so callers can report progress as soon as each Ollama response
+    arrives. With a batch_size above 1, each request packs that many
+    emails into one prompt.
+    """
+    if max_workers is None:
+        max_workers = config.OLLAMA_CONCURRENCY
+    if batch_size is None:
+        batch_size = config.OLLAMA_BATCH_SIZE
+    max_workers = max(max_workers, 1)
+    batch_size = max(batch_size, 1)
+    
+    database.purge_extraction_cache(PROMPT_VERSION, MODEL_NAME)
+    
+    emails = iter(emails)
+    
+    def next_group():
+        return list(itertools.islice(emails, batch_size))
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = {}
+    
+    def submit_next():
+        group = next_group()
+        if group:
+            # Run under a copy of the caller's context so the scan's metrics breakdown sees it
+            context = contextvars.copy_context()
+            in_flight[executor.submit(context.run, extract_group, group)] = group
+        return bool(group)
+    
+    # Closing the generator early (a cancelled scan) drops queued requests
+    try:
+        for _ in range(max_workers * 2):
+            if not submit_next():
+                break
+        
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                group = in_flight.pop(future)
+                try:
+                    pairs = future.result()
+                except Exception as e:
+                    print(f"Error: {e}")
+                    pairs = [(email, None) for email in group]
+                
+                for email, job_info in pairs:
+                    yield email, job_info
+                
+                submit_next()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 def analyze_emails(emails):
     """Analyze multiple emails and extract job info"""
-    print(f"\n🤖 Analyzing {len(emails)} emails with Mistral 7B AI...")
+    print(f"\n🤖 Analyzing {len(emails)} emails with {MODEL_NAME} "
+          f"({config.OLLAMA_CONCURRENCY} parallel requests)...")
     
     results = []
     skipped = 0
     
-    for i, email in enumerate(emails, 1):
+    for i, (email, job_info) in enumerate(iter_job_info(emails), 1):
         print(f"  [{i}/{len(emails)}] {email['subject'][:50]}...", end=" ")
         
-        job_info = extract_job_info(email)
-        
         if job_info:
             if job_info.get('is_job_related'):
                 results.append(job_info)
@@ -1,83 +1,211 @@
 import os
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
-import threading
+from collections import Counter
+import gzip
 import database
-from email_fetcher import fetch_job_emails
-from ai_analyzer import analyze_emails
+import config
+import exporter
+import metrics
+from scan_events import EventBus, format_sse
+from scan_jobs import ScanRunner, ScanCancelled
+
+try:
+    import brotli
+except ImportError:  # Optional; JSON is gzipped instead
+    brotli = None
 
 app = Flask(__name__, static_folder='frontend')
 CORS(app)
 
-# Initialize database
-database.init_database()
-
-# Track scan status
-scan_status = {
+# Scan status, shared between the scan threads and request threads, per
+# account and combined. Every change is also pushed to /api/scan/events
+# subscribers.
+scan_status = EventBus({
+    'job_id': None,
+    'account': None,
+    'accounts': {},
     'running': False,
     'progress': 0,
     'message': '',
     'total_emails': 0,
     'processed': 0
-}
+})
+
+SCAN_MODES = ('full', 'incremental')
 
-def run_scan_job(days_back):
-    """Background job to scan emails"""
-    global scan_status
+def run_scan_job(job, cancelled):
+    """Scan emails for a scan job; run by scan_runner's workers.
+    
+    Emails stream through fetch -> classify/extract -> save, and results
+    are committed every SCAN_COMMIT_EVERY emails together with the list
+    of messages still to do. If the process dies mid-scan, the next scan
+    resumes from that checkpoint instead of starting over. `cancelled` is
+    checked after each email; a cancelled scan keeps what it saved, drops
+    its checkpoint and raises ScanCancelled. Returns the scan_jobs fields
+    to record.
+    """
+    # The Gmail and Ollama clients are the heaviest imports; load them
+    # with the first scan instead of at server start
+    import email_fetcher
+    from ai_analyzer import iter_job_info
+    
+    account = job['account']
+    days_back, mode = job['days_back'], job['mode']
+    
+    def update_status(event_type='progress', **changes):
+        scan_status.update_account(account, event_type, **changes)
     
     try:
-        scan_status['running'] = True
-        scan_status['message'] = 'Fetching emails from Gmail...'
-        scan_status['progress'] = 10
+        update_status('started', job_id=job['id'], running=True, processed=0,
+                      total_emails=0, progress=5, message=f'Fetching emails from {account}...')
         
-        # Fetch emails
-        emails = fetch_job_emails(days_back=days_back)
-        scan_status['total_emails'] = len(emails)
-        scan_status['progress'] = 30
+        service = email_fetcher.get_gmail_service(account)
+        checkpoint = database.get_scan_checkpoint(account)
         
-        if not emails:
-            scan_status['message'] = 'No emails found'
-            scan_status['running'] = False
-            return
+        if checkpoint:
+            message_ids = checkpoint['pending_ids']
+            keyword_filter = bool(checkpoint['keyword_filter'])
+            total = checkpoint['total_emails']
+            message = f'Resuming interrupted scan ({len(message_ids)} emails left)...'
+        else:
+            message_ids, history_id, keyword_filter = email_fetcher.plan_sync(days_back, mode, service, account)
+            database.start_scan_checkpoint(account, days_back, mode, history_id, keyword_filter, message_ids)
+            total = len(message_ids)
+            message = f'Analyzing {total} emails with AI...'
         
-        scan_status['message'] = f'Analyzing {len(emails)} emails with AI...'
-        scan_status['progress'] = 40
+        update_status(total_emails=total, message=message)
+        done = total - len(message_ids)
         
-        # Analyze emails
-        job_applications = []
-        for i, email in enumerate(emails):
-            scan_status['processed'] = i + 1
-            scan_status['progress'] = 40 + int((i / len(emails)) * 50)
-            scan_status['message'] = f'Analyzing email {i+1}/{len(emails)} with AI (may take 1-2 min per email)...'
+        skipped = []  # Message ids dropped by the fetch stage's filters
+        pending = []  # (email, job_info) pairs waiting for the next commit
+        
+        def fetched_emails():
+            for message_id, email in email_fetcher.iter_emails(service, message_ids, keyword_filter, account):
+                if email is None:
+                    skipped.append(message_id)
+                else:
+                    yield email
+        
+        def commit():
+            nonlocal done
+            jobs = [job for _, job in pending if job and job.get('is_job_related')]
+            sources = Counter(job['source'] for _, job in pending if job)
+            finished_ids = [email['id'] for email, _ in pending] + skipped
             
-            from ai_analyzer import extract_job_info
-            job_info = extract_job_info(email)
+            saved = database.save_scan_progress(
+                account, jobs, finished_ids,
+                emails_scanned=len(pending),
+                llm_calls=len(pending) - sources['cache'] - sources['rules'] - sources['template'],
+                rule_decisions=sources['rules'],
+                cache_hits=sources['cache'],
+                template_hits=sources['template']
+            )
             
-            if job_info and job_info.get('is_job_related'):
-                job_applications.append(job_info)
-        
-        scan_status['message'] = 'Saving to database...'
-        scan_status['progress'] = 90
+            if saved:
+                scan_status.publish('jobs', saved)
+            
+            done += len(finished_ids)
+            pending.clear()
+            skipped.clear()
+            status = scan_status['accounts'][account]
+            database.update_scan_job(job['id'], progress=status['progress'], message=status['message'])
         
-        # Save to database
-        added = 0
-        for job in job_applications:
-            if database.add_job_to_db(job):
-                added += 1
+        for email, job_info in iter_job_info(fetched_emails()):
+            pending.append((email, job_info))
+            scan_status.publish('email', email_result(email, job_info, account))
+            
+            processed = done + len(pending) + len(skipped)
+            update_status(processed=processed,
+                          progress=5 + int(processed / max(total, 1) * 90),
+                          message=f'Analyzed {processed}/{total} emails with AI...')
+            
+            if len(pending) >= config.SCAN_COMMIT_EVERY:
+                commit()
+            
+            if cancelled():
+                commit()
+                database.discard_scan_checkpoint(account)
+                raise ScanCancelled()
+        commit()
         
-        # Record scan history
-        database.add_scan_history(days_back, len(emails), len(job_applications))
+        totals = database.finish_scan_checkpoint(account, metrics.current_breakdown())
+        message = f"Complete! Found {totals['jobs_found']} jobs, added {totals['jobs_added']} new"
+        if totals['unfetched']:
+            message += f"; {totals['unfetched']} emails Gmail failed to return are left for the next scan"
         
-        scan_status['message'] = f'Complete! Found {len(job_applications)} jobs, added {added} new'
-        scan_status['progress'] = 100
-        scan_status['running'] = False
+        update_status('complete', processed=total, progress=100, running=False, message=message)
+        return {'progress': 100, 'message': message,
+                'jobs_found': totals['jobs_found'], 'jobs_added': totals['jobs_added']}
         
+    except ScanCancelled:
+        update_status('cancelled', message='Scan cancelled', running=False, progress=0)
+        raise
     except Exception as e:
-        scan_status['message'] = f'Error: {str(e)}'
-        scan_status['running'] = False
-        scan_status['progress'] = 0
+        update_status('failed', message=f'Error: {str(e)}', running=False, progress=0)
+        raise
+
+scan_runner = ScanRunner(run_scan_job)
+
+@app.before_request
+def start_scan_runner():
+    """Start the scan workers with the first request (not in the reloader's parent process)"""
+    scan_runner.start()
+
+@app.after_request
+def cache_and_compress(response):
+    """Give JSON responses an ETag and compress them for clients that accept it.
+    
+    A request whose If-None-Match matches gets an empty 304, so polling
+    an unchanged resource costs almost nothing. ETags are weak because
+    they are the same for every encoding of the body; a strong one set
+    by the route is weakened when the body gets compressed.
+    """
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    if not response.get_etag()[0]:
+        response.add_etag(weak=True)
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    
+    body = response.get_data()
+    if len(body) < config.COMPRESS_MIN_BYTES:
+        return response
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=config.BROTLI_QUALITY))
+        response.content_encoding = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=config.GZIP_LEVEL))
+        response.content_encoding = 'gzip'
+    else:
+        return response
+    
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def email_result(email, job_info, account=None):
+    """What a scan event says about one analyzed email"""
+    job_info = job_info or {}
+    return {
+        'id': email['id'],
+        'account': account,
+        'subject': email.get('subject', ''),
+        'is_job_related': bool(job_info.get('is_job_related')),
+        'company': job_info.get('company'),
+        'role': job_info.get('role'),
+        'status': job_info.get('status'),
+        'source': job_info.get('source')
+    }
 
 @app.route('/')
 def index():
@@ -86,35 +214,224 @@ def index():
 
 @app.route('/api/jobs', methods=['GET'])
 def get_jobs():
-    """Get all job applications"""
-    jobs = database.get_all_jobs()
-    return jsonify(jobs)
+    """Get job applications.
+    
+    Without paging parameters this returns every job as a list, or only
+    those of `account`. With `limit` or `cursor` it returns one page,
+    {'jobs': [...], 'next_cursor', 'sync_cursor'}, filtered by account,
+    status, company (prefix), date_from/date_to and sorted by
+    `sort`/`order`; `fields` is a comma-separated column projection.
+    
+    With `since`, a sync_cursor from earlier, it returns only what changed
+    after it: {'jobs': [changed rows], 'deleted': [ids], 'cursor', 'more'}.
+    since=0 returns every job.
+    """
+    args = request.args
+    if 'since' in args:
+        since = args.get('since', type=int)
+        if since is None or since < 0:
+            return jsonify({'error': f"Invalid since cursor: {args['since']}"}), 400
+        jobs, deleted, cursor, more = database.get_job_changes(
+            since, limit=config.JOB_CHANGES_LIMIT, account=args.get('account'))
+        return jsonify({'jobs': jobs, 'deleted': deleted, 'cursor': cursor, 'more': more})
+    
+    if not any(key in args for key in ('limit', 'cursor', 'status', 'company',
+                                       'date_from', 'date_to', 'sort', 'fields')):
+        return jsonify(database.get_all_jobs(account=args.get('account')))
+    
+    fields = args.get('fields')
+    # Read first: changes made while the page is read are then in the next delta
+    sync_cursor = database.get_change_cursor()
+    try:
+        jobs, next_cursor = database.get_jobs(
+            status=args.get('status'),
+            company=args.get('company'),
+            date_from=args.get('date_from'),
+            date_to=args.get('date_to'),
+            sort=args.get('sort', 'date_applied'),
+            order=args.get('order', 'desc'),
+            limit=min(max(args.get('limit', 50, type=int), 1), 500),
+            cursor=args.get('cursor'),
+            fields=fields.split(',') if fields else None,
+            account=args.get('account')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'jobs': jobs, 'next_cursor': next_cursor, 'sync_cursor': sync_cursor})
+
+@app.route('/api/job/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a single job application with all its columns"""
+    job = database.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/job/<int:job_id>/timeline', methods=['GET'])
+def get_job_timeline(job_id):
+    """Every status seen for a job, oldest first"""
+    events = database.get_job_timeline(job_id)
+    if events is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job_id, 'events': events})
+
+@app.route('/api/search', methods=['GET'])
+def search_jobs():
+    """Full-text search over applications, best matches first with snippets.
+    
+    `recent=N` ranks only the newest N applications (older ones only if
+    those don't fill the page), trading recall for speed on huge tables;
+    `recent=0` ranks every match. Without it, searches matching more than
+    SEARCH_RANK_MAX_MATCHES applications rank only about that many of the
+    newest.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    results = database.search_jobs(query, status=request.args.get('status'), limit=limit,
+                                   account=request.args.get('account'),
+                                   recent=request.args.get('recent', type=int))
+    return jsonify(results)
+
+@app.route('/api/export', methods=['GET'])
+def export_jobs():
+    """Download all applications as xlsx, csv or parquet, streamed from the database"""
+    fmt = request.args.get('format', 'xlsx')
+    try:
+        exporter.check_format(fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(
+        stream_with_context(exporter.stream_export(fmt)),
+        mimetype=exporter.EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=job_applications.{fmt}'}
+    )
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """Get statistics"""
-    stats = database.get_stats()
-    return jsonify(stats)
+    """Get statistics, or 304 Not Modified if the client's copy is current"""
+    # Weak, as the body may be sent gzip- or Brotli-compressed
+    etag = f'stats-{database.get_stats_version()}'
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(database.get_stats())
+    
+    response.set_etag(etag, weak=True)
+    # Let browsers keep the stats but check back every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/accounts', methods=['GET'])
+def get_accounts():
+    """Configured Gmail accounts and whether each has been signed in"""
+    return jsonify([{
+        'account': account,
+        'default': account == config.GMAIL_ADDRESS,
+        'authorized': os.path.exists(token_file)
+    } for account, token_file in config.GMAIL_ACCOUNTS.items()])
 
 @app.route('/api/scan', methods=['POST'])
 def start_scan():
-    """Start email scan"""
-    if scan_status['running']:
-        return jsonify({'error': 'Scan already running'}), 400
+    """Queue a scan of `account`, or one per configured account; returns the job ids.
     
+    Scans of different accounts run in parallel, up to SCAN_WORKERS.
+    """
     data = request.json
     days_back = data.get('days_back', 60)
+    mode = data.get('mode', request.args.get('mode', 'full'))
+    account = data.get('account')
+    
+    if mode not in SCAN_MODES:
+        return jsonify({'error': f'Unknown scan mode: {mode}'}), 400
+    if account and account not in config.GMAIL_ACCOUNTS:
+        return jsonify({'error': f'Unknown account: {account}'}), 400
+    
+    jobs = []
+    for name in [account] if account else list(config.GMAIL_ACCOUNTS):
+        job = scan_runner.submit(name, days_back, mode)
+        if not scan_status['accounts'].get(name, {}).get('running'):
+            scan_status.update_account(name, 'queued', job_id=job['id'], running=True, progress=0,
+                                       processed=0, total_emails=0, message='Starting scan...')
+        jobs.append(job)
     
-    # Start scan in background thread
-    thread = threading.Thread(target=run_scan_job, args=(days_back,))
-    thread.start()
+    return jsonify({'message': 'Scan queued', 'job_id': jobs[0]['id'], 'job': jobs[0], 'jobs': jobs,
+                    'status': scan_status.snapshot()}), 202
+
+@app.route('/api/scan/<int:job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    """State of a scan job: queued, running, cancelled, done or failed"""
+    job = database.get_scan_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/scan/<int:job_id>/cancel', methods=['POST'])
+def cancel_scan_job(job_id):
+    """Cancel a scan job; a running scan stops after the email it is on"""
+    job = database.get_scan_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan not found'}), 404
+    if job['state'] not in ('queued', 'running'):
+        return jsonify({'error': f"Scan already {job['state']}", 'job': job}), 409
     
-    return jsonify({'message': 'Scan started', 'status': scan_status})
+    job = scan_runner.cancel(job_id)
+    # A queued job never reaches run_scan_job, which reports running ones
+    if job['state'] == 'cancelled':
+        scan_status.update_account(job['account'], 'cancelled', job_id=job_id, progress=0,
+                                   running=scan_runner.has_jobs(job['account']),
+                                   message='Scan cancelled')
+    return jsonify(job)
 
 @app.route('/api/scan/status', methods=['GET'])
 def get_scan_status():
     """Get current scan status"""
-    return jsonify(scan_status)
+    return jsonify(scan_status.snapshot())
+
+@app.route('/api/scan/events', methods=['GET'])
+def scan_events():
+    """Server-sent events for scans: status, queued, started, progress, email, jobs,
+    complete, cancelled and failed.
+    
+    A new connection first gets a `status` event with the current state.
+    A reconnecting EventSource sends Last-Event-ID and gets the events it
+    missed instead. Idle streams get a keep-alive comment now and then.
+    """
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None or last_id > scan_status.last_id:
+        last_id = None
+    
+    def stream():
+        after_id = last_id
+        if after_id is None:
+            after_id = scan_status.last_id
+            yield format_sse({'id': after_id, 'type': 'status', 'data': scan_status.snapshot()})
+        
+        while True:
+            events = scan_status.wait_for_events(after_id, timeout=config.SCAN_EVENT_KEEPALIVE)
+            if not events:
+                yield ': keep-alive\n\n'
+            for event in events:
+                yield format_sse(event)
+                after_id = event['id']
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/scan/history', methods=['GET'])
+def get_scan_history():
+    """Get recent scans, of every account or `account`, including how many emails
+    skipped the LLM and where the time went"""
+    return jsonify(database.get_scan_history(account=request.args.get('account')))
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Gmail, Ollama and database timings in the Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/job/<int:job_id>', methods=['PUT'])
 def update_job(job_id):
@@ -138,4 +455,5 @@ if __name__ == '__main__':
     print("   - Update status and add notes")
     print("\n" + "=" * 70 + "\n")
     
+    database.init_database()
     app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
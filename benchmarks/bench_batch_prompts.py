@@ -0,0 +1,59 @@
+"""Benchmark one-email prompts vs. multi-email batched prompts on a stub server.
+
+The stub charges prefill time per prompt character, so the repeated
+instruction template is what batching saves. Reports emails/sec, Ollama
+requests, and the share of extractions that needed a single-email retry.
+
+Usage: python benchmarks/bench_batch_prompts.py [emails] [failure rate] [batch sizes...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+import config
+import database
+from stub_ollama import StubOllamaServer, make_emails
+
+def make_job_emails(count):
+    # Subjects the rule-based classifier cannot settle, so every email reaches the model
+    emails = make_emails(count, spam_ratio=0)
+    for email in emails:
+        email['subject'] = 'Update on your candidacy ' + email['id']
+        email['body'] = 'Hello, there is news about the role you applied for. ' * 8
+    return emails
+
+def run(tmp, emails, batch_size, failure_rate):
+    database.DB_FILE = os.path.join(tmp, f'batch{batch_size}.db')
+    database.init_database()
+    
+    with StubOllamaServer(latency=0.05, prefill_per_kchar=0.05, decode_per_item=0.02,
+                          failure_rate=failure_rate, slots=1) as stub:
+        ai_analyzer.OLLAMA_API_URL = stub.url
+        start = time.perf_counter()
+        results = list(ai_analyzer.iter_job_info(emails, max_workers=4, batch_size=batch_size))
+        elapsed = time.perf_counter() - start
+        
+        failed = sum(1 for _, job_info in results if job_info is None)
+        batches = -(-len(emails) // batch_size) if batch_size > 1 else 0
+        retries = stub.requests - batches if batch_size > 1 else 0
+        print(f"  batch={batch_size:<3} {len(emails) / elapsed:7.2f} emails/sec  "
+              f"{stub.requests:4d} requests  {stub.prompt_chars / len(emails):7.0f} prompt chars/email  "
+              f"retried {retries / len(emails):6.1%}  failed {failed / len(emails):6.1%}")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    sizes = [int(size) for size in sys.argv[3:]] or [1, 4, 8]
+    
+    emails = make_job_emails(count)
+    # The synthetic emails all share one template; keep every one going to the stub
+    config.TEMPLATE_MIN_AGREEMENTS = count + 1
+    print(f"\n{count} emails, {failure_rate:.0%} of generated items malformed, one model slot\n")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            run(tmp, emails, size, failure_rate)
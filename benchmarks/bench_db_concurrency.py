@@ -0,0 +1,112 @@
+"""Hammer /api/jobs with readers while a simulated scan inserts jobs.
+
+Runs once with the pooled WAL connections and once emulating the old
+access pattern (fresh connection per call, rollback journal, full sync),
+reporting read latency, read throughput, write rate and lock errors. The
+writer commits 10 rows per transaction at a fixed pace, like a scan does,
+so both runs read a table of the same size.
+
+Usage: python benchmarks/bench_db_concurrency.py [seconds] [readers] [preloaded rows] [commits/sec]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+LEGACY_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+def make_jobs(start, count):
+    return [{
+        'company': f'Company {i % 500}',
+        'role': f'Engineer {i}',
+        'status': 'Applied',
+        'email_date': '2025-10-20',
+        'email_subject': f'Application received #{i}',
+        'email_from': 'noreply@example.com'
+    } for i in range(start, start + count)]
+
+def run(name, tmp, seconds, readers, preload, commit_rate, legacy):
+    database.DB_FILE = os.path.join(tmp, f'{name}.db')
+    database.PRAGMAS = dict(DEFAULT_PRAGMAS, **LEGACY_PRAGMAS) if legacy else dict(DEFAULT_PRAGMAS)
+    database.init_database()
+    database.add_jobs_to_db(make_jobs(0, preload))
+    database.close_connection()
+    
+    import app
+    client = app.app.test_client()
+    
+    stop = threading.Event()
+    latencies = []
+    write_latencies = []
+    errors = []
+    written = [0]
+    
+    def done_with_connection():
+        if legacy:
+            database.close_connection()
+    
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                response = client.get('/api/jobs')
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            except Exception as e:
+                errors.append(str(e))
+            latencies.append(time.perf_counter() - start)
+            done_with_connection()
+    
+    def writer():
+        next_id = preload
+        while not stop.wait(1 / commit_rate):
+            start = time.perf_counter()
+            try:
+                if legacy:
+                    for job in make_jobs(next_id, 10):
+                        database.add_job_to_db(job)
+                else:
+                    database.add_jobs_to_db(make_jobs(next_id, 10))
+                written[0] += 10
+            except Exception as e:
+                errors.append(str(e))
+            write_latencies.append(time.perf_counter() - start)
+            next_id += 10
+            done_with_connection()
+    
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    print(f"  {name:<8} reads {len(latencies) / seconds:7.1f}/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.1f} ms  p99 {p99 * 1000:7.1f} ms  "
+          f"writes {written[0] / seconds:6.1f} rows/s  "
+          f"commit p50 {statistics.median(write_latencies) * 1000:6.1f} ms  errors {len(errors)}")
+
+DEFAULT_PRAGMAS = dict(database.PRAGMAS)
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    preload = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    commit_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 20
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # app.py initializes its default database on import
+        print(f"\n{readers} readers on /api/jobs, 1 writer at {commit_rate:g} commits/s, "
+              f"{preload} preloaded rows, {seconds:g}s each\n")
+        run('legacy', tmp, seconds, readers, preload, commit_rate, legacy=True)
+        run('pooled', tmp, seconds, readers, preload, commit_rate, legacy=False)
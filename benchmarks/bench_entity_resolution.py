@@ -0,0 +1,171 @@
+"""Check and time matching extracted jobs to existing applications.
+
+First scores the labeled pairs in entity_fixtures.json: each pair's
+existing job is stored, the incoming one is added through
+database.add_jobs_to_db, and the pair counts as matched if no new row was
+inserted. Prints precision and recall next to the old exact
+(lowercased company, role) match, plus the pairs it gets wrong.
+
+Then, for each database size, fills a new database with synthetic
+applications and times resolving a batch of incoming jobs (half of them
+misspelled variants of stored ones) against a brute-force comparison
+with every stored company.
+
+Usage: python benchmarks/bench_entity_resolution.py [incoming jobs] [sizes...]
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import database
+import entity_resolution
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'entity_fixtures.json')
+
+# Consonant-vowel(-consonant) syllables, so names are as varied as real ones
+SYLLABLES = [c + v + e for c in 'bcdfghklmnprstvz' for v in 'aeiou' for e in ['', 'n', 'r', 'x']]
+SUFFIXES = ['', '', '', ' Labs', ' Systems', ' Health', ' Bank', ' Robotics']
+VARIANT_SUFFIXES = [' Inc.', ' LLC', ' Careers', ' Ltd', ' Corporation']
+ROLES = ['Software Engineer', 'Senior Software Engineer', 'Data Scientist', 'Product Manager',
+         'Backend Engineer', 'Frontend Developer', 'Data Analyst', 'Designer',
+         'Site Reliability Engineer', 'Machine Learning Engineer', 'Engineering Manager']
+ROLE_VARIANTS = {'Senior Software Engineer': 'Sr. Software Engineer',
+                 'Backend Engineer': 'Back-End Engineer',
+                 'Frontend Developer': 'Front-end Developer',
+                 'Machine Learning Engineer': 'ML Engineer'}
+
+def job(company, role, email_from='careers@greenhouse.io', status='Applied'):
+    return {'company': company, 'role': role, 'status': status,
+            'email_from': email_from, 'email_date': '2025-10-20'}
+
+def reset(cursor):
+    for table in ('job_applications', 'company_lsh', 'company_domains'):
+        cursor.execute(f'DELETE FROM {table}')
+
+def score_fixtures():
+    with open(FIXTURES, encoding='utf-8') as f:
+        pairs = json.load(f)
+    
+    resolved, exact, wrong = [], [], []
+    for pair in pairs:
+        existing, incoming = pair['existing'], pair['incoming']
+        with database.transaction() as cursor:
+            reset(cursor)
+        database.add_jobs_to_db([job(**existing)])
+        matched = database.add_jobs_to_db([job(**incoming)]) == 0
+        resolved.append(matched)
+        exact.append(existing['company'].lower() == incoming['company'].lower()
+                     and existing['role'].lower() == incoming['role'].lower())
+        if matched != pair['same']:
+            wrong.append((pair, matched))
+    
+    labels = [pair['same'] for pair in pairs]
+    print(f"Labeled pairs: {len(pairs)} ({sum(labels)} same application)")
+    print(f"{'':>12}{'precision':>11}{'recall':>8}")
+    for name, predicted in (('exact', exact), ('resolved', resolved)):
+        true_positives = sum(p and l for p, l in zip(predicted, labels))
+        precision = true_positives / max(sum(predicted), 1)
+        recall = true_positives / max(sum(labels), 1)
+        print(f"{name:>12}{precision:>11.2f}{recall:>8.2f}")
+    for pair, matched in wrong:
+        existing, incoming = pair['existing'], pair['incoming']
+        print(f"  {'merged' if matched else 'missed'}: {existing['company']} / {existing['role']}"
+              f"  vs  {incoming['company']} / {incoming['role']}")
+
+def company_name(rng):
+    name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    return name.capitalize() + rng.choice(SUFFIXES)
+
+def misspell(name, rng):
+    """A variant the LLM might produce: a legal suffix or one dropped letter"""
+    if rng.random() < 0.5:
+        return name + rng.choice(VARIANT_SUFFIXES)
+    first, rest = name.split(' ', 1)[0], name[len(name.split(' ', 1)[0]):]
+    i = rng.randrange(1, len(first))
+    return first[:i] + first[i + 1:] + rest
+
+def brute_force(cursor, key, role):
+    """Compare against every stored company, as a resolver without blocking would"""
+    cursor.execute('SELECT DISTINCT company_key FROM job_applications')
+    keys = [other for (other,) in cursor.fetchall() if entity_resolution.same_company(key, other)]
+    cursor.execute(f'''
+        SELECT id, status, role_key FROM job_applications
+        WHERE company_key IN ({", ".join("?" * len(keys))})
+    ''', keys)
+    return entity_resolution.best_match(role, [dict(row) for row in cursor.fetchall()])
+
+def time_resolution(size, incoming, rng, tmp):
+    companies = {}
+    while len(companies) < max(size // 3, 1):
+        name = company_name(rng)
+        companies[entity_resolution.company_key(name)] = name
+    companies = list(companies.values())
+    stored = [job(rng.choice(companies), rng.choice(ROLES)) for _ in range(size)]
+    
+    database.DB_FILE = os.path.join(tmp, f'bench_{size}.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    start = time.perf_counter()
+    for offset in range(0, size, 5000):
+        database.add_jobs_to_db(stored[offset:offset + 5000])
+    load_time = time.perf_counter() - start
+    
+    existing = database.get_all_jobs()
+    batch = []
+    for _ in range(incoming // 2):
+        old = rng.choice(existing)
+        batch.append(job(misspell(old['company'], rng), ROLE_VARIANTS.get(old['role'], old['role']),
+                         status='Interview'))
+    batch += [job(company_name(rng), rng.choice(ROLES)) for _ in range(incoming - len(batch))]
+    
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    indexed, matched = [], 0
+    for new in batch:
+        start = time.perf_counter()
+        key = entity_resolution.company_key(new['company'])
+        role = entity_resolution.role_key(new['role'])
+        bands = entity_resolution.lsh_bands(key)
+        found = database.find_matching_job(cursor, key, role, bands, None, config.GMAIL_ADDRESS)
+        indexed.append(time.perf_counter() - start)
+        matched += found is not None
+    
+    scanned = []
+    for new in batch[:20]:
+        start = time.perf_counter()
+        brute_force(cursor, entity_resolution.company_key(new['company']),
+                    entity_resolution.role_key(new['role']))
+        scanned.append(time.perf_counter() - start)
+    
+    p50 = statistics.median(indexed) * 1000
+    p99 = sorted(indexed)[int(len(indexed) * 0.99)] * 1000
+    print(f"{size:>8}{load_time:>9.1f}s{p50:>10.2f}ms{p99:>9.2f}ms"
+          f"{statistics.median(scanned) * 1000:>12.1f}ms{matched / len(batch):>9.0%}")
+
+def main():
+    incoming = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sizes = [int(size) for size in sys.argv[2:]] or [1000, 10000, 100000]
+    rng = random.Random(7)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, 'bench.db')
+        database.init_database()
+        score_fixtures()
+        
+        print(f"\nResolving {incoming} incoming jobs (half variants of stored ones)")
+        print(f"{'rows':>8}{'load':>10}{'p50':>12}{'p99':>11}{'brute p50':>14}{'matched':>9}")
+        for size in sizes:
+            time_resolution(size, incoming, rng, tmp)
+        database.close_connection()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Measure Gmail round trips and bytes per scan: per-message vs. batched two-phase fetch.
+
+Usage: python benchmarks/bench_gmail_fetch.py [emails] [promo ratio] [body KB] [RTT ms]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_fetcher
+from fake_gmail import GmailHttpMock, build_fake_service
+
+def make_mailbox(count, promo_ratio, body_kb):
+    filler = ('Lorem ipsum dolor sit amet, job application update. ' * 20 * body_kb)[:body_kb * 1024]
+    emails = []
+    for i in range(count):
+        if i % 100 < promo_ratio * 100:
+            subject, sender = f'Flash sale: 40% OFF premium membership #{i}', 'Deals <deals@jobsboard.com>'
+        else:
+            subject, sender = f'Application received: Engineer #{i}', 'Acme Careers <noreply@acme.com>'
+        emails.append({'subject': subject, 'from': sender, 'date': '2025-10-20', 'body': filler})
+    return emails
+
+def sequential(service, message_ids):
+    return [email_fetcher.get_email(service, message_id) for message_id in message_ids]
+
+def report(name, mock, fetch, service, message_ids):
+    mock.reset_stats()
+    start = time.perf_counter()
+    emails = fetch(service, message_ids)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<20} {len(emails):5d} emails  {mock.round_trips:5d} round trips  "
+          f"{mock.bytes_received / 1024:9.1f} KB down  {mock.bytes_sent / 1024:7.1f} KB up  "
+          f"{elapsed:6.2f}s")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    promo_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    body_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    rtt_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 20
+    
+    mock = GmailHttpMock(make_mailbox(count, promo_ratio, body_kb), latency=rtt_ms / 1000)
+    service = build_fake_service(mock)
+    message_ids = email_fetcher.list_message_ids(service, 'job')
+    
+    print(f"\n{len(message_ids)} listed emails, {promo_ratio:.0%} promotions, {body_kb} KB bodies, {rtt_ms:g} ms RTT\n")
+    report('per-message full', mock, sequential, service, message_ids)
+    report('batched two-phase', mock, lambda *args: email_fetcher.fetch_messages(*args)[0],
+           service, message_ids)
@@ -0,0 +1,45 @@
+"""Compare Gmail API traffic for full vs. incremental scans on a fake mailbox.
+
+Usage: python benchmarks/bench_gmail_sync.py [mailbox size] [new emails]
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import database
+import email_fetcher
+from fake_gmail import GmailHttpMock, build_fake_service
+from stub_ollama import make_emails
+
+def scan(mock, service, mode):
+    mock.reset_stats()
+    emails, history_id = email_fetcher.sync_job_emails(days_back=60, mode=mode, service=service)
+    database.save_history_id(config.GMAIL_ADDRESS, history_id)
+    return len(emails), mock.round_trips
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1200
+    new = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, 'bench.db')
+        database.init_database()
+        
+        mock = GmailHttpMock(make_emails(size))
+        service = build_fake_service(mock)
+        results = [('initial full', scan(mock, service, 'full'))]
+        
+        for email in make_emails(new, offset=size):
+            mock.add_email(email)
+        results.append(('incremental', scan(mock, service, 'incremental')))
+        
+        mock.expire_history()
+        mock.add_email(make_emails(1, offset=size + new)[0])
+        results.append(('expired history', scan(mock, service, 'incremental')))
+        
+        print(f"\nMailbox of {size} emails, {new} new since last scan\n")
+        for name, (fetched, round_trips) in results:
+            print(f"  {name:<16} {fetched:6d} emails  {round_trips:6d} HTTP round trips")
@@ -0,0 +1,92 @@
+"""Bytes and time a client spends keeping its job list current.
+
+Builds a database of `rows` applications, then compares the ways a
+client can refresh its list after `changed` of them moved status, on
+the Flask test client. Half are edited with update_job_status, the
+other half are found again by add_jobs_to_db as a scan would, with a
+later status:
+
+  full list      GET /api/jobs, as the frontends used to on every refresh
+  full, gzip     the same with Accept-Encoding: gzip
+  delta          GET /api/jobs?since=<sync_cursor> after the changes
+  unchanged      the same delta request again with If-None-Match (304)
+
+Usage: python benchmarks/bench_job_sync.py [rows] [changed] [repeats]
+"""
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import database
+from bench_search import COMPANIES, ROLES, STATUSES
+
+def make_jobs(count, rng):
+    return [{
+        'company': f'{rng.choice(COMPANIES)} {i}',
+        'role': rng.choice(ROLES),
+        'status': 'Applied',
+        'email_date': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        'email_subject': f'Application {i}',
+        'email_from': 'jobs@example.com',
+        'email_body': 'Thank you for applying. ' * 20
+    } for i in range(count)]
+
+def measure(client, path, repeats, **headers):
+    """Median ms and body bytes of a GET"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), len(response.get_data()), response
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    changed = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    rng = random.Random(7)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, 'sync.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            database.init_database()
+            database.add_jobs_to_db(make_jobs(rows, rng))
+        client = app.app.test_client()
+        saved = database.get_all_jobs()
+        rows = len(saved)
+        
+        cursor = database.get_change_cursor()
+        picked = rng.sample(saved, changed)
+        for job in picked[:changed // 2]:
+            database.update_job_status(job['id'], rng.choice(STATUSES), '')
+        database.add_jobs_to_db([
+            {'company': job['company'], 'role': job['role'], 'status': 'Interview',
+             'email_date': '2026-01-15', 'email_from': 'jobs@example.com'}
+            for job in picked[changed // 2:]
+        ])
+        
+        results = [
+            ('full list',) + measure(client, '/api/jobs', repeats)[:2],
+            ('full, gzip',) + measure(client, '/api/jobs', repeats, **{'Accept-Encoding': 'gzip'})[:2]
+        ]
+        ms, size, response = measure(client, f'/api/jobs?since={cursor}', repeats)
+        results.append(('delta', ms, size))
+        results.append(('unchanged',) + measure(client, f'/api/jobs?since={cursor}', repeats,
+                                                **{'If-None-Match': response.headers['ETag']})[:2])
+        delta = response.get_json()
+        database.close_connection()
+    
+    print(f"\n{rows} applications, {changed} changed, median of {repeats} requests\n")
+    print(f"{'':<14}{'ms':>10}{'bytes':>12}{'vs full':>10}")
+    full = results[0][2]
+    for name, ms, size in results:
+        print(f"{name:<14}{ms:>10.2f}{size:>12,}{size / full:>10.1%}")
+    print(f"\ndelta returned {len(delta['jobs'])} jobs, {len(delta['deleted'])} deleted")
@@ -0,0 +1,87 @@
+"""Scanning several Gmail accounts one after another vs in parallel.
+
+Every account gets its own synthetic mailbox behind its own GmailHttpMock,
+as if signed in with its own token, and a per-account Gmail quota. One
+scan job per account goes through a ScanRunner, first with one worker
+(accounts scanned in turn) and then with one worker per account, into a
+fresh database each time.
+
+Prints wall time, emails/sec, the time scans spent waiting for Gmail
+quota, and checks that every account ended up with its own applications
+and scan history row.
+
+Usage: python benchmarks/bench_multi_account.py [accounts] [emails per account] [quota units/s] [ollama latency]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+import app
+import config
+import database
+import email_fetcher
+import metrics
+from bench_scan import SHAPES, make_mailbox, reply
+from fake_gmail import GmailHttpMock, build_fake_service
+from scan_jobs import ScanRunner
+from stub_ollama import StubOllamaServer
+
+def quota_wait(account):
+    return metrics.GMAIL_QUOTA_WAIT_SECONDS.snapshot().get(f'account={account}', 0)
+
+def run(tmp, name, accounts, workers, quota, count):
+    services = {}
+    for number, account in enumerate(accounts):
+        mailbox = make_mailbox(count, 0.3, SHAPES, 4, seed=number)
+        services[account] = build_fake_service(GmailHttpMock(mailbox, latency=0.005, address=account))
+    email_fetcher.get_gmail_service = lambda account=None: services[account]
+    
+    # Fresh limiters, so one run's debt doesn't slow the next
+    config.GMAIL_QUOTA_UNITS_PER_SECOND = quota
+    email_fetcher._limiters.clear()
+    waited = {account: quota_wait(account) for account in accounts}
+    
+    database.DB_FILE = os.path.join(tmp, f'{workers}.db')
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        database.init_database()
+        runner = ScanRunner(app.run_scan_job, workers=workers)
+        start = time.perf_counter()
+        jobs = [runner.submit(account, 60, 'full') for account in accounts]
+        while any(database.get_scan_job(job['id'])['state'] in ('queued', 'running') for job in jobs):
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+    
+    failed = [job for job in map(database.get_scan_job, [job['id'] for job in jobs]) if job['state'] != 'done']
+    scanned = sum(scan['emails_scanned'] for scan in database.get_scan_history())
+    separate = all(
+        database.get_all_jobs(account) and len(database.get_scan_history(account=account)) == 1
+        for account in accounts
+    )
+    waits = sum(quota_wait(account) - waited[account] for account in accounts)
+    print(f"{name:<12}{workers:>8}{elapsed:>10.2f}{scanned / elapsed:>12.1f}{waits:>14.2f}"
+          f"{'yes' if separate and not failed else 'NO':>10}")
+    database.close_connection()
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    emails = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    quota = int(sys.argv[3]) if len(sys.argv) > 3 else 250
+    latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.02
+    
+    accounts = [f'applicant{number}@example.com' for number in range(1, count + 1)]
+    config.GMAIL_ACCOUNTS = {account: f'token_{account}.pkl' for account in accounts}
+    print(f"\n{count} accounts x {emails} emails, Gmail quota {quota or 'unlimited'} units/s per account, "
+          f"stub latency {latency:g}s\n")
+    print(f"{'':<12}{'workers':>8}{'seconds':>10}{'emails/sec':>12}{'quota wait s':>14}{'separate':>10}")
+    
+    with tempfile.TemporaryDirectory() as tmp, StubOllamaServer(latency, reply=reply, seed=1) as stub:
+        ai_analyzer.OLLAMA_API_URL = stub.url
+        run(tmp, 'sequential', accounts, 1, quota, emails)
+        run(tmp, 'parallel', accounts, count, quota, emails)
@@ -0,0 +1,53 @@
+"""Benchmark serial vs. pooled Ollama extraction against a stub server.
+
+Usage: python benchmarks/bench_ollama_pool.py [emails] [latency] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+import config
+import database
+from stub_ollama import StubOllamaServer, make_emails
+
+def fresh_database(directory, name):
+    database.DB_FILE = os.path.join(directory, f'{name}.db')
+    database.init_database()
+
+def run(emails, workers):
+    start = time.perf_counter()
+    found = sum(
+        1 for _, job_info in ai_analyzer.iter_job_info(emails, max_workers=workers)
+        if job_info and job_info.get('is_job_related')
+    )
+    return time.perf_counter() - start, found
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.25
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    
+    emails = make_emails(count)
+    # The synthetic emails all share one template; keep every one going to the stub
+    config.TEMPLATE_MIN_AGREEMENTS = count + 1
+    
+    with StubOllamaServer(latency=latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        ai_analyzer.OLLAMA_API_URL = stub.url
+        
+        print(f"{count} emails, {latency}s simulated latency per call\n")
+        for n in (1, workers):
+            fresh_database(tmp, f'workers{n}')
+            elapsed, found = run(emails, n)
+            print(f"  workers={n:<3} {elapsed:7.2f}s  "
+                  f"{count / elapsed:7.2f} emails/sec  ({found} jobs)")
+        
+        # Rescan an overlapping window: only the new half reaches Ollama
+        calls = stub.requests
+        overlap = emails[count // 2:] + make_emails(count // 2, offset=count)
+        elapsed, found = run(overlap, workers)
+        print(f"  rescan      {elapsed:7.2f}s  "
+              f"{stub.requests - calls} Ollama calls for {len(overlap)} emails  ({found} jobs)")
@@ -0,0 +1,136 @@
+"""Compare the email body sent to the model before and after email_text.
+
+For every message in mime_fixtures.json (nested multiparts, HTML-only
+templates, a Latin-1 charset, quoted-printable, quoted reply threads),
+builds the Gmail API payload and extracts the prompt body two ways:
+
+  old: the previous get_email_body (one level of parts, strict UTF-8,
+       raw HTML) cut to body[:2000]
+  new: email_text.body_text + email_text.prompt_excerpt
+
+Prints prompt size, whether the company and role survive into the
+prompt, and extraction time per email against a stub Ollama whose
+prefill cost grows with prompt length.
+
+Usage: python benchmarks/bench_prompt_body.py [prefill seconds per 1k chars] [repeats]
+"""
+import base64
+import json
+import os
+import quopri
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+import config
+import email_text
+from stub_ollama import StubOllamaServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mime_fixtures.json')
+
+def to_payload(spec):
+    """Gmail API payload for a fixture part, encoded as Gmail would serve it"""
+    if 'parts' in spec:
+        return {'mimeType': spec['mimeType'], 'body': {'size': 0},
+                'parts': [to_payload(part) for part in spec['parts']]}
+    if 'attachmentId' in spec:
+        return {'mimeType': spec['mimeType'], 'filename': spec['filename'],
+                'body': {'size': spec['size'], 'attachmentId': spec['attachmentId']}}
+    
+    charset = spec.get('charset', 'utf-8')
+    raw = spec['text'].encode(charset)
+    headers = [{'name': 'Content-Type', 'value': f'{spec["mimeType"]}; charset="{charset}"'}]
+    if spec.get('encoding') == 'quoted-printable':
+        raw = quopri.encodestring(raw)
+        headers.append({'name': 'Content-Transfer-Encoding', 'value': 'quoted-printable'})
+    return {'mimeType': spec['mimeType'], 'headers': headers,
+            'body': {'size': len(raw), 'data': base64.urlsafe_b64encode(raw).decode('ascii')}}
+
+def legacy_body(payload):
+    """get_email_body as it was before email_text"""
+    body = ""
+    
+    if 'parts' in payload:
+        for part in payload['parts']:
+            if part['mimeType'] == 'text/plain':
+                if 'data' in part['body']:
+                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+                    break
+            elif part['mimeType'] == 'text/html' and not body:
+                if 'data' in part['body']:
+                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+    else:
+        if 'body' in payload and 'data' in payload['body']:
+            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+    
+    return body
+
+def old_prompt_body(payload):
+    try:
+        return legacy_body(payload)[:2000]
+    except UnicodeDecodeError:
+        return None
+
+def new_prompt_body(payload):
+    return email_text.prompt_excerpt(email_text.body_text(payload))
+
+def time_per_call(function, payload, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(payload)
+    return (time.perf_counter() - start) / repeats
+
+def keeps(body, fixture):
+    if body is None:
+        return 'crash'
+    text = body.lower()
+    return ('C' if fixture['company'].lower() in text else '-') + ('R' if fixture['role'].lower() in text else '-')
+
+def extraction_seconds(fixture, body):
+    if body is None:
+        return 0
+    prompt = ai_analyzer.PROMPT_TEMPLATE.format(subject=fixture['subject'], sender=fixture['from'], body=body)
+    start = time.perf_counter()
+    ai_analyzer.call_ollama(prompt)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    prefill = float(sys.argv[1]) if len(sys.argv) > 1 else 0.25
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    
+    with open(FIXTURES, encoding='utf-8') as f:
+        fixtures = json.load(f)
+    
+    print(f"\n{len(fixtures)} fixtures, prompt body budget {config.PROMPT_BODY_TOKENS} tokens, "
+          f"stub prefill {prefill:g}s per 1k prompt chars  (C/R = company/role kept in the prompt)\n")
+    print(f"{'fixture':<32}{'old chars':>10}{'new chars':>10}{'old':>7}{'new':>5}"
+          f"{'old us':>9}{'new us':>9}{'old s':>8}{'new s':>8}")
+    
+    totals = {'old_chars': 0, 'new_chars': 0, 'old_kept': 0, 'new_kept': 0, 'old_s': 0, 'new_s': 0}
+    with StubOllamaServer(0.02, prefill_per_kchar=prefill) as stub:
+        ai_analyzer.OLLAMA_API_URL = stub.url
+        for fixture in fixtures:
+            payload = to_payload(fixture['payload'])
+            old, new = old_prompt_body(payload), new_prompt_body(payload)
+            old_us = time_per_call(old_prompt_body, payload, repeats) * 1e6
+            new_us = time_per_call(new_prompt_body, payload, repeats) * 1e6
+            old_s, new_s = extraction_seconds(fixture, old), extraction_seconds(fixture, new)
+            
+            print(f"{fixture['name']:<32}{len(old or ''):>10}{len(new):>10}{keeps(old, fixture):>7}{keeps(new, fixture):>5}"
+                  f"{old_us:>9.0f}{new_us:>9.0f}{old_s:>8.2f}{new_s:>8.2f}")
+            
+            totals['old_chars'] += len(old or '')
+            totals['new_chars'] += len(new)
+            totals['old_kept'] += keeps(old, fixture) == 'CR'
+            totals['new_kept'] += keeps(new, fixture) == 'CR'
+            totals['old_s'] += old_s
+            totals['new_s'] += new_s
+    
+    count = len(fixtures)
+    print(f"\nPrompt body: {totals['old_chars'] / count:.0f} -> {totals['new_chars'] / count:.0f} chars per email "
+          f"(~{totals['old_chars'] / count / email_text.CHARS_PER_TOKEN:.0f} -> "
+          f"~{totals['new_chars'] / count / email_text.CHARS_PER_TOKEN:.0f} tokens)")
+    print(f"Company and role in prompt: {totals['old_kept']}/{count} -> {totals['new_kept']}/{count}")
+    print(f"Stub extraction time: {totals['old_s'] / count:.2f}s -> {totals['new_s'] / count:.2f}s per email")
@@ -0,0 +1,254 @@
+"""End-to-end scan benchmark: run_scan_job against a fake Gmail and a stub Ollama.
+
+Generates a synthetic mailbox (size, spam ratio, MIME shapes, body size),
+serves it through GmailHttpMock with a simulated round-trip time, answers
+extractions with StubOllamaServer at a configurable latency, and runs one
+full scan exactly as the API does, into a fresh database.
+
+Reports emails/sec, p50/p99 per stage (estimated from the metrics
+histograms, like Prometheus' histogram_quantile), peak RSS and database
+write rate. --output saves the results as JSON; --compare prints the
+change against a saved run, e.g. one from the previous commit.
+
+Usage: python benchmarks/bench_scan.py [--emails 500] [--spam 0.3] [--shapes plain,html,alternative,mixed]
+                                       [--body-kb 4] [--ollama-latency 0.05] [--rtt-ms 5] [--quota 0]
+                                       [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import base64
+import contextlib
+import html
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ai_analyzer
+import app
+import config
+import database
+import email_fetcher
+import metrics
+from fake_gmail import GmailHttpMock, build_fake_service
+from stub_ollama import StubOllamaServer, fake_extraction
+
+SHAPES = ['plain', 'html', 'alternative', 'mixed']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises',
+             'Wonka', 'Cyberdyne', 'Soylent', 'Tyrell', 'Vandelay Industries', 'Pied Piper', 'Massive Dynamic']
+JOB_SUBJECTS = ['Thank you for applying at {company}', 'Your application at {company}',
+                'Interview invitation at {company}', 'Next steps for your candidacy at {company}',
+                'An update on your application at {company}', 'Online assessment at {company}']
+SPAM_SUBJECTS = ['Weekly deals: 40% OFF everything', 'Flash sale ends tonight',
+                 'Top 10 jobs you might like this week', 'Your newsletter digest']
+FILLER = ('We appreciate your interest in joining the team. Our recruiters review every '
+          'application carefully and will reach out about next steps. ')
+PROMO_FILLER = 'Shop this week\'s best sellers and save on everything in store and online. '
+SUBJECT_COMPANY = re.compile(r'^Subject: .* at (.+)$', re.MULTILINE)
+# Histograms shown in the report
+STAGES = [metrics.GMAIL_REQUEST_SECONDS, metrics.EMAIL_DECODE_SECONDS,
+          metrics.OLLAMA_REQUEST_SECONDS, metrics.DB_WRITE_SECONDS]
+
+def text_part(mime_type, text):
+    data = base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+    return {'mimeType': mime_type, 'body': {'size': len(text), 'data': data}}
+
+def make_payload(shape, text):
+    """A Gmail message payload of the given MIME shape carrying `text`"""
+    markup = '<html><body>' + ''.join(f'<p>{html.escape(line)}</p>' for line in text.split('\n')) + '</body></html>'
+    if shape == 'plain':
+        return text_part('text/plain', text)
+    if shape == 'html':
+        return text_part('text/html', markup)
+    alternative = {'mimeType': 'multipart/alternative', 'body': {'size': 0},
+                   'parts': [text_part('text/plain', text), text_part('text/html', markup)]}
+    if shape == 'alternative':
+        return alternative
+    # 'mixed': the alternative body plus an attachment that is never downloaded
+    attachment = {'mimeType': 'application/pdf', 'filename': 'details.pdf',
+                  'body': {'size': 48213, 'attachmentId': 'attachment-1'}}
+    return {'mimeType': 'multipart/mixed', 'body': {'size': 0}, 'parts': [alternative, attachment]}
+
+def make_mailbox(count, spam_ratio, shapes, body_kb, seed):
+    rng = random.Random(seed)
+    emails = []
+    for i in range(count):
+        if rng.random() < spam_ratio:
+            subject, filler = rng.choice(SPAM_SUBJECTS), PROMO_FILLER
+            sender = 'Deals <deals@shopping.example>'
+        else:
+            company = rng.choice(COMPANIES)
+            subject, filler = rng.choice(JOB_SUBJECTS).format(company=company), FILLER
+            sender = f"{company} Careers <careers@{company.split()[0].lower()}.example>"
+        body = f'{subject}\n' + (filler * (body_kb * 1024 // len(filler) + 1))[:body_kb * 1024]
+        emails.append({'id': f'msg{i:06d}', 'subject': subject, 'from': sender, 'date': '2025-10-20',
+                       'body': body, 'payload': make_payload(rng.choice(shapes), body)})
+    return emails
+
+def reply(prompt, failure_rate, rng, structured=False):
+    """Stub reply naming the company from each subject, so applications don't all merge"""
+    text, generated = fake_extraction(prompt, failure_rate, rng, structured)
+    companies = iter(SUBJECT_COMPANY.findall(prompt))
+    return re.sub(r'"Acme"', lambda m: json.dumps(next(companies, 'Acme')), text), generated
+
+def quantile(buckets, counts, q):
+    """Estimate a quantile from per-bucket histogram counts by linear interpolation"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen, lower = 0, 0
+    for bound, count in zip(list(buckets) + [buckets[-1]], counts):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return buckets[-1]
+
+def stage_report(before, breakdown):
+    """p50/p99/count/total per stage series for what this scan recorded"""
+    stages = {}
+    for histogram in STAGES:
+        name = histogram.name
+        for label, (counts, total, count) in histogram.snapshot().items():
+            old_counts, old_total, old_count = before.get((name, label), ([0] * len(counts), 0, 0))
+            if count == old_count:
+                continue
+            counts = [new - old for new, old in zip(counts, old_counts)]
+            stages[f'{name}{{{label}}}' if label else name] = {
+                'count': count - old_count,
+                'total': round(total - old_total, 4),
+                'p50': quantile(histogram.buckets, counts, 0.5),
+                'p99': quantile(histogram.buckets, counts, 0.99)
+            }
+    return stages
+
+def histogram_state():
+    return {(histogram.name, label): series
+            for histogram in STAGES for label, series in histogram.snapshot().items()}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    mailbox = make_mailbox(args.emails, args.spam, args.shapes.split(','), args.body_kb, args.seed)
+    mock = GmailHttpMock(mailbox, latency=args.rtt_ms / 1000)
+    service = build_fake_service(mock)
+    email_fetcher.get_gmail_service = lambda account=None: service
+    config.GMAIL_QUOTA_UNITS_PER_SECOND = args.quota
+    
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubOllamaServer(args.ollama_latency, reply=reply, failure_rate=args.failure_rate,
+                             seed=args.seed) as stub:
+        ai_analyzer.OLLAMA_API_URL = stub.url
+        database.DB_FILE = os.path.join(tmp, 'bench.db')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            database.init_database()
+        
+        job = database.create_scan_job(config.GMAIL_ADDRESS, 60, 'full')
+        before = histogram_state()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output), metrics.scan_breakdown() as breakdown:
+            result = app.run_scan_job(job, lambda: False)
+        elapsed = time.perf_counter() - start
+        
+        scan = database.get_scan_history(limit=1)[0]
+        database.close_connection()
+    
+    writes = breakdown.get('db_write_seconds', {})
+    return {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'params': vars(args),
+        'emails': scan['emails_scanned'],
+        'llm_requests': stub.requests,
+        'rule_decisions': scan['rule_decisions'],
+        'template_hits': scan['template_hits'],
+        'jobs_found': result['jobs_found'],
+        'jobs_added': result['jobs_added'],
+        'gmail_round_trips': mock.round_trips,
+        'elapsed_seconds': round(elapsed, 3),
+        'emails_per_second': round(scan['emails_scanned'] / elapsed, 2),
+        'db_writes_per_second': round(sum(entry['count'] for entry in writes.values()) / elapsed, 2),
+        'db_write_seconds': round(sum(entry['sum'] for entry in writes.values()), 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stage_report(before, breakdown)
+    }
+
+def ms(value):
+    return f'{value * 1000:9.2f}' if value is not None else f'{"-":>9}'
+
+def print_results(results):
+    print(f"\n{results['emails']} emails scanned in {results['elapsed_seconds']:.2f}s "
+          f"({results['llm_requests']} Ollama requests, {results['rule_decisions']} decided by rules, "
+          f"{results.get('template_hits', 0)} by templates, "
+          f"{results['gmail_round_trips']} Gmail round trips)")
+    print(f"  {results['emails_per_second']:.1f} emails/sec, {results['db_writes_per_second']:.1f} "
+          f"DB writes/sec ({results['db_write_seconds']:.3f}s writing), peak RSS {results['peak_rss_mb']} MB")
+    print(f"\n{'stage':<52}{'count':>7}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stage in results['stages'].items():
+        print(f"{name:<52}{stage['count']:>7}{stage['total']:>10.3f}{ms(stage['p50'])} {ms(stage['p99'])}")
+
+def compare(results, baseline):
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'} ({baseline['date']}):")
+    for key in ('emails_per_second', 'db_writes_per_second', 'peak_rss_mb'):
+        old, new = baseline.get(key), results.get(key)
+        if old and new is not None:
+            print(f"  {key:<22}{old:>10}{new:>10}{(new - old) / old:>+9.1%}")
+    for name, stage in results['stages'].items():
+        old = baseline['stages'].get(name)
+        if old and old['p50'] and stage['p50']:
+            print(f"  {name:<52} p50{(stage['p50'] - old['p50']) / old['p50']:>+9.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--emails', type=int, default=500)
+    parser.add_argument('--spam', type=float, default=0.3, help='share of promotional emails')
+    parser.add_argument('--shapes', default=','.join(SHAPES), help='MIME shapes to mix: ' + ', '.join(SHAPES))
+    parser.add_argument('--body-kb', type=int, default=4)
+    parser.add_argument('--ollama-latency', type=float, default=0.05, help='seconds per Ollama request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of malformed model replies')
+    parser.add_argument('--rtt-ms', type=float, default=5, help='Gmail round-trip time')
+    parser.add_argument('--quota', type=int, default=0, help='Gmail quota units per second (0 = no limit)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+    
+    results = run(args)
+    print_results(results)
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {args.output}")
+
+if __name__ == '__main__':
+    main()
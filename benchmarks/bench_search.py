@@ -0,0 +1,136 @@
+"""Time /api/search against a synthetic database of job applications.
+
+Builds a database of the requested size (100k rows by default) through
+database.add_jobs_to_db, so the FTS index is filled by the same triggers
+a scan uses, then times a mix of search queries and compares them with
+the LIKE '%term%' scan a search without the index would need, overall and for each query.
+
+Usage: python benchmarks/bench_search.py [rows] [queries] [db path]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+COMPANIES = ['Stripe', 'Shopify', 'Datadog', 'Airbnb', 'Atlassian', 'Notion', 'Figma',
+             'Cloudflare', 'Snowflake', 'Databricks', 'Twilio', 'Gitlab', 'Canva', 'Monzo']
+ROLES = ['Backend Engineer', 'Frontend Developer', 'Data Scientist', 'Product Manager',
+         'Site Reliability Engineer', 'Machine Learning Engineer', 'Designer', 'Data Analyst']
+STATUSES = ['Applied', 'Interview', 'Offer', 'Rejected', 'Other']
+JOB_WORDS = ('team role experience python kubernetes react interview schedule recruiter '
+             'position opportunity application review update candidate remote hybrid office '
+             'salary benefits onsite assessment coding challenge next steps thank you').split()
+SYLLABLES = ['ka', 'lo', 'mi', 'ten', 'ra', 'vo', 'shi', 'du', 'pel', 'ne', 'tor', 'ax']
+
+def make_vocabulary(rng, size=5000):
+    """Word list with Zipf-like weights, job words spread among the common ones"""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    for position, word in enumerate(JOB_WORDS):
+        words.insert(20 + position * 10, word)
+    return words, [1 / (rank + 1) for rank in range(len(words))]
+
+QUERIES = ['stripe', 'data scien', 'kubernetes interview', 'recruiter', 'remote python',
+           'site reliab', 'onsite assessment', 'canva designer', 'team', 'zzzz nothing']
+
+def make_jobs(start, count, rng, vocabulary):
+    words, weights = vocabulary
+    jobs = []
+    for i in range(start, start + count):
+        company = f'{rng.choice(COMPANIES)} {i}'
+        role = rng.choice(ROLES)
+        jobs.append({
+            'company': company,
+            'role': role,
+            'status': rng.choice(STATUSES),
+            'email_date': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'email_subject': f'Your application for {role} at {company}',
+            'email_from': 'jobs@example.com',
+            'email_body': ' '.join(rng.choices(words, weights, k=rng.randint(40, 120)))
+        })
+    return jobs
+
+def build(rows):
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    start = time.perf_counter()
+    for offset in range(0, rows, 5000):
+        database.add_jobs_to_db(make_jobs(offset, min(5000, rows - offset), rng, vocabulary))
+    return time.perf_counter() - start
+
+def time_queries(run_query, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        run_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+def like_search(query):
+    conn = database.get_connection()
+    conditions = []
+    params = []
+    for word in query.split():
+        conditions.append('(' + ' OR '.join(
+            f'{column} LIKE ?' for column in database.SEARCH_COLUMNS) + ')')
+        params.extend([f'%{word}%'] * len(database.SEARCH_COLUMNS))
+    # Fetch every match: ranking needs all of them, not just the first 20
+    return conn.execute(
+        f'SELECT id FROM job_applications WHERE {" AND ".join(conditions)}', params
+    ).fetchall()
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    path = sys.argv[3] if len(sys.argv) > 3 else None
+    
+    tmp = tempfile.mkdtemp()
+    database.DB_FILE = path or os.path.join(tmp, 'search.db')
+    database.init_database()
+    existing = database.get_connection().execute(
+        'SELECT COUNT(*) FROM job_applications').fetchone()[0]
+    if existing < rows:
+        print(f"Building {rows - existing} synthetic rows...")
+        print(f"  built in {build(rows - existing):.1f}s")
+    
+    import app
+    client = app.app.test_client()
+    queries = [QUERIES[i % len(QUERIES)] for i in range(count)]
+    
+    print(f"\n{count} queries over {max(rows, existing)} rows")
+    print(f"{'method':<16}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, run_query in [
+        ('/api/search', lambda q: client.get('/api/search', query_string={'q': q}).get_json()),
+        ('fts5', lambda q: database.search_jobs(q)),
+        ('fts5 all ranked', lambda q: database.search_jobs(q, recent=0)),
+        ('fts5 newest 10k', lambda q: database.search_jobs(q, recent=10000)),
+        ('LIKE scan', like_search),
+    ]:
+        runs = queries if name != 'LIKE scan' else queries[:len(QUERIES) * 2]
+        p50, p95 = time_queries(run_query, runs)
+        print(f"{name:<16}{p50:>10.2f}{p95:>10.2f}")
+    
+    # Common words are where ranking gets slow, so report every query
+    repeats = max(count // len(QUERIES), 1)
+    conn = database.get_connection()
+    print(f"\n{'query':<22}{'matches':>9}{'api p50':>10}{'api p95':>10}{'full p50':>10}{'full p95':>10}")
+    for query in QUERIES:
+        matches = conn.execute('SELECT COUNT(*) FROM jobs_fts WHERE jobs_fts MATCH ?',
+                               (database.build_match_query(query),)).fetchone()[0]
+        api = time_queries(lambda q: client.get('/api/search', query_string={'q': q}).get_json(),
+                           [query] * repeats)
+        full = time_queries(lambda q: database.search_jobs(q, recent=0), [query] * repeats)
+        print(f"{query:<22}{matches:>9}{api[0]:>10.2f}{api[1]:>10.2f}{full[0]:>10.2f}{full[1]:>10.2f}")
+
+if __name__ == '__main__':
+    main()
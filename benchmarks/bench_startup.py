@@ -0,0 +1,133 @@
+"""Server startup cost: imports, schema setup, first requests and the Gmail client.
+
+Every measurement runs in a fresh interpreter, `repeats` times (medians
+are printed), against a copy of the repo given as `tree` (default: this
+checkout; pass a worktree of an older commit to compare):
+
+  imports        `python -X importtime -c "import app"`: total, and the
+                 heaviest modules app imports directly
+  schema         init_database on a new database, and again at restart
+  first requests importing app with an existing database, then the first
+                 GET /api/jobs and GET /api/stats on the test client
+  gmail client   get_gmail_service the first time and again, with an
+                 unexpired offline token, so no network is involved
+
+Usage: python benchmarks/bench_startup.py [repeats] [tree]
+"""
+import json
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the tree being measured: argv = db path, token path, phase
+PROBE = r'''
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import database
+database.DB_FILE = sys.argv[1]
+timings = {}
+with contextlib.redirect_stdout(io.StringIO()):
+    if sys.argv[3] == 'init':
+        database.init_database()
+        timings['schema_new'] = time.perf_counter() - start
+    else:
+        import app
+        timings['import_app'] = time.perf_counter() - start
+        t = time.perf_counter()
+        database.init_database()
+        timings['schema_restart'] = time.perf_counter() - t
+        client = app.app.test_client()
+        for path in ('/api/jobs', '/api/stats'):
+            t = time.perf_counter()
+            client.get(path)
+            timings[path] = time.perf_counter() - t
+        timings['ready'] = time.perf_counter() - start
+        
+        import config
+        config.TOKEN_FILE = sys.argv[2]
+        config.GMAIL_ACCOUNTS = {config.GMAIL_ADDRESS: sys.argv[2]}
+        t = time.perf_counter()
+        import email_fetcher
+        email_fetcher.get_gmail_service()
+        timings['gmail_first'] = time.perf_counter() - t
+        t = time.perf_counter()
+        email_fetcher.get_gmail_service()
+        timings['gmail_again'] = time.perf_counter() - t
+print(json.dumps(timings))
+'''
+
+def run_probe(tree, db, token, phase):
+    result = subprocess.run([sys.executable, '-c', PROBE, db, token, phase], cwd=tree,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def import_times(tree, tmp):
+    """Cumulative import time of app and of each module it imports directly, in seconds"""
+    code = f'import sys; sys.path.insert(0, {tree!r}); import app'
+    # Run from tmp, so an app that creates its database on import does it there
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=tmp,
+                            capture_output=True, text=True, check=True)
+    # A module is listed after everything it imported, one level deeper
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name, seconds = name.strip(), int(cumulative) / 1e6
+        if depth == 1:
+            children[name] = seconds
+        elif depth == 0:
+            if name == 'app':
+                return dict(children, app=seconds)
+            children = {}
+    return {}
+
+def write_token(path):
+    creds = Credentials(token='offline', expiry=datetime.utcnow() + timedelta(hours=1))
+    with open(path, 'wb') as f:
+        pickle.dump(creds, f)
+
+def ms(values):
+    return f'{statistics.median(values) * 1000:9.1f} ms'
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    tree = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else ROOT
+    
+    samples = defaultdict(list)
+    imports = defaultdict(list)
+    with tempfile.TemporaryDirectory() as tmp:
+        token = os.path.join(tmp, 'token.pkl')
+        write_token(token)
+        for repeat in range(repeats):
+            db = os.path.join(tmp, f'startup{repeat}.db')
+            for phase in ('init', 'serve'):
+                for name, value in run_probe(tree, db, token, phase).items():
+                    samples[name].append(value)
+            for name, value in import_times(tree, tmp).items():
+                imports[name].append(value)
+    
+    print(f"\n{tree}, median of {repeats} fresh interpreters\n")
+    print(f"import app (-X importtime)    {ms(imports['app'])}")
+    children = sorted((name for name in imports if name != 'app'),
+                      key=lambda name: -statistics.median(imports[name]))
+    for name in children[:6]:
+        print(f"  {name:<28}{ms(imports[name])}")
+    print(f"\nschema on a new database      {ms(samples['schema_new'])}")
+    print(f"import app, existing database {ms(samples['import_app'])}")
+    print(f"schema at restart             {ms(samples['schema_restart'])}")
+    print(f"first GET /api/jobs           {ms(samples['/api/jobs'])}")
+    print(f"first GET /api/stats          {ms(samples['/api/stats'])}")
+    print(f"ready to serve                {ms(samples['ready'])}")
+    print(f"\nfirst Gmail client            {ms(samples['gmail_first'])}")
+    print(f"Gmail client again            {ms(samples['gmail_again'])}")
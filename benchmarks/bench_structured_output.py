@@ -0,0 +1,122 @@
+"""Parse failures with free-form JSON replies vs schema-constrained ones.
+
+Sends every email of a corpus (the messages in mime_fixtures.json plus
+synthetic ones from make_emails) to the model two ways:
+
+  before: the plain prompt, num_predict=200, reply parsed with the old
+          regex + json.loads code; a malformed reply is a lost extraction
+  after:  ai_analyzer.request_extraction, with the reply constrained to
+          EXTRACTION_SCHEMA, validated, and invalid fields asked for again
+
+Prints the share of replies that were unusable, the extractions finally
+lost, requests sent, generated tokens and time per email. Against the
+stub, `failure rate` is the share of bad replies; it produces truncated
+text in free-form mode and a job email without a company when a schema
+is sent. Pass an Ollama URL to measure a real model instead.
+
+Usage: python benchmarks/bench_structured_output.py [failure rate] [synthetic emails] [ollama url]
+"""
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+import email_text
+import metrics
+from bench_prompt_body import FIXTURES, to_payload
+from stub_ollama import StubOllamaServer, make_emails
+
+def legacy_parse(response):
+    """parse_extraction as it was before structured output"""
+    if not response:
+        return None
+    
+    try:
+        response = re.sub(r'```json\n?|\n?```', '', response)
+        response = response.strip()
+        
+        json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response, re.DOTALL)
+        if json_match:
+            response = json_match.group()
+        
+        data = json.loads(response)
+        if not isinstance(data, dict) or not all(key in data for key in ai_analyzer.EXTRACTED_FIELDS):
+            return None
+        return data
+    except json.JSONDecodeError:
+        return None
+
+def before(prompt):
+    return legacy_parse(ai_analyzer.call_ollama(prompt))
+
+def load_corpus(count):
+    with open(FIXTURES, encoding='utf-8') as f:
+        fixtures = json.load(f)
+    emails = [{'subject': fixture['subject'], 'from': fixture['from'],
+               'body': email_text.body_text(to_payload(fixture['payload']))} for fixture in fixtures]
+    return emails + make_emails(count)
+
+def generated_tokens():
+    return sum(total for _, total, _ in metrics.OLLAMA_EVAL_TOKENS.snapshot().values())
+
+def run(extract, prompts):
+    calls = []
+    call_ollama = ai_analyzer.call_ollama
+    
+    def counted(prompt, *args, **kwargs):
+        calls.append(prompt)
+        return call_ollama(prompt, *args, **kwargs)
+    
+    ai_analyzer.call_ollama = counted
+    tokens = generated_tokens()
+    failures = lost = 0
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for prompt in prompts:
+                sent = len(calls)
+                data = extract(prompt)
+                # A repair request means the first reply was unusable
+                failures += data is None or len(calls) - sent > 1
+                lost += data is None
+    finally:
+        ai_analyzer.call_ollama = call_ollama
+    
+    return {
+        'failures': failures,
+        'lost': lost,
+        'requests': len(calls),
+        'tokens': generated_tokens() - tokens,
+        'seconds': time.perf_counter() - start
+    }
+
+def report(name, result, count):
+    print(f"{name:<8}{result['failures'] / count:>12.1%}{result['lost'] / count:>8.1%}{result['requests']:>10}"
+          f"{result['tokens'] / count:>14.1f}{result['seconds'] / count * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    failure_rate = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    url = sys.argv[3] if len(sys.argv) > 3 else None
+    
+    prompts = [ai_analyzer.PROMPT_TEMPLATE.format(subject=subject, sender=sender, body=body)
+               for subject, sender, body in map(ai_analyzer.email_fields, load_corpus(count))]
+    
+    with contextlib.ExitStack() as stack:
+        if url:
+            ai_analyzer.OLLAMA_API_URL = url
+            print(f"\n{len(prompts)} emails against {url}\n")
+        else:
+            stub = stack.enter_context(StubOllamaServer(0.02, failure_rate=failure_rate, seed=1))
+            ai_analyzer.OLLAMA_API_URL = stub.url
+            print(f"\n{len(prompts)} emails, stub failure rate {failure_rate:g}\n")
+        
+        print(f"{'':<8}{'bad replies':>12}{'lost':>8}{'requests':>10}{'tokens/email':>14}{'ms/email':>10}")
+        report('before', run(before, prompts), len(prompts))
+        report('after', run(ai_analyzer.request_extraction, prompts), len(prompts))
@@ -0,0 +1,135 @@
+"""How many emails learned sender templates answer without the model.
+
+Generates a mailbox of ATS mail from five templates (LinkedIn, Workday,
+Greenhouse, and a Lever rejection and interview invitation that share a
+subject) that the rule-based classifier cannot settle, with
+random companies, roles and names, mixed with one-off recruiter emails.
+Every email goes through ai_analyzer.extract_job_info in arrival order,
+against a stub Ollama that answers with the true fields, once with
+templates disabled and once with them.
+
+Prints model requests, template hit rate (answered by a template, out of
+the emails that reached the template stage), how many template answers
+match the truth, and time per email.
+
+Usage: python benchmarks/bench_templates.py [emails] [one-off share] [ollama latency]
+"""
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_analyzer
+import config
+import database
+import email_templates
+from stub_ollama import StubOllamaServer
+
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises',
+             'Wonka', 'Cyberdyne', 'Soylent', 'Tyrell', 'Vandelay Industries', 'Pied Piper', 'Massive Dynamic']
+ROLES = ['Software Engineer', 'Senior Data Engineer', 'Backend Developer', 'Product Manager',
+         'Machine Learning Engineer', 'Site Reliability Engineer', 'Data Analyst', 'Frontend Engineer II']
+NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Riley']
+# The mailbox owner, greeted by every template
+OWNER = 'Alex'
+
+TEMPLATES = [
+    ('LinkedIn <jobs-noreply@linkedin.com>', '{name}, your application was sent to {company}',
+     'Your application was sent to {company}\n{role}\n{company} · Remote\nApplied on October {day}\n'
+     'View job: https://www.linkedin.com/jobs/view/{number}', 'Applied'),
+    ('{company} <{slug}@myworkday.com>', 'Online assessment for {role}',
+     'Hi {name},\nAs the next step for the {role} position at {company}, we would like to invite you to '
+     'complete an online assessment.\nPlease complete it within {day} days using the link below.\n'
+     'https://{slug}.wd5.myworkdayjobs.com/assessment/{number}\nBest regards,\n{company} Talent Acquisition',
+     'Assessment'),
+    ('{company} Recruiting <no-reply@us.greenhouse-mail.io>', 'Interview availability - {role}',
+     'Hi {name},\nThanks again for your interest in {company}! The team would like to schedule a 30 minute '
+     'phone interview for the {role} position.\nPlease share your availability for the next week.\n'
+     'Talk soon,\nThe {company} Recruiting Team', 'Interview'),
+    ('{company} <no-reply@hire.lever.co>', 'Update on your {company} application',
+     'Hi {name},\nThank you for taking the time to apply for the {role} role.\nAfter reviewing your '
+     'background, we won\'t be moving ahead with your application at this time.\nWe wish you the best '
+     'in your search.', 'Rejected'),
+    # Same sender and subject as the rejection, different news
+    ('{company} <no-reply@hire.lever.co>', 'Update on your {company} application',
+     'Hi {name},\nThank you for taking the time to apply for the {role} role.\nAfter reviewing your '
+     'background, we would like to invite you to a first interview with the team.\nWe look forward '
+     'to speaking with you.', 'Interview')
+]
+ONE_OFF = ('{recruiter} <{recruiter_slug}@gmail.com>', 'Quick question about your background',
+           'Hi {name},\nI came across your profile and think you could be a great fit for a {role} '
+           'opening I am hiring for at {company}. Are you open to a short call this week?\n{recruiter}',
+           'Other')
+
+def make_mailbox(count, one_off_share, seed):
+    """(email, true extraction) pairs in arrival order"""
+    rng = random.Random(seed)
+    mailbox = []
+    for i in range(count):
+        company, role = rng.choice(COMPANIES), rng.choice(ROLES)
+        recruiter = f'{rng.choice(NAMES)} {rng.choice(["Lee", "Patel", "Garcia", "Kim"])} {i}'
+        sender, subject, body, status = ONE_OFF if rng.random() < one_off_share else rng.choice(TEMPLATES)
+        fields = {'company': company, 'role': role, 'name': OWNER, 'day': rng.randint(2, 28),
+                  'number': rng.randint(10 ** 6, 10 ** 7), 'slug': company.split()[0].lower(),
+                  'recruiter': recruiter, 'recruiter_slug': recruiter.lower().replace(' ', '.')}
+        email = {'id': f'msg{i:06d}', 'from': sender.format(**fields), 'subject': subject.format(**fields),
+                 'body': body.format(**fields), 'date': '2025-10-20'}
+        mailbox.append((email, {'company': company, 'role': role, 'status': status, 'is_job_related': True}))
+    return mailbox
+
+def truth_reply(mailbox):
+    """Stub reply function answering each prompt with its email's true fields"""
+    by_subject = {}
+    for email, truth in mailbox:
+        by_subject.setdefault(email['subject'], []).append(truth)
+    
+    def reply(prompt, failure_rate, rng, structured=False):
+        subject = re.search(r'^Subject: (.*)$', prompt, re.MULTILINE).group(1)
+        candidates = by_subject.get(subject, [])
+        truth = next((item for item in candidates if item['company'] in prompt and item['role'] in prompt),
+                     candidates[0])
+        return json.dumps(truth), 1
+    return reply
+
+def run(tmp, name, mailbox, latency, templates):
+    database.DB_FILE = os.path.join(tmp, f'{name}.db')
+    config.TEMPLATE_MIN_AGREEMENTS = 2 if templates else len(mailbox) + 1
+    sources, correct = {}, 0
+    
+    with StubOllamaServer(latency, reply=truth_reply(mailbox)) as stub, \
+            contextlib.redirect_stdout(io.StringIO()):
+        ai_analyzer.OLLAMA_API_URL = stub.url
+        database.init_database()
+        start = time.perf_counter()
+        for email, truth in mailbox:
+            data = ai_analyzer.extract_job_info(email)
+            sources[data['source']] = sources.get(data['source'], 0) + 1
+            if data['source'] == 'template':
+                correct += email_templates.agrees(data, truth)
+        elapsed = time.perf_counter() - start
+        database.close_connection()
+    
+    hits = sources.get('template', 0)
+    lookups = hits + sources.get('llm', 0)
+    print(f"{name:<12}{stub.requests:>10}{sources.get('rules', 0):>8}{hits:>11}"
+          f"{hits / lookups if lookups else 0:>10.1%}"
+          f"{f'{correct}/{hits}' if hits else '-':>10}{elapsed / len(mailbox) * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    one_off_share = float(sys.argv[2]) if len(sys.argv) > 2 else 0.15
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    
+    mailbox = make_mailbox(count, one_off_share, seed=1)
+    print(f"\n{count} emails ({one_off_share:.0%} one-off recruiter mail), stub latency {latency:g}s\n")
+    print(f"{'':<12}{'requests':>10}{'rules':>8}{'templates':>11}{'hit rate':>10}{'correct':>10}{'ms/email':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        run(tmp, 'no templates', mailbox, latency, templates=False)
+        run(tmp, 'templates', mailbox, latency, templates=True)
@@ -0,0 +1,190 @@
+"""Offline Gmail backend for benchmarks: an httplib2-compatible mock.
+
+The real googleapiclient Gmail service is built against GmailHttpMock, so
+email_fetcher exercises the genuine request/batch code paths while the
+mock serves a synthetic mailbox and counts HTTP round trips and bytes.
+"""
+import base64
+import email.parser
+import json
+import re
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+from googleapiclient.discovery import build
+
+import config
+
+class GmailHttpMock:
+    """Serves messages.list/get, history.list, getProfile and /batch"""
+    
+    def __init__(self, emails=(), page_size=500, history_floor=1, latency=0.0, address=None):
+        self.address = address or config.GMAIL_ADDRESS
+        self.messages = {}
+        self.history = []  # (history_id, message_id)
+        self.history_id = 1
+        self.history_floor = history_floor
+        self.page_size = page_size
+        self.latency = latency  # Simulated network delay per round trip
+        self.calls = Counter()
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        
+        for message in emails:
+            self.add_email(message)
+    
+    def add_email(self, message):
+        """Deliver a message, advancing the mailbox historyId"""
+        self.history_id += 1
+        message_id = message.get('id') or f'{self.history_id:016x}'
+        self.messages[message_id] = dict(message, id=message_id)
+        self.history.append((self.history_id, message_id))
+        return message_id
+    
+    def expire_history(self):
+        """Simulate Gmail discarding all history up to now"""
+        self.history_floor = self.history_id + 1
+    
+    def reset_stats(self):
+        self.calls.clear()
+        self.round_trips = self.bytes_sent = self.bytes_received = 0
+    
+    # httplib2.Http interface
+    
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.round_trips += 1
+        self.bytes_sent += len(body or '') + len(uri)
+        time.sleep(self.latency)
+        
+        if urlsplit(uri).path == '/batch':
+            resp, content = self._batch(body, headers)
+        else:
+            resp, content = self._dispatch(method, uri)
+            content = json.dumps(content).encode('utf-8')
+            resp = httplib2.Response({'status': resp, 'content-type': 'application/json'})
+        
+        self.bytes_received += len(content)
+        return resp, content
+    
+    def _batch(self, body, headers):
+        parsed = email.parser.Parser().parsestr(
+            f"content-type: {headers['content-type']}\r\n\r\n{body}"
+        )
+        boundary = uuid.uuid4().hex
+        parts = []
+        
+        for part in parsed.get_payload():
+            request_line = part.get_payload().split('\n', 1)[0]
+            method, path, _ = request_line.split(' ', 2)
+            status, content = self._dispatch(method, 'https://gmail.googleapis.com' + path)
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            parts.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                f"Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(content)}\r\n"
+            )
+        
+        content = (''.join(parts) + f"--{boundary}--").encode('utf-8')
+        resp = httplib2.Response({
+            'status': 200,
+            'content-type': f'multipart/mixed; boundary={boundary}'
+        })
+        return resp, content
+    
+    def _dispatch(self, method, uri):
+        url = urlsplit(uri)
+        params = parse_qs(url.query)
+        path = url.path.split('/gmail/v1/users/me', 1)[1]
+        
+        if path == '/profile':
+            return self._profile()
+        if path == '/messages':
+            return self._list(params)
+        if path == '/history':
+            return self._history(params)
+        match = re.fullmatch(r'/messages/([^/]+)', path)
+        if match:
+            return self._get(match.group(1), params)
+        return 404, {'error': {'code': 404, 'message': f'Unknown path {path}'}}
+    
+    # Gmail endpoints
+    
+    def _page(self, items, params):
+        start = int(params.get('pageToken', ['0'])[0])
+        size = min(int(params.get('maxResults', [self.page_size])[0]), self.page_size)
+        end = start + size
+        return items[start:end], (str(end) if end < len(items) else None)
+    
+    def _matches(self, message):
+        text = ' '.join([message['subject'], message['from'], message['body']]).lower()
+        return any(keyword.lower() in text for keyword in config.JOB_KEYWORDS)
+    
+    def _list(self, params):
+        self.calls['messages.list'] += 1
+        ids = [mid for mid, message in self.messages.items() if self._matches(message)]
+        page, token = self._page(ids, params)
+        result = {'messages': [{'id': mid, 'threadId': mid} for mid in page]}
+        if token:
+            result['nextPageToken'] = token
+        return 200, result
+    
+    def _get(self, message_id, params):
+        fmt = params.get('format', ['full'])[0]
+        self.calls[f'messages.get:{fmt}'] += 1
+        
+        if message_id not in self.messages:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        
+        message = self.messages[message_id]
+        headers = [
+            {'name': 'Subject', 'value': message['subject']},
+            {'name': 'From', 'value': message['from']},
+            {'name': 'Date', 'value': message['date']},
+        ]
+        
+        if fmt == 'metadata':
+            wanted = params.get('metadataHeaders')
+            if wanted:
+                headers = [h for h in headers if h['name'] in wanted]
+            return 200, {'id': message_id, 'payload': {'mimeType': 'text/plain', 'headers': headers}}
+        
+        payload = message.get('payload') or {
+            'mimeType': 'text/plain',
+            'body': {
+                'size': len(message['body']),
+                'data': base64.urlsafe_b64encode(message['body'].encode('utf-8')).decode('ascii')
+            }
+        }
+        return 200, {'id': message_id, 'payload': dict(payload, headers=headers)}
+    
+    def _history(self, params):
+        self.calls['history.list'] += 1
+        start_history_id = int(params['startHistoryId'][0])
+        
+        if start_history_id < self.history_floor:
+            return 404, {'error': {'code': 404, 'message': 'Requested entity was not found.'}}
+        
+        records = [
+            {'id': str(hid), 'messagesAdded': [{'message': {'id': mid}}]}
+            for hid, mid in self.history if hid > start_history_id
+        ]
+        page, token = self._page(records, params)
+        result = {'history': page, 'historyId': str(self.history_id)}
+        if token:
+            result['nextPageToken'] = token
+        return 200, result
+    
+    def _profile(self):
+        self.calls['getProfile'] += 1
+        return 200, {'emailAddress': self.address, 'historyId': str(self.history_id)}
+
+def build_fake_service(mock):
+    """Build a real googleapiclient Gmail service on top of the mock"""
+    return build('gmail', 'v1', http=mock, static_discovery=True, cache_discovery=False)
@@ -0,0 +1,150 @@
+"""Local stand-in for the Ollama HTTP API used by the benchmarks.
+
+Serves /api/generate with a simulated latency and canned JSON
+extractions, so throughput can be measured without a GPU or a model.
+Latency is a fixed per-request overhead plus a prefill cost proportional
+to prompt length plus a decode cost per generated extraction.
+
+Requests with a `format` schema get structured output like Ollama 0.5+:
+always well-formed JSON, so failures show up as a job email with no
+company rather than as unparseable text.
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMAIL_HEADER = re.compile(r'^Email (\d+):$', re.MULTILINE)
+
+def fake_item(subject):
+    """Extraction for one email, judged from its subject"""
+    is_job = not re.search(r'%\s*OFF|sale|deal', subject, re.IGNORECASE)
+    return {
+        "company": "Acme" if is_job else "",
+        "role": "Software Engineer" if is_job else "",
+        "status": "Applied" if is_job else "Other",
+        "is_job_related": is_job
+    }
+
+def fake_extraction(prompt, failure_rate=0.0, rng=random, structured=False):
+    """Build a plausible reply for a single or batched extraction prompt.
+    
+    Returns (reply text, number of extractions generated).
+    """
+    subjects = re.findall(r'^Subject: (.*)$', prompt, re.MULTILINE)
+    
+    if not EMAIL_HEADER.search(prompt):
+        item = fake_item(subjects[0] if subjects else '')
+        if rng.random() < failure_rate:
+            if not structured:
+                return 'Sure! Here is the JSON you asked for: {"company": "Acme",', 1
+            item['company'] = ''
+        return json.dumps(item), 1
+    
+    items = []
+    for index, subject in enumerate(subjects, 1):
+        item = dict(fake_item(subject), index=index)
+        if rng.random() < failure_rate:
+            if structured:
+                item['company'] = ''
+            else:
+                del item['status']
+        items.append(item)
+    return json.dumps(items), len(items)
+
+class StubOllamaServer:
+    """Threaded HTTP server answering like Ollama"""
+    
+    def __init__(self, latency=0.5, port=0, reply=fake_extraction,
+                 prefill_per_kchar=0.0, decode_per_item=0.0, failure_rate=0.0,
+                 slots=None, seed=0):
+        self.latency = latency                      # Seconds of fixed overhead per request
+        self.prefill_per_kchar = prefill_per_kchar  # Seconds per 1000 prompt characters
+        self.decode_per_item = decode_per_item      # Seconds per generated extraction
+        self.failure_rate = failure_rate            # Share of extractions returned malformed
+        self.reply = reply
+        self.requests = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        # Like OLLAMA_NUM_PARALLEL: requests beyond this many wait their turn
+        self._slots = threading.Semaphore(slots) if slots else None
+        
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                prompt = payload.get('prompt', '')
+                
+                with stub._lock:
+                    stub.requests += 1
+                    stub.prompt_chars += len(prompt)
+                    text, generated = stub.reply(prompt, stub.failure_rate, stub._rng,
+                                                 isinstance(payload.get('format'), dict))
+                
+                if stub._slots:
+                    stub._slots.acquire()
+                try:
+                    time.sleep(stub.latency
+                               + stub.prefill_per_kchar * len(prompt) / 1000
+                               + stub.decode_per_item * generated)
+                finally:
+                    if stub._slots:
+                        stub._slots.release()
+                
+                body = json.dumps({
+                    "model": payload.get('model', ''),
+                    "response": text,
+                    "done": True,
+                    "prompt_eval_count": len(prompt) // 4,
+                    "eval_count": len(text) // 4
+                }).encode('utf-8')
+                
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/generate"
+    
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def make_emails(count, spam_ratio=0.3, offset=0):
+    """Generate synthetic emails shaped like fetch_job_emails() output"""
+    emails = []
+    for i in range(offset, offset + count):
+        if i % 10 < spam_ratio * 10:
+            subject = f'50% OFF Everything - Deal #{i}'
+            sender = 'Promotions <deals@shopping.com>'
+            body = 'Huge sale! Get 50% off all items. Shop now!'
+        else:
+            subject = f'Thank you for applying to Software Engineer #{i}'
+            sender = 'Acme Careers <noreply@acme.com>'
+            body = 'We have received your application and will review it shortly.'
+        
+        emails.append({
+            'id': f'msg{i:06d}',
+            'subject': subject,
+            'from': sender,
+            'date': '2025-10-20',
+            'body': body
+        })
+    return emails
@@ -5,6 +5,12 @@ GMAIL_ADDRESS = "pranavpenjarla@gmail.com"
 CREDENTIALS_FILE = "credentials.json"
 TOKEN_FILE = "token.pkl"  # Changed to .pkl for pickle
 
+# Mailboxes to track, each with its own token file; GMAIL_ADDRESS is the default
+GMAIL_ACCOUNTS = {
+    GMAIL_ADDRESS: TOKEN_FILE,
+    # "someone.else@gmail.com": "token_someone_else.pkl",
+}
+
 # Gmail API Scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
@@ -20,4 +26,74 @@ JOB_KEYWORDS = [
     "interview", "assessment", "opportunity", "linkedin",
     "thank you for applying", "application received",
     "noreply", "jobs-noreply", "recruiting"
-]
\ No newline at end of file
+]
+
+# Subject words that mark an email as a promotion (checked before downloading bodies)
+PROMO_KEYWORDS = [
+    "% off", "sale ends", "flash sale", "discount", "coupon", "promo code",
+    "free shipping", "limited time", "deal of the day", "black friday"
+]
+
+# Applicant tracking systems that send mail on behalf of employers
+ATS_SENDER_DOMAINS = [
+    "greenhouse.io", "greenhouse-mail.io", "lever.co", "myworkday.com", "workday.com",
+    "smartrecruiters.com", "icims.com", "ashbyhq.com", "jobvite.com", "taleo.net"
+]
+
+# Gmail API batching (Gmail rate-limits batches of more than 50 requests)
+GMAIL_BATCH_SIZE = 50
+GMAIL_MAX_RETRIES = 3      # Extra attempts for messages a batch failed to return (429/5xx)
+GMAIL_RETRY_BACKOFF = 1.0  # Base delay in seconds, doubled after each retry
+GMAIL_QUOTA_UNITS_PER_SECOND = 250  # Gmail API quota per account (0 = no limit)
+
+# AI analysis settings
+OLLAMA_CONCURRENCY = 4      # Parallel requests sent to Ollama during a scan
+OLLAMA_TIMEOUT = 300        # Seconds to wait for a single Ollama response
+OLLAMA_MAX_RETRIES = 2      # Extra attempts after a timeout/connection/5xx error
+OLLAMA_RETRY_BACKOFF = 2.0  # Base delay in seconds, doubled after each retry
+OLLAMA_BATCH_SIZE = 1       # Emails packed into one prompt (1 = one prompt per email)
+PROMPT_BODY_TOKENS = 400    # Budget for the email body in a prompt (about 4 characters per token)
+OLLAMA_STRUCTURED_OUTPUT = True  # Constrain replies to a JSON schema (Ollama 0.5+); False asks for plain JSON
+
+# Email template settings (ATS mail answered from templates learned from earlier model answers)
+TEMPLATE_MAX_DISTANCE = 3      # SimHash bits (of 64) two emails may differ by and still share a template
+TEMPLATE_MIN_AGREEMENTS = 2    # Model answers a template must reproduce before it is used
+TEMPLATE_MIN_CONFIDENCE = 0.8  # Share of reproduced answers, counting ones it got wrong
+EMAIL_TEMPLATE_MAX_ENTRIES = 5000  # Least recently used templates beyond this are evicted
+
+# Scan pipeline settings
+SCAN_COMMIT_EVERY = 10  # Emails per database transaction while scanning
+
+# Extraction cache settings
+EXTRACTION_CACHE_MAX_ENTRIES = 20000  # Least recently used entries beyond this are evicted
+EXTRACTION_CACHE_EVICT_EVERY = 100  # Cache inserts between evictions, so the cap can be overshot by this many
+
+# Search settings
+SEARCH_BODY_CHARS = 5000  # Characters of each email body kept for full-text search
+SEARCH_RANK_MAX_MATCHES = 1000  # Searches matching more applications rank only about this many of the newest
+
+# API response settings
+JOB_CHANGES_LIMIT = 1000  # Most changed applications one /api/jobs?since= response returns
+COMPRESS_MIN_BYTES = 1024  # JSON responses smaller than this are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Used instead of gzip when the brotli package is installed and the client accepts br
+
+# Export settings
+EXPORT_CHUNK_SIZE = 1000  # Rows read from the database per chunk while exporting
+
+# Scan event settings
+SCAN_EVENT_HISTORY = 1000  # Recent scan events kept for clients that reconnect
+SCAN_EVENT_KEEPALIVE = 15  # Seconds between keep-alive comments on an idle event stream
+
+# Entity resolution settings (trigram similarity, 0-1, for two spellings to count as one)
+COMPANY_MATCH_THRESHOLD = 0.6
+ROLE_MATCH_THRESHOLD = 0.6
+COMPANY_LSH_MAX_CANDIDATES = 200  # Similar-looking companies verified per lookup, most alike first
+
+# Scan job settings
+SCAN_WORKERS = 2  # Scans that can run at once (one per Gmail account at a time)
+
+# Production server settings (python wsgi.py)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5000
+SERVER_THREADS = 16  # Request threads; each open /api/scan/events stream holds one
\ No newline at end of file
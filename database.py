@@ -1,130 +1,1410 @@
 import sqlite3
+import base64
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import os
+import config
+import entity_resolution
+import metrics
 
 DB_FILE = "job_tracker.db"
 
-def init_database():
-    """Initialize SQLite database"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+# Applied to every new connection. WAL lets the scan thread write while
+# request threads keep reading; NORMAL sync is safe with WAL and much faster.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,      # Negative means KiB, so ~20 MB of page cache
+    'mmap_size': 268435456,    # Map up to 256 MB of the file instead of read() calls
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000
+}
+
+_local = threading.local()
+
+def get_connection():
+    """Get this thread's connection to DB_FILE, opening it on first use.
+    
+    Connections live for the lifetime of the thread, so each keeps its
+    page cache and prepared statement cache between calls.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    
+    conn = connections.get(DB_FILE)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=5, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        connections[DB_FILE] = conn
+    
+    return conn
+
+def close_connection():
+    """Close this thread's connections"""
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.close()
+    _local.connections = {}
+
+@contextmanager
+def transaction(operation=None):
+    """Cursor on this thread's connection, committed on success and rolled back on error.
+    
+    Transactions given an operation name are timed in metrics.DB_WRITE_SECONDS.
+    """
+    conn = get_connection()
+    timer = metrics.DB_WRITE_SECONDS.time(operation=operation) if operation else nullcontext()
+    with timer, conn:
+        yield conn.cursor()
+
+# Applications are kept per Gmail account, so the same company and role
+# can be tracked in two mailboxes
+JOB_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        company TEXT NOT NULL,
+        role TEXT NOT NULL,
+        date_applied TEXT,
+        status TEXT,
+        email_subject TEXT,
+        email_from TEXT,
+        notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        email_body TEXT,
+        first_response_at TEXT,
+        company_key TEXT,
+        role_key TEXT,
+        account TEXT NOT NULL DEFAULT '',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(account, company, role)
+    )
+'''
+
+# Stored in PRAGMA user_version once init_database has brought a database
+# up to date; bump it whenever init_database changes the schema
+SCHEMA_VERSION = 8
+
+def schema_version():
+    """Schema version of DB_FILE, 0 for a new or never initialized database"""
+    return get_connection().execute('PRAGMA user_version').fetchone()[0]
+
+def init_database(force=False):
+    """Create the schema or migrate an older one.
+    
+    This is an explicit step run by the server entry points and
+    `python database.py`, not on import. A database already at
+    SCHEMA_VERSION is left alone, so restarts skip the migration checks
+    and backfills; `force` runs them anyway.
+    """
+    if not force and schema_version() == SCHEMA_VERSION:
+        print("✓ Database up to date")
+        return
+    
+    with transaction() as cursor:
+        cursor.execute(JOB_TABLE_SQL.format(table='job_applications'))
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                days_back INTEGER,
+                emails_scanned INTEGER,
+                jobs_found INTEGER
+            )
+        ''')
+        
+        # Columns added after the first release; older databases get them here
+        add_column_if_missing(cursor, 'scan_history', 'llm_calls', 'INTEGER')
+        add_column_if_missing(cursor, 'scan_history', 'rule_decisions', 'INTEGER DEFAULT 0')
+        add_column_if_missing(cursor, 'scan_history', 'cache_hits', 'INTEGER DEFAULT 0')
+        add_column_if_missing(cursor, 'scan_history', 'metrics', 'TEXT')
+        add_column_if_missing(cursor, 'scan_history', 'template_hits', 'INTEGER DEFAULT 0')
+        add_column_if_missing(cursor, 'scan_history', 'account', 'TEXT')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                message_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                result TEXT NOT NULL,
+                last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Email templates learned from model answers, see email_templates.py
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                domain TEXT NOT NULL,
+                fingerprint INTEGER NOT NULL,
+                rule TEXT NOT NULL,
+                agreements INTEGER DEFAULT 0,
+                conflicts INTEGER DEFAULT 0,
+                hits INTEGER DEFAULT 0,
+                last_used TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_templates_domain
+            ON email_templates(domain)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                account TEXT PRIMARY KEY,
+                history_id TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # State of an unfinished scan, so it can resume after a crash or restart
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_checkpoint (
+                account TEXT PRIMARY KEY,
+                days_back INTEGER,
+                mode TEXT,
+                history_id TEXT,
+                keyword_filter INTEGER DEFAULT 0,
+                total_emails INTEGER DEFAULT 0,
+                emails_scanned INTEGER DEFAULT 0,
+                jobs_found INTEGER DEFAULT 0,
+                jobs_added INTEGER DEFAULT 0,
+                llm_calls INTEGER DEFAULT 0,
+                rule_decisions INTEGER DEFAULT 0,
+                cache_hits INTEGER DEFAULT 0,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        add_column_if_missing(cursor, 'scan_checkpoint', 'template_hits', 'INTEGER DEFAULT 0')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_pending (
+                account TEXT NOT NULL,
+                message_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (account, message_id)
+            )
+        ''')
+        
+        # Scans as background jobs: queued, running, then cancelled, done or failed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scan_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account TEXT NOT NULL,
+                days_back INTEGER,
+                mode TEXT,
+                state TEXT NOT NULL DEFAULT 'queued',
+                progress INTEGER DEFAULT 0,
+                message TEXT DEFAULT '',
+                jobs_found INTEGER,
+                jobs_added INTEGER,
+                cancel_requested INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        
+        add_column_if_missing(cursor, 'job_applications', 'email_body', 'TEXT')
+        add_column_if_missing(cursor, 'job_applications', 'first_response_at', 'TEXT')
+        add_column_if_missing(cursor, 'job_applications', 'company_key', 'TEXT')
+        add_column_if_missing(cursor, 'job_applications', 'role_key', 'TEXT')
+        upgrade_job_table(cursor)
+        # Older versions stored the raw email Date header; store ISO dates so
+        # they sort. Before the backfills below, which copy date_applied.
+        normalize_dates(cursor, 'job_applications', 'date_applied')
+        init_search_index(cursor)
+        init_stats(cursor)
+        init_entity_index(cursor)
+        init_status_events(cursor)
+        init_changes(cursor)
+        
+        # Indexes behind the /api/jobs filters, sort orders and keyset pagination.
+        # Dates are indexed as sorted, with NULL as '' (see JOB_SORT_KEYS);
+        # the older plain-column indexes are replaced.
+        for index in ('idx_jobs_status_date', 'idx_jobs_date', 'idx_jobs_account_date'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_date_key
+            ON job_applications(status, COALESCE(date_applied, ''), id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_date_key
+            ON job_applications(COALESCE(date_applied, ''), id)
+        ''')
+        # NOCASE so that case-insensitive LIKE 'prefix%' can use the index
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_company
+            ON job_applications(company COLLATE NOCASE, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_account_date_key
+            ON job_applications(account, COALESCE(date_applied, ''), id)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used
+            ON extraction_cache(last_used)
+        ''')
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
+    print("✓ Database initialized")
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def normalize_dates(cursor, table, column):
+    """Rewrite dates in `column` that aren't YYYY-MM-DD with normalize_date"""
+    cursor.execute(f'''
+        SELECT id, {column} FROM {table}
+        WHERE {column} NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    ''')
+    cursor.executemany(
+        f'UPDATE {table} SET {column} = ? WHERE id = ?',
+        [(normalize_date(date), row_id) for row_id, date in cursor.fetchall()]
+    )
+
+def upgrade_job_table(cursor):
+    """Rebuild job_applications from before per-account applications or updated_at.
+    
+    SQLite can't change a UNIQUE constraint or add a column defaulting to
+    CURRENT_TIMESTAMP in place, so the table is rebuilt, keeping every id
+    so the search index, stats and status events stay valid. Existing
+    applications belong to GMAIL_ADDRESS and were last updated when
+    created. The triggers and indexes dropped with the old table are
+    recreated by the init functions that run after this one.
+    """
+    cursor.execute('PRAGMA table_info(job_applications)')
+    columns = [row[1] for row in cursor.fetchall()]
+    added = {'account': '?', 'updated_at': 'created_at'}
+    added = {column: value for column, value in added.items() if column not in columns}
+    if not added:
+        return
+    
+    # Refers to job_applications, which briefly won't exist
+    cursor.execute('DROP TRIGGER IF EXISTS status_events_first_response')
+    cursor.execute(JOB_TABLE_SQL.format(table='job_applications_new'))
+    cursor.execute(f'''
+        INSERT INTO job_applications_new ({', '.join(columns + list(added))})
+        SELECT {', '.join(columns + list(added.values()))} FROM job_applications
+    ''', (config.GMAIL_ADDRESS,) if 'account' in added else ())
+    cursor.execute('DROP TABLE job_applications')
+    cursor.execute('ALTER TABLE job_applications_new RENAME TO job_applications')
+    if 'account' in added:
+        print(f"✓ Existing applications assigned to {config.GMAIL_ADDRESS}")
+
+def init_changes(cursor):
+    """Create the job_changes log behind /api/jobs?since= and the triggers that fill it.
+    
+    job_changes keeps one row per application with the sequence number
+    of its latest insert, update or delete, so a client that has seen
+    every change up to a number can ask for just the ones after it.
+    Deleted applications stay as tombstones. Every update also sets
+    updated_at. Older databases log their existing applications once.
+    
+    The triggers upsert rather than INSERT OR REPLACE: a trigger takes
+    the conflict policy of the statement that fired it, and insert_jobs
+    is itself an upsert, so OR REPLACE would fail on a job logged before.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_changes'")
+    exists = cursor.fetchone() is not None
     
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS job_applications (
+        CREATE TABLE IF NOT EXISTS job_changes (
+            job_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL UNIQUE,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    change = ("INSERT INTO job_changes (job_id, seq, deleted) "
+              "VALUES ({row}.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_changes), {deleted}) "
+              "ON CONFLICT(job_id) DO UPDATE SET seq = excluded.seq, deleted = excluded.deleted;")
+    # Schema version 2 created them with INSERT OR REPLACE
+    for trigger in ('jobs_changes_insert', 'jobs_changes_update', 'jobs_changes_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute(f'''
+        CREATE TRIGGER jobs_changes_insert AFTER INSERT ON job_applications BEGIN
+            {change.format(row='new', deleted=0)}
+        END
+    ''')
+    # Triggers don't fire themselves again, so setting updated_at here is safe
+    cursor.execute(f'''
+        CREATE TRIGGER jobs_changes_update AFTER UPDATE ON job_applications BEGIN
+            UPDATE job_applications SET updated_at = CURRENT_TIMESTAMP WHERE id = new.id;
+            {change.format(row='new', deleted=0)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER jobs_changes_delete AFTER DELETE ON job_applications BEGIN
+            {change.format(row='old', deleted=1)}
+        END
+    ''')
+    
+    if not exists:
+        cursor.execute('INSERT INTO job_changes (job_id, seq) SELECT id, id FROM job_applications')
+
+SEARCH_COLUMNS = ('company', 'role', 'email_subject', 'notes', 'email_body')
+# bm25 weights, in SEARCH_COLUMNS order: a company/role hit outranks a body hit
+SEARCH_WEIGHTS = (10.0, 8.0, 4.0, 2.0, 1.0)
+
+def init_search_index(cursor):
+    """Create the FTS5 index over job_applications and the triggers that keep it in sync.
+    
+    The index is an external-content table, so it stores only the
+    tokens; the text itself stays in job_applications. Databases created
+    before search existed are indexed once, when the table is first made.
+    The index's rank column is bm25 with SEARCH_WEIGHTS.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs_fts'")
+    exists = cursor.fetchone() is not None
+    
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(
+            {columns},
+            content='job_applications', content_rowid='id',
+            tokenize='porter unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS jobs_fts_insert AFTER INSERT ON job_applications BEGIN
+            INSERT INTO jobs_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS jobs_fts_delete AFTER DELETE ON job_applications BEGIN
+            INSERT INTO jobs_fts(jobs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS jobs_fts_update
+        AFTER UPDATE OF {columns} ON job_applications BEGIN
+            INSERT INTO jobs_fts(jobs_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO jobs_fts(rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    cursor.execute("INSERT INTO jobs_fts(jobs_fts, rank) VALUES ('rank', ?)", (f'bm25({weights})',))
+    
+    if not exists:
+        cursor.execute("INSERT INTO jobs_fts(jobs_fts) VALUES ('rebuild')")
+
+# Statuses that mean the employer got back to the applicant
+RESPONSE_STATUSES = ('Interview', 'Assessment', 'Offer', 'Rejected')
+
+def stats_delta_sql(row, sign):
+    """Statements adding (sign=1) or removing (sign=-1) one job row's share of job_stats"""
+    bump = ("INSERT INTO job_stats (name, value) SELECT {name}, {value} {where} "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;")
+    days = f"julianday({row}.first_response_at) - julianday({row}.date_applied)"
+    return '\n'.join([
+        bump.format(name=f"'status:' || COALESCE({row}.status, 'Other')", value=sign, where='WHERE 1'),
+        bump.format(name=f"'week:' || date({row}.date_applied, 'weekday 0', '-6 days')", value=sign,
+                    where=f"WHERE date({row}.date_applied) IS NOT NULL"),
+        bump.format(name="'responses'", value=sign,
+                    where=f"WHERE {days} IS NOT NULL"),
+        bump.format(name="'response_days'", value=f"{sign} * ({days})",
+                    where=f"WHERE {days} IS NOT NULL"),
+    ])
+
+def init_stats(cursor):
+    """Create the job_stats table and the triggers that keep it current.
+    
+    job_stats holds running counters (per status, per week and response
+    times) that triggers adjust on every insert, update and delete of a
+    job, so reading the stats never scans job_applications. `version`
+    goes up with every change and serves as the /api/stats ETag.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'job_stats'")
+    exists = cursor.fetchone() is not None
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_stats (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    version = ("INSERT INTO job_stats (name, value) VALUES ('version', 1) "
+               "ON CONFLICT(name) DO UPDATE SET value = value + 1;")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS jobs_stats_insert AFTER INSERT ON job_applications BEGIN
+            {stats_delta_sql('new', 1)}
+            {version}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS jobs_stats_delete AFTER DELETE ON job_applications BEGIN
+            {stats_delta_sql('old', -1)}
+            {version}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS jobs_stats_update
+        AFTER UPDATE OF status, date_applied, first_response_at ON job_applications
+        WHEN old.status IS NOT new.status OR old.date_applied IS NOT new.date_applied
+            OR old.first_response_at IS NOT new.first_response_at
+        BEGIN
+            {stats_delta_sql('old', -1)}
+            {stats_delta_sql('new', 1)}
+            {version}
+        END
+    ''')
+    
+    if not exists:
+        # Existing database: count what is already there once
+        cursor.execute('''
+            INSERT INTO job_stats (name, value)
+            SELECT 'status:' || COALESCE(status, 'Other'), COUNT(*)
+            FROM job_applications GROUP BY 1
+        ''')
+        cursor.execute('''
+            INSERT INTO job_stats (name, value)
+            SELECT 'week:' || date(date_applied, 'weekday 0', '-6 days'), COUNT(*)
+            FROM job_applications WHERE date(date_applied) IS NOT NULL GROUP BY 1
+        ''')
+        cursor.execute('''
+            INSERT INTO job_stats (name, value)
+            SELECT 'responses', COUNT(*) FROM job_applications
+            WHERE julianday(first_response_at) - julianday(date_applied) IS NOT NULL
+            UNION ALL
+            SELECT 'response_days', COALESCE(SUM(julianday(first_response_at) - julianday(date_applied)), 0)
+            FROM job_applications
+            WHERE julianday(first_response_at) - julianday(date_applied) IS NOT NULL
+            UNION ALL
+            SELECT 'version', 1
+        ''')
+
+# Order in which an application moves through statuses; a later email only
+# changes a matched application's status if it moves it forward
+STATUS_RANK = {'Other': 0, 'Applied': 1, 'Assessment': 2, 'Interview': 3, 'Offer': 4, 'Rejected': 4}
+
+def status_rank_sql(expression):
+    """SQL CASE giving the STATUS_RANK of a status expression"""
+    cases = ' '.join(f"WHEN '{status}' THEN {rank}" for status, rank in STATUS_RANK.items())
+    return f'(CASE {expression} {cases} ELSE 0 END)'
+
+def init_status_events(cursor):
+    """Create the status_events table, one row per status seen for a job.
+    
+    Every extracted email adds an event, whether or not it changed the
+    job's status, so the timeline shows the whole history. An email is
+    recorded once per job however often it is rescanned. Older databases
+    get one event per job for its current status.
+    
+    A job's date_applied and first_response_at are worked out from all
+    of its events whenever one is added, since a scan sees the newest
+    mail first: the Interview email is often saved before the Applied
+    confirmation it answers.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'status_events'")
+    exists = cursor.fetchone() is not None
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS status_events (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            company TEXT NOT NULL,
-            role TEXT NOT NULL,
-            date_applied TEXT,
-            status TEXT,
+            job_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            message_id TEXT,
+            event_date TEXT,
             email_subject TEXT,
-            email_from TEXT,
-            notes TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(company, role)
+            UNIQUE(job_id, message_id)
         )
     ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_status_events_job
+        ON status_events(job_id, event_date)
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS jobs_events_delete AFTER DELETE ON job_applications BEGIN
+            DELETE FROM status_events WHERE job_id = old.id;
+        END
+    ''')
+    
+    # date_applied is the earliest Applied email (or the earliest email, if
+    # none said Applied); first_response_at the earliest response email on
+    # or after it. These replace older triggers that only looked at the new
+    # event, or stamped the scan date.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'status_events_dates'")
+    recompute = cursor.fetchone() is None
+    cursor.execute('DROP TRIGGER IF EXISTS jobs_first_response')
+    cursor.execute('DROP TRIGGER IF EXISTS status_events_first_response')
     
+    events = 'SELECT MIN(event_date) FROM status_events WHERE job_id = {job}'
+    applied = f"({events} AND status = 'Applied')"
+    responses = ', '.join(f"'{status}'" for status in RESPONSE_STATUSES)
+    date_applied = f'COALESCE({applied}, ({events}), date_applied)'
+    first_response = f'({events} AND status IN ({responses}) AND event_date >= {applied})'
+    # Only rows whose dates change are written, so rescans don't show up as changes
+    update = f'''
+        UPDATE job_applications
+        SET date_applied = {date_applied}, first_response_at = {first_response}
+        WHERE {{where}}
+            AND (date_applied IS NOT {date_applied} OR first_response_at IS NOT {first_response})
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER status_events_dates AFTER INSERT ON status_events BEGIN
+            {update.replace('{job}', 'new.job_id').format(where='id = new.job_id')};
+        END
+    ''')
+    
+    if not exists:
+        cursor.execute('''
+            INSERT INTO status_events (job_id, status, event_date, email_subject)
+            SELECT id, COALESCE(status, 'Other'), date_applied, email_subject
+            FROM job_applications
+        ''')
+    # Backfills before schema version 6 could copy raw Date headers
+    normalize_dates(cursor, 'status_events', 'event_date')
+    if recompute:
+        cursor.execute(update.replace('{job}', 'job_applications.id').format(where='1'))
+
+def init_entity_index(cursor):
+    """Create the indexes used to match extracted jobs to existing applications.
+    
+    Every application stores canonical company_key/role_key columns.
+    company_lsh maps MinHash band hashes to company keys, so similarly
+    spelled companies are found without comparing against every one, and
+    company_domains remembers which company each employer mail domain
+    belongs to. Older databases are indexed once here.
+    """
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scan_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            days_back INTEGER,
-            emails_scanned INTEGER,
-            jobs_found INTEGER
+        CREATE TABLE IF NOT EXISTS company_lsh (
+            band INTEGER NOT NULL,
+            company_key TEXT NOT NULL,
+            PRIMARY KEY (band, company_key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS company_domains (
+            domain TEXT PRIMARY KEY,
+            company_key TEXT NOT NULL
         )
     ''')
+    # Matches are looked up by account and a few company keys; on company_key
+    # alone SQLite preferred the account's date index and read all its rows
+    cursor.execute('DROP INDEX IF EXISTS idx_jobs_company_key')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_jobs_account_company_key
+        ON job_applications(account, company_key)
+    ''')
     
-    conn.commit()
-    conn.close()
-    print("✓ Database initialized")
+    cursor.execute('''
+        SELECT id, company, role, email_from FROM job_applications
+        WHERE company_key IS NULL
+        ORDER BY id
+    ''')
+    for job_id, company, role, sender in cursor.fetchall():
+        key = entity_resolution.company_key(company)
+        cursor.execute(
+            'UPDATE job_applications SET company_key = ?, role_key = ? WHERE id = ?',
+            (key, entity_resolution.role_key(role), job_id)
+        )
+        index_company(cursor, key, entity_resolution.lsh_bands(key),
+                      entity_resolution.company_domain(sender))
+    
+    # Before schema version 8 the bands of keys with numbers didn't include them
+    cursor.execute("SELECT DISTINCT company_key FROM company_lsh WHERE company_key GLOB '*[0-9]*'")
+    numbered = [key for (key,) in cursor.fetchall()]
+    cursor.execute("DELETE FROM company_lsh WHERE company_key GLOB '*[0-9]*'")
+    for key in numbered:
+        index_company(cursor, key, entity_resolution.lsh_bands(key), None)
+
+def index_company(cursor, key, bands, domain):
+    """Add a company key to company_lsh, and its mail domain to company_domains"""
+    if not key:
+        return
+    cursor.executemany(
+        'INSERT OR IGNORE INTO company_lsh (band, company_key) VALUES (?, ?)',
+        [(band, key) for band in bands]
+    )
+    if domain:
+        cursor.execute(
+            'INSERT OR IGNORE INTO company_domains (domain, company_key) VALUES (?, ?)',
+            (domain, key)
+        )
+
+def find_matching_job(cursor, key, role, bands, domain, account):
+    """The account's existing application an extracted job refers to, or None.
+    
+    Blocking narrows the search to a handful of companies: the exact key,
+    keys sharing a MinHash band that are verified as the same company,
+    and the company already seen mailing from the sender's domain if the
+    names share a word. Only applications at those companies are compared
+    by role. At most COMPANY_LSH_MAX_CANDIDATES band matches are verified,
+    those sharing the most bands first.
+    """
+    if not key:
+        return None
+    
+    cursor.execute(f'''
+        SELECT company_key FROM company_lsh WHERE band IN ({", ".join("?" * len(bands))})
+        GROUP BY company_key ORDER BY COUNT(*) DESC LIMIT ?
+    ''', bands + [config.COMPANY_LSH_MAX_CANDIDATES])
+    keys = {other for (other,) in cursor.fetchall() if entity_resolution.same_company(key, other)}
+    keys.add(key)
+    if domain:
+        cursor.execute('SELECT company_key FROM company_domains WHERE domain = ?', (domain,))
+        row = cursor.fetchone()
+        if row and entity_resolution.shares_token(key, row[0]):
+            keys.add(row[0])
+    
+    cursor.execute(f'''
+        SELECT id, status, role_key FROM job_applications
+        WHERE company_key IN ({", ".join("?" * len(keys))}) AND account = ?
+    ''', list(keys) + [account])
+    return entity_resolution.best_match(role, [dict(row) for row in cursor.fetchall()])
+
+def normalize_date(value):
+    """Turn an email Date header or ISO date into YYYY-MM-DD (today if unparseable)"""
+    if value:
+        value = str(value).strip()
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+        try:
+            return parsedate_to_datetime(value).strftime('%Y-%m-%d')
+        except (TypeError, ValueError, IndexError):
+            pass
+    return datetime.now().strftime('%Y-%m-%d')
+
+def job_row(job_info):
+    """Column values for inserting an extracted job"""
+    return (
+        job_info.get('company', 'Unknown'),
+        job_info.get('role', 'Unknown'),
+        normalize_date(job_info.get('email_date')),
+        job_info.get('status', 'Other'),
+        job_info.get('email_subject', ''),
+        job_info.get('email_from', ''),
+        '',
+        job_info.get('email_body', '')[:config.SEARCH_BODY_CHARS]
+    )
 
 def add_job_to_db(job_info):
-    """Add job application to database"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    """Add job application to database; False if it matched an existing one"""
+    with transaction() as cursor:
+        return insert_jobs(cursor, [job_info]) > 0
+
+def insert_jobs(cursor, jobs, account=None):
+    """Upsert jobs, resolving each against the account's applications already stored.
     
-    try:
-        cursor.execute('''
-            INSERT INTO job_applications 
-            (company, role, date_applied, status, email_subject, email_from, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            job_info.get('company', 'Unknown'),
-            job_info.get('role', 'Unknown'),
-            job_info.get('email_date', datetime.now().strftime('%Y-%m-%d')),
-            job_info.get('status', 'Other'),
-            job_info.get('email_subject', ''),
-            job_info.get('email_from', ''),
-            ''
-        ))
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        # Duplicate entry
-        conn.close()
-        return False
+    `account` defaults to GMAIL_ADDRESS. A job that matches an existing
+    application of the same account (same company and role,
+    allowing for spelling variants) is not inserted; instead the upsert
+    moves that application's status forward if the new status ranks
+    higher. Jobs earlier in the batch count as existing. Every job also
+    gets a status_events row. Returns the number of rows actually inserted.
+    """
+    account = account or config.GMAIL_ADDRESS
+    added = 0
+    events = []
+    for job in jobs:
+        row = job_row(job)
+        key = entity_resolution.company_key(row[0])
+        role = entity_resolution.role_key(row[1])
+        bands = entity_resolution.lsh_bands(key)
+        domain = entity_resolution.company_domain(row[5])
+        
+        if not key and domain:
+            # No company name extracted: use the one seen mailing from this domain
+            cursor.execute('SELECT company_key FROM company_domains WHERE domain = ?', (domain,))
+            known = cursor.fetchone()
+            if known:
+                key, bands = known[0], entity_resolution.lsh_bands(known[0])
+        
+        cursor.execute(
+            'SELECT id FROM job_applications WHERE account = ? AND company = ? AND role = ?',
+            (account,) + row[:2]
+        )
+        match = cursor.fetchone() or find_matching_job(cursor, key, role, bands, domain, account)
+        job_id = match['id'] if match else None
+        
+        # New jobs get a fresh id; a matched one conflicts on its id and only
+        # has its status moved forward
+        cursor.execute(f'''
+            INSERT INTO job_applications
+            (id, company, role, date_applied, status, email_subject, email_from, notes, email_body,
+             company_key, role_key, account)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET status = excluded.status
+            WHERE {status_rank_sql('excluded.status')} > {status_rank_sql('job_applications.status')}
+        ''', (job_id,) + row + (key, role, account))
+        if job_id is None:
+            job_id = cursor.lastrowid
+            added += 1
+            index_company(cursor, key, bands, domain)
+        events.append((job_id, row[3], job.get('message_id'), row[2], row[4]))
+    
+    cursor.executemany('''
+        INSERT OR IGNORE INTO status_events (job_id, status, message_id, event_date, email_subject)
+        VALUES (?, ?, ?, ?, ?)
+    ''', events)
+    return added
 
-def get_all_jobs():
-    """Get all job applications"""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
+def add_jobs_to_db(jobs, account=None):
+    """Add many job applications in a single transaction; returns how many were new"""
+    with transaction('add_jobs') as cursor:
+        return insert_jobs(cursor, jobs, account)
+
+def get_all_jobs(account=None):
+    """Get all job applications, or those of one account"""
+    conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT * FROM job_applications 
+    cursor.execute(f'''
+        SELECT {', '.join(JOB_COLUMNS)} FROM job_applications 
+        {'WHERE account = ?' if account else ''}
         ORDER BY date_applied DESC
-    ''')
+    ''', (account,) if account else ())
     
     jobs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return jobs
 
+JOB_COLUMNS = ('id', 'company', 'role', 'date_applied', 'status',
+               'email_subject', 'email_from', 'notes', 'created_at', 'account', 'updated_at')
+# Sort key -> ORDER BY expression (company sorts case-insensitively to match its index).
+# Columns that can be NULL sort as '', where SQLite puts NULLs anyway, because
+# a NULL never compares true in the keyset condition and would drop out of pages.
+JOB_SORT_KEYS = {
+    'date_applied': "COALESCE(date_applied, '')",
+    'company': 'company COLLATE NOCASE',
+    'status': "COALESCE(status, '')",
+    'created_at': "COALESCE(created_at, '')",
+    'updated_at': "COALESCE(updated_at, '')",
+    'id': 'id',
+}
+
+def encode_cursor(sort_value, job_id):
+    """Opaque keyset cursor for the row a page ended on"""
+    raw = json.dumps([sort_value, job_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor_value):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        sort_value, job_id = json.loads(base64.urlsafe_b64decode(cursor_value.encode('ascii')))
+        return sort_value, int(job_id)
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor_value}')
+
+def get_jobs(status=None, company=None, date_from=None, date_to=None,
+             sort='date_applied', order='desc', limit=50, cursor=None, fields=None, account=None):
+    """Get one page of job applications.
+    
+    Filters on account, status, company name prefix and an inclusive date range;
+    sorts by one of JOB_SORT_KEYS with id as tie-breaker. Pages are
+    keyset-paginated: pass the returned next_cursor to get the next page,
+    which stays cheap however deep the page is. `fields` limits the
+    columns returned. Returns (jobs, next_cursor), next_cursor being None
+    on the last page. Raises ValueError for unknown sort keys or fields.
+    """
+    if sort not in JOB_SORT_KEYS:
+        raise ValueError(f'Unknown sort key: {sort}')
+    if order not in ('asc', 'desc'):
+        raise ValueError(f'Unknown sort order: {order}')
+    
+    fields = list(fields or JOB_COLUMNS)
+    unknown = [field for field in fields if field not in JOB_COLUMNS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    # The cursor is built from the sort key and id, so always select them
+    columns = list(dict.fromkeys(fields + ['id'])) + [f'{JOB_SORT_KEYS[sort]} AS sort_key']
+    
+    where = []
+    params = []
+    if account:
+        where.append('account = ?')
+        params.append(account)
+    if status:
+        where.append('status = ?')
+        params.append(status)
+    if company:
+        escaped = company.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        where.append("company LIKE ? ESCAPE '\\'")
+        params.append(escaped + '%')
+    # Written against the indexed sort expression, so the date indexes serve them
+    if date_from:
+        where.append("COALESCE(date_applied, '') >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append("COALESCE(date_applied, '') <= ? AND date_applied IS NOT NULL")
+        params.append(date_to)
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        key, op = JOB_SORT_KEYS[sort], '<' if order == 'desc' else '>'
+        # The plain bound lets SQLite seek an expression index; the row value alone doesn't
+        where.append(f'{key} {op}= ? AND ({key}, id) {op} (?, ?)')
+        params.extend([sort_value, sort_value, last_id])
+    
+    sql = f'SELECT {", ".join(columns)} FROM job_applications'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f' ORDER BY {JOB_SORT_KEYS[sort]} {order.upper()}, id {order.upper()} LIMIT ?'
+    params.append(limit + 1)
+    
+    conn = get_connection()
+    rows = conn.execute(sql, params).fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['sort_key'], rows[-1]['id'])
+    
+    jobs = [{field: row[field] for field in fields} for row in rows]
+    return jobs, next_cursor
+
+def get_change_cursor():
+    """Sequence number of the latest change to any application (0 if none)"""
+    conn = get_connection()
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM job_changes').fetchone()[0]
+
+def get_job_changes(since=0, limit=1000, account=None):
+    """Applications changed after the change cursor `since`, oldest change first.
+    
+    Returns (jobs, deleted_ids, cursor, more): the current rows of the
+    changed applications, the ids of deleted ones, the cursor to pass
+    next time, and whether more than `limit` changes were waiting.
+    since=0 returns every application. Rows and cursor come from one
+    query, so no change can slip in between them. Deletions aren't
+    filtered by account, since the row saying whose it was is gone.
+    """
+    columns = ', '.join(f'j.{column}' for column in JOB_COLUMNS)
+    where = ['c.seq > ?']
+    params = [since]
+    if not since:
+        where.append('c.deleted = 0')
+    if account:
+        where.append('(c.deleted = 1 OR j.account = ?)')
+        params.append(account)
+    
+    conn = get_connection()
+    rows = conn.execute(f'''
+        SELECT c.seq, c.job_id, c.deleted, {columns}
+        FROM job_changes c
+        LEFT JOIN job_applications j ON j.id = c.job_id
+        WHERE {' AND '.join(where)}
+        ORDER BY c.seq
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    
+    more = len(rows) > limit
+    rows = rows[:limit]
+    jobs = [{column: row[column] for column in JOB_COLUMNS} for row in rows if not row['deleted']]
+    deleted = [row['job_id'] for row in rows if row['deleted']]
+    cursor = rows[-1]['seq'] if rows else since
+    return jobs, deleted, cursor, more
+
+def get_job(job_id):
+    """Get a single job application, or None"""
+    conn = get_connection()
+    row = conn.execute(
+        f'SELECT {", ".join(JOB_COLUMNS)} FROM job_applications WHERE id = ?', (job_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+def get_job_timeline(job_id):
+    """Status events of a job, oldest first, or None if there is no such job"""
+    conn = get_connection()
+    if conn.execute('SELECT 1 FROM job_applications WHERE id = ?', (job_id,)).fetchone() is None:
+        return None
+    
+    rows = conn.execute('''
+        SELECT status, event_date, message_id, email_subject, created_at
+        FROM status_events
+        WHERE job_id = ?
+        ORDER BY event_date, id
+    ''', (job_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix.
+    
+    Words are quoted, so FTS5 syntax characters in user input are literal.
+    Returns None when the text has no searchable words.
+    """
+    words = [word.replace('"', '""') for word in text.split()]
+    words = [word for word in words if any(ch.isalnum() for ch in word)]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def search_jobs(text, status=None, limit=20, account=None, recent=None):
+    """Full-text search over company, role, subject, notes and email body.
+    
+    Returns the best matches first, each with a `snippet` of the
+    matching text (hits wrapped in <mark>) and its `rank` (lower is
+    better). With `recent`, only the newest `recent` applications are
+    ranked, and older ones only when those don't fill the page; 0 ranks
+    the whole index. By default the whole index is ranked unless the
+    search matches more than SEARCH_RANK_MAX_MATCHES applications, where
+    ranking them all would take tens of milliseconds; the window is then
+    sized to hold about that many of the newest matches.
+    """
+    match = build_match_query(text)
+    if match is None:
+        return []
+    
+    filters = [('j.status', status), ('j.account', account)]
+    filters = [(column, value) for column, value in filters if value]
+    status_filter = ''.join(f' AND {column} = ?' for column, _ in filters)
+    sql = f'''
+        SELECT j.id, j.company, j.role, j.status, j.date_applied, j.account,
+               snippet(jobs_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+               jobs_fts.rank AS rank
+        FROM jobs_fts
+        JOIN job_applications j ON j.id = jobs_fts.rowid
+        WHERE jobs_fts MATCH ? AND jobs_fts.rowid > ? {status_filter}
+        ORDER BY jobs_fts.rank
+        LIMIT ?
+    '''
+    
+    conn = get_connection()
+    newest = conn.execute('SELECT MAX(id) FROM job_applications').fetchone()[0] or 0
+    if recent is None:
+        # Counting matches is cheap next to ranking them
+        matches = conn.execute('SELECT COUNT(*) FROM jobs_fts WHERE jobs_fts MATCH ?',
+                               (match,)).fetchone()[0]
+        recent = 0
+        if matches > config.SEARCH_RANK_MAX_MATCHES:
+            # Assumes matches are spread evenly over the ids
+            recent = newest * config.SEARCH_RANK_MAX_MATCHES // matches
+    
+    floors = [0]
+    if recent and newest > recent:
+        floors.insert(0, newest - recent)
+    
+    for floor in floors:
+        params = [match, floor] + [value for _, value in filters] + [limit]
+        results = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        if len(results) >= limit:
+            break
+    return results
+
+def get_stats_version():
+    """Counter that changes whenever the stats do"""
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM job_stats WHERE name = 'version'").fetchone()
+    return int(row[0]) if row else 0
+
 def get_stats():
-    """Get statistics"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    """Get statistics from the trigger-maintained job_stats table.
     
-    cursor.execute('SELECT COUNT(*) FROM job_applications')
-    total = cursor.fetchone()[0]
+    Besides totals and per-status counts this includes the response rate
+    (share of jobs in a response status), the average days from applying
+    to the first response, and applications per week (weeks start on
+    Monday).
+    """
+    conn = get_connection()
+    rows = conn.execute('SELECT name, value FROM job_stats WHERE value != 0').fetchall()
     
-    cursor.execute('SELECT status, COUNT(*) FROM job_applications GROUP BY status')
-    status_counts = dict(cursor.fetchall())
+    status_counts = {}
+    weekly = []
+    counters = {}
+    for name, value in rows:
+        kind, _, key = name.partition(':')
+        if kind == 'status':
+            status_counts[key] = int(value)
+        elif kind == 'week':
+            weekly.append({'week': key, 'count': int(value)})
+        else:
+            counters[name] = value
     
-    conn.close()
+    total = sum(status_counts.values())
+    responded = sum(status_counts.get(status, 0) for status in RESPONSE_STATUSES)
+    responses = counters.get('responses', 0)
     
     return {
         'total': total,
-        'status_counts': status_counts
+        'status_counts': status_counts,
+        'response_rate': round(responded / total, 3) if total else 0,
+        'avg_days_to_response': round(counters.get('response_days', 0) / responses, 1) if responses else None,
+        'weekly': sorted(weekly, key=lambda week: week['week']),
+        'version': int(counters.get('version', 0))
     }
 
-def add_scan_history(days_back, emails_scanned, jobs_found):
-    """Record scan history"""
-    conn = sqlite3.connect(DB_FILE)
+def get_scan_history(limit=20, account=None):
+    """Get recent scans, of every account or one, with the share of emails that
+    skipped the LLM and the share of the rest that a learned template answered"""
+    conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        INSERT INTO scan_history (days_back, emails_scanned, jobs_found)
-        VALUES (?, ?, ?)
-    ''', (days_back, emails_scanned, jobs_found))
+    cursor.execute(f'''
+        SELECT * FROM scan_history
+        {'WHERE account = ?' if account else ''}
+        ORDER BY scan_date DESC, id DESC
+        LIMIT ?
+    ''', ((account,) if account else ()) + (limit,))
+    
+    scans = [dict(row) for row in cursor.fetchall()]
+    
+    for scan in scans:
+        if scan['llm_calls'] is not None and scan['emails_scanned']:
+            scan['llm_avoidance_rate'] = round(
+                1 - scan['llm_calls'] / scan['emails_scanned'], 3
+            )
+        else:
+            scan['llm_avoidance_rate'] = None
+        template_lookups = (scan['template_hits'] or 0) + (scan['llm_calls'] or 0)
+        scan['template_hit_rate'] = (
+            round(scan['template_hits'] / template_lookups, 3) if template_lookups else None
+        )
+        scan['metrics'] = json.loads(scan['metrics']) if scan['metrics'] else None
     
-    conn.commit()
-    conn.close()
+    return scans
 
 def update_job_status(job_id, status, notes):
-    """Update job status and notes"""
-    conn = sqlite3.connect(DB_FILE)
+    """Update job status and notes, recording a status change in the timeline"""
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT INTO status_events (job_id, status, event_date)
+            SELECT id, ?, date('now') FROM job_applications
+            WHERE id = ? AND status IS NOT ?
+        ''', (status, job_id, status))
+        cursor.execute('''
+            UPDATE job_applications 
+            SET status = ?, notes = ?
+            WHERE id = ?
+        ''', (status, notes, job_id))
+
+# Cache hits whose last_used hasn't been bumped yet. A hit is a plain
+# read; the bumps are written in batches with the next cache or scan
+# commit, so a rescan answered from the cache doesn't write per email.
+_cache_hits = set()
+_cache_lock = threading.Lock()
+_cache_inserts = 0
+
+def get_cached_extraction(message_id, content_hash):
+    """Get a cached AI extraction, or None if missing or stale"""
+    row = get_connection().execute('''
+        SELECT result FROM extraction_cache
+        WHERE message_id = ? AND content_hash = ?
+    ''', (message_id, content_hash)).fetchone()
+    if row is None:
+        return None
+    
+    with _cache_lock:
+        _cache_hits.add(message_id)
+    return json.loads(row[0])
+
+def flush_cache_hits(cursor):
+    """Bump last_used of the cache hits since the last flush, in the caller's transaction"""
+    with _cache_lock:
+        hits = [(message_id,) for message_id in _cache_hits]
+        _cache_hits.clear()
+    if hits:
+        cursor.executemany(
+            'UPDATE extraction_cache SET last_used = CURRENT_TIMESTAMP WHERE message_id = ?', hits
+        )
+
+def save_cached_extraction(message_id, content_hash, prompt_version, model, result):
+    """Cache an AI extraction.
+    
+    Every EXTRACTION_CACHE_EVICT_EVERY inserts, least recently used
+    entries beyond EXTRACTION_CACHE_MAX_ENTRIES are evicted.
+    """
+    global _cache_inserts
+    with transaction('save_cached_extraction') as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO extraction_cache
+            (message_id, content_hash, prompt_version, model, result, last_used)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (message_id, content_hash, prompt_version, model, json.dumps(result)))
+        flush_cache_hits(cursor)
+        
+        with _cache_lock:
+            _cache_inserts += 1
+            evict = _cache_inserts % config.EXTRACTION_CACHE_EVICT_EVERY == 0
+        if evict:
+            cursor.execute('''
+                DELETE FROM extraction_cache WHERE message_id IN (
+                    SELECT message_id FROM extraction_cache
+                    ORDER BY last_used DESC, rowid DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (config.EXTRACTION_CACHE_MAX_ENTRIES,))
+
+def purge_extraction_cache(prompt_version, model):
+    """Drop cached extractions made with another prompt or model"""
+    with transaction() as cursor:
+        cursor.execute('''
+            DELETE FROM extraction_cache
+            WHERE prompt_version != ? OR model != ?
+        ''', (prompt_version, model))
+        purged = cursor.rowcount
+    
+    return purged
+
+def get_email_templates(domain):
+    """Get the templates learned for a sender domain"""
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
-        UPDATE job_applications 
-        SET status = ?, notes = ?
-        WHERE id = ?
-    ''', (status, notes, job_id))
+        SELECT id, fingerprint, rule, agreements, conflicts FROM email_templates
+        WHERE domain = ?
+    ''', (domain,))
     
-    conn.commit()
-    conn.close()
+    templates = [dict(row) for row in cursor.fetchall()]
+    for template in templates:
+        template['rule'] = json.loads(template['rule'])
+    return templates
+
+# Template hits not written yet, by template id. Like cache hits, they
+# are counted in memory and written in batches with the next template or
+# scan commit
+_template_hits = Counter()
+
+def use_email_template(template_id):
+    """Count an email a template answered"""
+    with _cache_lock:
+        _template_hits[template_id] += 1
+
+def flush_template_hits(cursor):
+    """Add the template hits since the last flush, in the caller's transaction"""
+    with _cache_lock:
+        hits = [(count, template_id) for template_id, count in _template_hits.items()]
+        _template_hits.clear()
+    if hits:
+        cursor.executemany('''
+            UPDATE email_templates
+            SET hits = hits + ?, last_used = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', hits)
+
+def add_email_template(domain, fingerprint, rule):
+    """Save a new template, evicting least recently used ones"""
+    with transaction('add_email_template') as cursor:
+        flush_template_hits(cursor)
+        cursor.execute('''
+            INSERT INTO email_templates (domain, fingerprint, rule)
+            VALUES (?, ?, ?)
+        ''', (domain, fingerprint, json.dumps(rule)))
+        
+        cursor.execute('''
+            DELETE FROM email_templates WHERE id IN (
+                SELECT id FROM email_templates
+                ORDER BY last_used DESC, id DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (config.EMAIL_TEMPLATE_MAX_ENTRIES,))
+
+def confirm_email_template(template_id):
+    """Count a model answer that a template reproduced"""
+    with transaction('confirm_email_template') as cursor:
+        flush_template_hits(cursor)
+        cursor.execute('''
+            UPDATE email_templates
+            SET agreements = agreements + 1, last_used = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (template_id,))
+
+def replace_email_template_rule(template_id, rule):
+    """Replace a template's rule after it got a model answer wrong"""
+    with transaction('replace_email_template_rule') as cursor:
+        flush_template_hits(cursor)
+        cursor.execute('''
+            UPDATE email_templates
+            SET rule = ?, agreements = 0, conflicts = conflicts + 1, last_used = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (json.dumps(rule), template_id))
+
+def get_history_id(account):
+    """Get the Gmail historyId the last scan synced up to"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT history_id FROM sync_state WHERE account = ?', (account,))
+    row = cursor.fetchone()
+    
+    return row[0] if row else None
+
+def save_history_id(account, history_id):
+    """Remember the Gmail historyId a scan synced up to"""
+    with transaction() as cursor:
+        cursor.execute('''
+            INSERT OR REPLACE INTO sync_state (account, history_id, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (account, str(history_id)))
+
+def start_scan_checkpoint(account, days_back, mode, history_id, keyword_filter, message_ids):
+    """Record the plan for a new scan: its sync point and every message to process"""
+    with transaction('start_scan_checkpoint') as cursor:
+        cursor.execute('DELETE FROM scan_pending WHERE account = ?', (account,))
+        cursor.execute('''
+            INSERT OR REPLACE INTO scan_checkpoint
+            (account, days_back, mode, history_id, keyword_filter, total_emails)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (account, days_back, mode, str(history_id), int(keyword_filter), len(message_ids)))
+        cursor.executemany('''
+            INSERT OR IGNORE INTO scan_pending (account, message_id, position)
+            VALUES (?, ?, ?)
+        ''', [(account, message_id, i) for i, message_id in enumerate(message_ids)])
+
+def get_scan_checkpoint(account):
+    """Get an unfinished scan with its still-pending message ids, or None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM scan_checkpoint WHERE account = ?', (account,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    
+    checkpoint = dict(row)
+    cursor.execute('''
+        SELECT message_id FROM scan_pending
+        WHERE account = ?
+        ORDER BY position
+    ''', (account,))
+    checkpoint['pending_ids'] = [r[0] for r in cursor.fetchall()]
+    
+    return checkpoint
+
+def save_scan_progress(account, jobs, message_ids, emails_scanned=0,
+                       llm_calls=0, rule_decisions=0, cache_hits=0, template_hits=0):
+    """Save extracted jobs and mark their messages done in one transaction.
+    
+    Returns the rows of the jobs that were new.
+    """
+    with transaction('save_scan_progress') as cursor:
+        cursor.executemany(
+            'DELETE FROM scan_pending WHERE account = ? AND message_id = ?',
+            [(account, message_id) for message_id in message_ids]
+        )
+        
+        # The write above holds the write lock and ids only grow, so the
+        # new jobs are exactly the rows past the current maximum
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM job_applications')
+        last_id = cursor.fetchone()[0]
+        added = insert_jobs(cursor, jobs, account)
+        flush_cache_hits(cursor)
+        flush_template_hits(cursor)
+        cursor.execute(
+            f'SELECT {", ".join(JOB_COLUMNS)} FROM job_applications WHERE id > ? ORDER BY id',
+            (last_id,)
+        )
+        saved = [dict(row) for row in cursor.fetchall()]
+        cursor.execute('''
+            UPDATE scan_checkpoint SET
+                emails_scanned = emails_scanned + ?,
+                jobs_found = jobs_found + ?,
+                jobs_added = jobs_added + ?,
+                llm_calls = llm_calls + ?,
+                rule_decisions = rule_decisions + ?,
+                cache_hits = cache_hits + ?,
+                template_hits = template_hits + ?
+            WHERE account = ?
+        ''', (emails_scanned, len(jobs), added, llm_calls, rule_decisions, cache_hits,
+              template_hits, account))
+    
+    return saved
+
+def finish_scan_checkpoint(account, breakdown=None):
+    """Close out a finished scan: record its history and advance the sync point.
+    
+    `breakdown` is the scan's metrics breakdown, saved with its history.
+    Returns the scan totals, with `unfetched` counting messages still
+    pending because Gmail failed to return them. While there are any, the
+    checkpoint and the sync point are kept, so the next scan resumes with
+    just those messages and records the history once they are done.
+    """
+    with transaction('finish_scan_checkpoint') as cursor:
+        cursor.execute('SELECT * FROM scan_checkpoint WHERE account = ?', (account,))
+        totals = dict(cursor.fetchone())
+        cursor.execute('SELECT COUNT(*) FROM scan_pending WHERE account = ?', (account,))
+        totals['unfetched'] = cursor.fetchone()[0]
+        if totals['unfetched']:
+            return totals
+        
+        cursor.execute('''
+            INSERT INTO scan_history
+            (account, days_back, emails_scanned, jobs_found, llm_calls, rule_decisions, cache_hits,
+             template_hits, metrics)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (account, totals['days_back'], totals['emails_scanned'], totals['jobs_found'],
+              totals['llm_calls'], totals['rule_decisions'], totals['cache_hits'],
+              totals['template_hits'], json.dumps(breakdown) if breakdown else None))
+        cursor.execute('''
+            INSERT OR REPLACE INTO sync_state (account, history_id, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (account, totals['history_id']))
+        cursor.execute('DELETE FROM scan_pending WHERE account = ?', (account,))
+        cursor.execute('DELETE FROM scan_checkpoint WHERE account = ?', (account,))
+    
+    return totals
+
+def discard_scan_checkpoint(account):
+    """Drop an unfinished scan's plan without advancing the sync point.
+    
+    Jobs it already saved stay; the next scan starts from the previous
+    sync point again.
+    """
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM scan_pending WHERE account = ?', (account,))
+        cursor.execute('DELETE FROM scan_checkpoint WHERE account = ?', (account,))
+
+SCAN_JOB_FIELDS = ('state', 'progress', 'message', 'jobs_found', 'jobs_added', 'cancel_requested')
+
+def create_scan_job(account, days_back, mode):
+    """Record a new queued scan job and return it"""
+    with transaction() as cursor:
+        cursor.execute(
+            'INSERT INTO scan_jobs (account, days_back, mode) VALUES (?, ?, ?)',
+            (account, days_back, mode)
+        )
+        job_id = cursor.lastrowid
+    return get_scan_job(job_id)
+
+def get_scan_job(job_id):
+    """Get a scan job, or None"""
+    conn = get_connection()
+    row = conn.execute('SELECT * FROM scan_jobs WHERE id = ?', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def update_scan_job(job_id, stamp=None, **fields):
+    """Change a scan job's SCAN_JOB_FIELDS; `stamp` names a timestamp column to set to now"""
+    assignments = [f'{field} = ?' for field in fields if field in SCAN_JOB_FIELDS]
+    values = [value for field, value in fields.items() if field in SCAN_JOB_FIELDS]
+    if stamp in ('started_at', 'finished_at'):
+        assignments.append(f'{stamp} = CURRENT_TIMESTAMP')
+    if not assignments:
+        return
+    
+    with transaction() as cursor:
+        cursor.execute(
+            f'UPDATE scan_jobs SET {", ".join(assignments)} WHERE id = ?', values + [job_id]
+        )
+
+def get_unfinished_scan_jobs():
+    """Scan jobs still queued or running, oldest first"""
+    conn = get_connection()
+    rows = conn.execute('''
+        SELECT * FROM scan_jobs
+        WHERE state IN ('queued', 'running')
+        ORDER BY id
+    ''').fetchall()
+    return [dict(row) for row in rows]
 
 if __name__ == "__main__":
-    init_database()
+    init_database(force=True)
     print("Database initialized successfully!")
\ No newline at end of file
@@ -2,36 +2,140 @@ import os
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 import pickle
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from datetime import datetime, timedelta
-import base64
-from email import message_from_bytes
-import re
+from functools import lru_cache
+import threading
+import time
 import config
+import database
+import email_text
+import metrics
+from pre_classifier import JOB_PATTERN, PROMO_PATTERN, is_ats_domain, parse_sender
 
-def get_gmail_service():
-    """Get authenticated Gmail service"""
+# Gmail API quota units each call costs; a batch costs the sum of its requests
+QUOTA_UNITS = {
+    'getProfile': 1,
+    'history.list': 2,
+    'messages.list': 5,
+    'messages.get': 5
+}
+
+class QuotaLimiter:
+    """Token bucket over one account's Gmail API quota units.
+    
+    Gmail allows each user GMAIL_QUOTA_UNITS_PER_SECOND units, averaged
+    over time, so the bucket holds one second's worth. Callers take the
+    units a request costs before sending it and sleep while the bucket is
+    overdrawn, so scans sharing an account stay under its quota instead
+    of failing with rateLimitExceeded.
+    """
+    
+    def __init__(self, account, units_per_second):
+        self.account = account
+        self.rate = units_per_second  # 0 means unlimited
+        self._available = units_per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, units):
+        """Take `units`, first waiting as long as the quota requires"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= units
+            wait = -self._available / self.rate if self._available < 0 else 0
+        if wait:
+            metrics.GMAIL_QUOTA_WAIT_SECONDS.inc(wait, account=self.account)
+            time.sleep(wait)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def quota_limiter(account=None):
+    """The QuotaLimiter shared by every scan of an account (default: GMAIL_ADDRESS)"""
+    account = account or config.GMAIL_ADDRESS
+    with _limiters_lock:
+        if account not in _limiters:
+            _limiters[account] = QuotaLimiter(account, config.GMAIL_QUOTA_UNITS_PER_SECOND)
+        return _limiters[account]
+
+def token_file(account=None):
+    """Token store of a configured Gmail account (default: GMAIL_ADDRESS)"""
+    account = account or config.GMAIL_ADDRESS
+    if account not in config.GMAIL_ACCOUNTS:
+        raise ValueError(f'Unknown Gmail account: {account}')
+    return config.GMAIL_ACCOUNTS[account]
+
+# Built Gmail services by account, reused by every scan: account -> (credentials, service)
+_services = {}
+_services_lock = threading.Lock()
+
+@lru_cache(maxsize=1)
+def discovery_document():
+    """The Gmail API discovery document bundled with googleapiclient, read once"""
+    from googleapiclient import discovery_cache
+    return discovery_cache.get_static_doc('gmail', 'v1')
+
+def refresh_credentials(creds, path):
+    """Refresh expired credentials and save them back to their token file"""
+    from google.auth.transport.requests import Request
+    
+    creds.refresh(Request())
+    with open(path, 'wb') as token:
+        pickle.dump(creds, token)
+
+def get_gmail_service(account=None):
+    """Get authenticated Gmail service for an account, each with its own token file.
+    
+    The service is built once per account and reused by later scans;
+    its token is only refreshed once it has expired. The Google client
+    libraries are imported here, with the first scan, rather than at
+    server start.
+    """
+    account = account or config.GMAIL_ADDRESS
+    path = token_file(account)
+    
+    with _services_lock:
+        if account in _services:
+            creds, service = _services[account]
+            if creds.valid:
+                return service
+            if creds.expired and creds.refresh_token:
+                refresh_credentials(creds, path)
+                return service
+        
+        creds = load_credentials(account, path)
+        from googleapiclient.discovery import build_from_document
+        service = build_from_document(discovery_document(), credentials=creds)
+        _services[account] = (creds, service)
+        return service
+
+def load_credentials(account, path):
+    """Credentials from an account's token file, refreshed or newly authorized as needed"""
     creds = None
     
-    if os.path.exists(config.TOKEN_FILE):
-        with open(config.TOKEN_FILE, 'rb') as token:
+    if os.path.exists(path):
+        with open(path, 'rb') as token:
             creds = pickle.load(token)
     
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
         else:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            
             flow = InstalledAppFlow.from_client_secrets_file(
                 config.CREDENTIALS_FILE, config.SCOPES,
                 redirect_uri='http://localhost:8080'
             )
             auth_url, _ = flow.authorization_url(
-                access_type='offline', prompt='consent'
+                access_type='offline', prompt='consent', login_hint=account
             )
-            print(f"Visit: {auth_url}")
+            print(f"Sign in as {account} and visit: {auth_url}")
             print("Waiting for authorization...")
             try:
                 # Try to get input with a timeout-like approach
@@ -45,87 +149,292 @@ def get_gmail_service():
             except (EOFError, KeyboardInterrupt):
                 raise Exception("Authentication cancelled - please authenticate manually")
         
-        with open(config.TOKEN_FILE, 'wb') as token:
+        with open(path, 'wb') as token:
             pickle.dump(creds, token)
     
-    return build('gmail', 'v1', credentials=creds)
+    return creds
 
 def get_email_body(payload):
-    """Extract email body from payload"""
-    body = ""
-    
-    if 'parts' in payload:
-        for part in payload['parts']:
-            if part['mimeType'] == 'text/plain':
-                if 'data' in part['body']:
-                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-                    break
-            elif part['mimeType'] == 'text/html' and not body:
-                if 'data' in part['body']:
-                    body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-    else:
-        if 'body' in payload and 'data' in payload['body']:
-            body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
-    
-    return body
+    """Extract the email body from a payload as plain text (see email_text.body_text)"""
+    return email_text.body_text(payload)
 
-def fetch_job_emails(days_back=60):
-    """Fetch job-related emails from Gmail"""
-    print(f"\n📧 Fetching job emails from last {days_back} days...")
-    
-    service = get_gmail_service()
-    
-    # Calculate date
+def build_query(days_back):
+    """Build the Gmail search query for job emails"""
     date_from = (datetime.now() - timedelta(days=days_back)).strftime('%Y/%m/%d')
     
-    # Build search query
     query_parts = [f'after:{date_from}']
     query_parts.append('(' + ' OR '.join(config.JOB_KEYWORDS) + ')')
-    query = ' '.join(query_parts)
+    return ' '.join(query_parts)
+
+def list_message_ids(service, query, account=None):
+    """List every message id matching a query, following all result pages"""
+    ids = []
+    page_token = None
+    
+    while True:
+        quota_limiter(account).acquire(QUOTA_UNITS['messages.list'])
+        with metrics.GMAIL_REQUEST_SECONDS.time(call='messages.list'):
+            results = service.users().messages().list(
+                userId='me',
+                q=query,
+                maxResults=500,
+                pageToken=page_token
+            ).execute()
+        
+        ids.extend(msg['id'] for msg in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return ids
+
+def list_added_message_ids(service, start_history_id, account=None):
+    """List ids of messages added since a historyId.
+    
+    Returns None when Gmail no longer has history that far back, in which
+    case the caller must fall back to a full listing.
+    """
+    from googleapiclient.errors import HttpError
     
-    print(f"Search query: {query}")
+    ids = []
+    seen = set()
+    page_token = None
     
-    # Fetch messages
-    results = service.users().messages().list(
+    while True:
+        quota_limiter(account).acquire(QUOTA_UNITS['history.list'])
+        try:
+            with metrics.GMAIL_REQUEST_SECONDS.time(call='history.list'):
+                results = service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    pageToken=page_token
+                ).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return None
+            raise
+        
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message_id = added['message']['id']
+                if message_id not in seen:
+                    seen.add(message_id)
+                    ids.append(message_id)
+        
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return ids
+
+def is_job_email(email_data):
+    """Local equivalent of the keyword part of the Gmail search query"""
+    text = ' '.join([email_data['subject'], email_data['from'], email_data['body']])
+    return JOB_PATTERN.search(text) is not None
+
+def passes_prefilter(subject, sender):
+    """Cheap header-only check that drops obvious promotions before body download.
+    
+    Mail from an applicant tracking system (ATS_SENDER_DOMAINS) always
+    passes: it is sent for an employer, whatever its subject says.
+    """
+    if is_ats_domain(parse_sender(sender)[2]):
+        return True
+    if PROMO_PATTERN.search(subject) and not JOB_PATTERN.search(subject):
+        return False
+    return True
+
+def parse_message(message):
+    """Turn a Gmail API message resource into our email dict"""
+    headers = {h['name']: h['value'] 
+              for h in message['payload'].get('headers', [])}
+    
+    return {
+        'id': message['id'],
+        'subject': headers.get('Subject', 'No Subject'),
+        'from': headers.get('From', 'Unknown'),
+        'date': headers.get('Date', ''),
+        'body': get_email_body(message['payload'])
+    }
+
+def get_email(service, message_id, account=None):
+    """Fetch and decode a single message"""
+    quota_limiter(account).acquire(QUOTA_UNITS['messages.get'])
+    message = service.users().messages().get(
         userId='me',
-        q=query,
-        maxResults=500
+        id=message_id,
+        format='full'
     ).execute()
     
-    messages = results.get('messages', [])
-    print(f"✓ Found {len(messages)} potential job emails")
+    return parse_message(message)
+
+def is_retryable(exception):
+    """Whether a failed request may succeed later: rate limits and server errors"""
+    from googleapiclient.errors import HttpError
+    
+    if not isinstance(exception, HttpError):
+        return True
+    status = exception.resp.status
+    return status == 429 or status >= 500 or (
+        status == 403 and 'ratelimitexceeded' in str(exception).lower())
+
+def batch_get_messages(service, message_ids, account=None, **get_args):
+    """Fetch messages with Gmail batch requests, GMAIL_BATCH_SIZE per round trip.
+    
+    Messages that fail with a rate limit or server error are sent again,
+    up to GMAIL_MAX_RETRIES times with exponential backoff. Returns
+    (messages, failed): a dict of message id to message resource, and the
+    ids that still failed that way. Other failures, such as a message
+    deleted since it was listed, are reported and left out of both.
+    """
+    messages = {}
+    errors = {}
+    
+    def collect(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            messages[request_id] = response
     
-    # Fetch full message details
+    remaining = list(message_ids)
+    for attempt in range(config.GMAIL_MAX_RETRIES + 1):
+        if attempt:
+            delay = config.GMAIL_RETRY_BACKOFF * 2 ** (attempt - 1)
+            print(f"  Retrying {len(remaining)} messages in {delay:g}s")
+            time.sleep(delay)
+        errors.clear()
+        
+        for start in range(0, len(remaining), config.GMAIL_BATCH_SIZE):
+            chunk = remaining[start:start + config.GMAIL_BATCH_SIZE]
+            batch = service.new_batch_http_request(callback=collect)
+            for message_id in chunk:
+                batch.add(
+                    service.users().messages().get(userId='me', id=message_id, **get_args),
+                    request_id=message_id
+                )
+            quota_limiter(account).acquire(QUOTA_UNITS['messages.get'] * len(chunk))
+            with metrics.GMAIL_REQUEST_SECONDS.time(call=f"batch.{get_args.get('format', 'full')}"):
+                batch.execute()
+        
+        for message_id, exception in errors.items():
+            if not is_retryable(exception):
+                print(f"  Error processing message {message_id}: {exception}")
+        remaining = [message_id for message_id in remaining
+                     if message_id in errors and is_retryable(errors[message_id])]
+        if not remaining:
+            break
+    
+    for message_id in remaining:
+        print(f"  Error processing message {message_id}: {errors[message_id]}")
+    return messages, remaining
+
+def fetch_messages(service, message_ids, account=None):
+    """Fetch message details in two phases.
+    
+    Headers are fetched first for every message; full bodies are only
+    downloaded for messages that pass the local pre-filter. Returns
+    (emails, failed), failed being the ids Gmail did not return even
+    after retrying (see batch_get_messages).
+    """
+    metadata, failed = batch_get_messages(
+        service, message_ids, account,
+        format='metadata', metadataHeaders=['Subject', 'From', 'Date']
+    )
+    
+    survivors = []
+    for message_id in message_ids:
+        if message_id in metadata:
+            headers = parse_message(metadata[message_id])
+            if passes_prefilter(headers['subject'], headers['from']):
+                survivors.append(message_id)
+    
+    print(f"  {len(survivors)}/{len(message_ids)} emails passed the header pre-filter")
+    
+    full, failed_bodies = batch_get_messages(service, survivors, account, format='full')
     emails = []
-    for i, msg in enumerate(messages, 1):
-        try:
-            message = service.users().messages().get(
-                userId='me',
-                id=msg['id'],
-                format='full'
-            ).execute()
-            
-            headers = {h['name']: h['value'] 
-                      for h in message['payload']['headers']}
-            
-            email_data = {
-                'id': msg['id'],
-                'subject': headers.get('Subject', 'No Subject'),
-                'from': headers.get('From', 'Unknown'),
-                'date': headers.get('Date', ''),
-                'body': get_email_body(message['payload'])
-            }
-            
-            emails.append(email_data)
-            
-            if i % 10 == 0:
-                print(f"  Processed {i}/{len(messages)} emails...")
-                
-        except Exception as e:
-            print(f"  Error processing message {msg['id']}: {e}")
-            continue
+    for message_id in survivors:
+        if message_id in full:
+            with metrics.EMAIL_DECODE_SECONDS.time():
+                emails.append(parse_message(full[message_id]))
+    return emails, failed + failed_bodies
+
+def plan_sync(days_back=60, mode='full', service=None, account=None):
+    """Work out which messages a scan has to process.
+    
+    In 'incremental' mode only messages added since the last saved
+    historyId are listed; a full listing of the last `days_back` days is
+    used when there is no saved historyId or it has expired.
+    
+    Returns (message_ids, history_id, keyword_filter). history_id is the
+    sync point to save once the messages are processed; keyword_filter
+    says whether iter_emails must apply the search keywords locally.
+    `account` defaults to GMAIL_ADDRESS.
+    """
+    account = account or config.GMAIL_ADDRESS
+    if service is None:
+        service = get_gmail_service(account)
+    
+    # Read the current historyId first so nothing arriving mid-scan is missed next time
+    quota_limiter(account).acquire(QUOTA_UNITS['getProfile'])
+    with metrics.GMAIL_REQUEST_SECONDS.time(call='getProfile'):
+        history_id = service.users().getProfile(userId='me').execute()['historyId']
+    
+    message_ids = None
+    if mode == 'incremental':
+        start_history_id = database.get_history_id(account)
+        if start_history_id:
+            print(f"\n📧 Fetching emails added since history {start_history_id}...")
+            message_ids = list_added_message_ids(service, start_history_id, account)
+            if message_ids is None:
+                print("History expired, falling back to a full scan")
+    
+    # History has no search filter, so its results need the keyword query applied locally
+    keyword_filter = message_ids is not None
+    if not keyword_filter:
+        print(f"\n📧 Fetching job emails from last {days_back} days...")
+        query = build_query(days_back)
+        print(f"Search query: {query}")
+        message_ids = list_message_ids(service, query, account)
+    
+    print(f"✓ Found {len(message_ids)} potential job emails")
+    return message_ids, history_id, keyword_filter
+
+def iter_emails(service, message_ids, keyword_filter=False, account=None):
+    """Fetch messages one batch at a time.
+    
+    Yields (message_id, email) in order; email is None when the message
+    was dropped by a filter or no longer exists. Messages Gmail failed to
+    return even after retrying are not yielded at all, so a scan keeps
+    them pending instead of counting them as done.
+    """
+    for start in range(0, len(message_ids), config.GMAIL_BATCH_SIZE):
+        chunk = message_ids[start:start + config.GMAIL_BATCH_SIZE]
+        emails, failed = fetch_messages(service, chunk, account)
+        fetched = {email['id']: email for email in emails}
+        
+        for message_id in chunk:
+            if message_id in failed:
+                continue
+            email = fetched.get(message_id)
+            if email is not None and keyword_filter and not is_job_email(email):
+                email = None
+            yield message_id, email
+
+def sync_job_emails(days_back=60, mode='full', service=None, account=None):
+    """Fetch job-related emails and the historyId they are current up to.
+    
+    The caller should save the returned historyId once the emails are
+    processed.
+    """
+    if service is None:
+        service = get_gmail_service(account)
+    
+    message_ids, history_id, keyword_filter = plan_sync(days_back, mode, service, account)
+    emails = [email for _, email in iter_emails(service, message_ids, keyword_filter, account) if email]
     
     print(f"✓ Successfully fetched {len(emails)} emails\n")
+    return emails, history_id
+
+def fetch_job_emails(days_back=60):
+    """Fetch job-related emails from Gmail"""
+    emails, _ = sync_job_emails(days_back=days_back)
     return emails
 
 if __name__ == "__main__":
@@ -0,0 +1,213 @@
+import hashlib
+import re
+from functools import lru_cache
+import config
+import database
+import metrics
+from entity_resolution import company_key, role_key
+from pre_classifier import company_from_sender, parse_sender, PERSONAL_DOMAINS
+
+# Mail generated by one ATS template (Workday, Greenhouse, LinkedIn's
+# jobs-noreply, ...) differs only in names, numbers and links. Such emails
+# get the same SimHash fingerprint, or one a few bits away, and the
+# fields the model extracted from earlier ones can be read off new ones.
+FINGERPRINT_BITS = 64
+FINGERPRINT_MASK = (1 << FINGERPRINT_BITS) - 1
+# Lines of the body that are fingerprinted and searched for slots
+TEMPLATE_BODY_LINES = 40
+
+URL_OR_ADDRESS = re.compile(r'https?://\S+|www\.\S+|\S+@\S+', re.IGNORECASE)
+WORD = re.compile(r"[^\W\d_][\w'&.-]*|\d+")
+FIELDS = ('company', 'role')
+
+def sender_domain(email_data):
+    """Domain whose templates an email is matched against, or '' for people writing themselves"""
+    _, _, domain = parse_sender(email_data.get('from', ''))
+    return '' if domain in PERSONAL_DOMAINS else domain
+
+def body_lines(body):
+    lines = (line.strip() for line in (body or '').splitlines())
+    return [line for line in lines if line][:TEMPLATE_BODY_LINES]
+
+def masked_tokens(line):
+    """Words of a line with the slots masked: numbers become 0 and each run of
+    capitalized words (names, companies, titles) one *"""
+    tokens = []
+    for word in WORD.findall(URL_OR_ADDRESS.sub(' ', line)):
+        if word.isdigit():
+            token = '0'
+        elif word[0].isupper():
+            token = '*'
+        else:
+            token = word.lower()
+        if token != '*' or not tokens or tokens[-1] != '*':
+            tokens.append(token)
+    return tokens
+
+@lru_cache(maxsize=1024)
+def fingerprint(subject, body):
+    """64-bit SimHash of word pairs in the subject and first body lines, slots masked"""
+    weights = [0] * FINGERPRINT_BITS
+    for line in [subject] + body_lines(body):
+        tokens = masked_tokens(line)
+        for pair in zip(['^'] + tokens, tokens + ['$']):
+            digest = hashlib.blake2b(' '.join(pair).encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'big')
+            for bit in range(FINGERPRINT_BITS):
+                weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+def to_signed(value):
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << FINGERPRINT_BITS) if value >> (FINGERPRINT_BITS - 1) else value
+
+def distance(a, b):
+    return ((a ^ b) & FINGERPRINT_MASK).bit_count()
+
+def literal(text):
+    """Regex for fixed template text; numbers may vary"""
+    return r'\d+'.join(re.escape(piece) for piece in re.split(r'\d+', text))
+
+def line_pattern(line, values):
+    """Regex matching `line` with each value found in it as a named group, or None"""
+    lowered = line.lower()
+    spans = []
+    for field, value in values.items():
+        start = lowered.find(value.lower()) if value else -1
+        if start >= 0:
+            spans.append((start, start + len(value), field))
+    
+    pattern, position = '', 0
+    for start, end, field in sorted(spans):
+        if start < position:
+            continue
+        pattern += literal(line[position:start]) + f'(?P<{field}>.+?)'
+        position = end
+    return pattern + literal(line[position:]) if pattern else None
+
+def locate(field, result, subject, sender, lines):
+    """Where a template keeps one field of the model's answer"""
+    value = result.get(field) or ''
+    if not value:
+        return {'source': 'const', 'value': ''}
+    values = {name: result.get(name) or '' for name in FIELDS}
+    
+    if value.lower() in subject.lower():
+        return {'source': 'subject', 'pattern': line_pattern(subject, values)}
+    if field == 'company' and company_key(company_from_sender(sender)) == company_key(value):
+        return {'source': 'sender'}
+    for index, line in enumerate(lines):
+        if line.lower() == value.lower():
+            return {'source': 'body', 'line': index}
+        if value.lower() in line.lower():
+            return {'source': 'body', 'pattern': line_pattern(line, values)}
+    # Not in the email (the model inferred it); only right if every email says the same
+    return {'source': 'const', 'value': value}
+
+def derive_rule(email_data, result):
+    """Extraction rule for the template of an email the model answered"""
+    subject, sender = email_data.get('subject', ''), email_data.get('from', '')
+    lines = body_lines(email_data.get('body', ''))
+    return {
+        'status': result['status'],
+        'is_job_related': result['is_job_related'],
+        'fields': {field: locate(field, result, subject, sender, lines) for field in FIELDS}
+    }
+
+def read_field(slot, field, subject, sender, lines):
+    source = slot['source']
+    if source == 'const':
+        return slot['value']
+    if source == 'sender':
+        return company_from_sender(sender)
+    if source == 'subject':
+        match = re.fullmatch(slot['pattern'], subject)
+        return match.groupdict().get(field) if match else None
+    if 'line' in slot:
+        return lines[slot['line']] if slot['line'] < len(lines) else None
+    for line in lines:
+        match = re.fullmatch(slot['pattern'], line)
+        if match:
+            return match.groupdict().get(field)
+    return None
+
+def apply_rule(rule, email_data):
+    """The extraction a template rule gives for an email, or None if the email doesn't fit it"""
+    subject, sender = email_data.get('subject', ''), email_data.get('from', '')
+    lines = body_lines(email_data.get('body', ''))
+    data = {}
+    for field in FIELDS:
+        value = read_field(rule['fields'][field], field, subject, sender, lines)
+        if value is None:
+            return None
+        data[field] = value.strip()
+    data['status'] = rule['status']
+    data['is_job_related'] = rule['is_job_related']
+    return data
+
+def agrees(a, b):
+    """True if two extractions name the same application and status"""
+    return (a['status'] == b['status'] and a['is_job_related'] == b['is_job_related']
+            and company_key(a['company']) == company_key(b['company'])
+            and role_key(a['role']) == role_key(b['role']))
+
+def trusted(template):
+    """True once a template has reproduced enough model answers, and few it got wrong"""
+    agreements, conflicts = template['agreements'], template['conflicts']
+    return (agreements >= config.TEMPLATE_MIN_AGREEMENTS
+            and agreements / (agreements + conflicts) >= config.TEMPLATE_MIN_CONFIDENCE)
+
+def nearest_template(domain, value):
+    """The sender domain's template closest to a fingerprint, if it is close enough"""
+    best, best_distance = None, config.TEMPLATE_MAX_DISTANCE + 1
+    for template in database.get_email_templates(domain):
+        bits = distance(template['fingerprint'], value)
+        if bits < best_distance:
+            best, best_distance = template, bits
+    return best
+
+def match_template(email_data):
+    """Extraction from a trusted learned template, or None if the model is needed"""
+    domain = sender_domain(email_data)
+    if not domain:
+        return None
+    
+    template = nearest_template(domain, fingerprint(email_data.get('subject', ''), email_data.get('body', '')))
+    if template is None:
+        metrics.TEMPLATE_LOOKUPS.inc(result='unknown')
+        return None
+    if not trusted(template):
+        metrics.TEMPLATE_LOOKUPS.inc(result='low_confidence')
+        return None
+    
+    data = apply_rule(template['rule'], email_data)
+    if data is None:
+        metrics.TEMPLATE_LOOKUPS.inc(result='no_match')
+        return None
+    
+    metrics.TEMPLATE_LOOKUPS.inc(result='hit')
+    database.use_email_template(template['id'])
+    return data
+
+def learn_template(email_data, result):
+    """Check a fresh model answer against its template, or start a new one.
+    
+    An answer the template reproduces counts towards trusting it. One it
+    gets wrong replaces its rule with one learned from this email, and
+    the template has to earn trust again.
+    """
+    domain = sender_domain(email_data)
+    if not domain:
+        return
+    
+    value = fingerprint(email_data.get('subject', ''), email_data.get('body', ''))
+    template = nearest_template(domain, value)
+    if template is None:
+        database.add_email_template(domain, to_signed(value), derive_rule(email_data, result))
+        return
+    
+    predicted = apply_rule(template['rule'], email_data)
+    if predicted is not None and agrees(predicted, result):
+        database.confirm_email_template(template['id'])
+    else:
+        database.replace_email_template_rule(template['id'], derive_rule(email_data, result))
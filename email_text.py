@@ -0,0 +1,203 @@
+import base64
+import codecs
+import quopri
+import re
+from html.parser import HTMLParser
+import config
+
+# A text/plain alternative shorter than this ("View this email in your
+# browser") loses to the HTML part when that has more to say
+MIN_PLAIN_CHARS = 200
+# Rough average for English text with Llama-style tokenizers
+CHARS_PER_TOKEN = 4
+# Opening lines always kept in a prompt excerpt; they usually name the role and company
+LEAD_LINES = 3
+# Footer-like lines longer than this are kept if they also mention the application
+BOILERPLATE_MAX_CHARS = 200
+
+CHARSET = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+SOFT_LINE_BREAK = re.compile(rb'=\r?\n|=[0-9A-F]{2}')
+
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'tr', 'li', 'ul', 'ol', 'table', 'section', 'article', 'header', 'footer',
+    'blockquote', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'center', 'pre'
+}
+CELL_TAGS = {'td', 'th'}
+SKIP_TAGS = {'script', 'style', 'head', 'noscript', 'template', 'svg', 'title'}
+VOID_TAGS = {'br', 'hr', 'img', 'meta', 'link', 'input', 'area', 'base', 'col', 'wbr', 'source'}
+# Inline styles that hide preheaders and tracking blocks
+HIDDEN_STYLE = re.compile(
+    r'display\s*:\s*none|visibility\s*:\s*hidden|max-height\s*:\s*0|font-size\s*:\s*0(?![.\d])',
+    re.IGNORECASE
+)
+ZERO_WIDTH = re.compile('[\u00ad\u034f\u200b-\u200f\u2060\ufeff]')
+
+URL = re.compile(r'https?://\S+|www\.\S+', re.IGNORECASE)
+QUOTED_REPLY = re.compile(r'^(on\b.{0,200}\bwrote:$|-{2,} ?original message ?-{2,}|>)', re.IGNORECASE)
+BOILERPLATE = re.compile(
+    r'unsubscribe|opt[ -]out|manage (your )?(email )?(preferences|subscriptions|settings)|'
+    r'privacy (policy|notice|statement)|terms of (use|service)|all rights reserved|©|\(c\) \d{4}|'
+    r'view (this email )?(it )?in (your |a )?browser|you (are )?receiv(ed|ing) this|'
+    r'this (email|message) was sent|(do not|don\'t|please do not) (reply|respond)|'
+    r'sent from my|powered by|follow us|download (the|our) app|confidentiality notice|'
+    r'intended (solely |only )?for the (use of the )?(addressee|recipient)',
+    re.IGNORECASE
+)
+# Words that carry the company, role or status of an application
+SIGNAL = re.compile(
+    r'\b(appl(y|ied|ying|ication)|position|role|job|candida(te|cy)|interview|assessment|'
+    r'schedul\w*|offer|unfortunately|regret|not (be )?(moving|proceed)|next steps?|'
+    r'recruit\w*|hiring|team|opportunity|engineer\w*|manager|analyst|developer|designer)\b',
+    re.IGNORECASE
+)
+
+def header(part, name):
+    """A MIME header of a Gmail payload part, or ''"""
+    name = name.lower()
+    for item in part.get('headers', []):
+        if item['name'].lower() == name:
+            return item['value']
+    return ''
+
+def codec_for(part):
+    """Python codec for the part's declared charset (utf-8 if missing or unknown)"""
+    match = CHARSET.search(header(part, 'Content-Type'))
+    try:
+        return codecs.lookup(match.group(1)).name if match else 'utf-8'
+    except LookupError:
+        return 'utf-8'
+
+def decode_part(part):
+    """Text of a single MIME part, or '' if its body isn't inline"""
+    data = part.get('body', {}).get('data')
+    if not data:
+        return ''
+    raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    # Gmail normally undoes the transfer encoding; some senders' parts still arrive encoded
+    if header(part, 'Content-Transfer-Encoding').lower() == 'quoted-printable' and SOFT_LINE_BREAK.search(raw):
+        raw = quopri.decodestring(raw)
+    return raw.decode(codec_for(part), errors='replace')
+
+def is_attachment(part):
+    return bool(part.get('filename')) or header(part, 'Content-Disposition').lower().startswith('attachment')
+
+def iter_text_parts(payload):
+    """Yield (mime type, part) for every inline text part, depth first through nested multiparts"""
+    if payload.get('parts'):
+        for part in payload['parts']:
+            yield from iter_text_parts(part)
+        return
+    
+    mime_type = payload.get('mimeType', 'text/plain').lower()
+    if mime_type in ('text/plain', 'text/html') and not is_attachment(payload):
+        yield mime_type, payload
+
+class TextExtractor(HTMLParser):
+    """Collects the visible text of an HTML document as it is fed"""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.skipping = []  # Open tags whose content is hidden
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag in ('br', 'hr') and not self.skipping:
+                self.chunks.append('\n')
+            return
+        
+        if self.skipping or tag in SKIP_TAGS or HIDDEN_STYLE.search(dict(attrs).get('style') or ''):
+            self.skipping.append(tag)
+        elif tag in BLOCK_TAGS:
+            self.chunks.append('\n')
+        elif tag in CELL_TAGS:
+            self.chunks.append(' ')
+    
+    def handle_endtag(self, tag):
+        if self.skipping:
+            # Tolerate unclosed tags inside the hidden element
+            if tag in self.skipping:
+                while self.skipping.pop() != tag:
+                    pass
+        elif tag in BLOCK_TAGS:
+            self.chunks.append('\n')
+    
+    def handle_data(self, data):
+        if not self.skipping:
+            self.chunks.append(data)
+
+def tidy(text):
+    """Collapse runs of whitespace and blank lines"""
+    lines = []
+    for line in ZERO_WIDTH.sub('', text).splitlines():
+        line = ' '.join(line.split())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip()
+
+def html_to_text(markup):
+    """Visible text of an HTML email: no markup, scripts, styles or hidden preheaders"""
+    parser = TextExtractor()
+    parser.feed(markup)
+    parser.close()
+    return tidy(''.join(parser.chunks))
+
+def body_text(payload):
+    """Readable text of a Gmail message payload.
+    
+    Plain text parts are preferred; HTML is converted to text when there
+    is no plain part or it is only a stub.
+    """
+    plain, markup = [], []
+    for mime_type, part in iter_text_parts(payload):
+        (plain if mime_type == 'text/plain' else markup).append(decode_part(part))
+    
+    text = tidy('\n\n'.join(plain))
+    if len(text) < MIN_PLAIN_CHARS and markup:
+        converted = tidy('\n\n'.join(html_to_text(item) for item in markup))
+        if len(converted) > len(text):
+            return converted
+    return text
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+def prompt_excerpt(body, max_tokens=None):
+    """The part of an email body worth sending to the model, within a token budget.
+    
+    Quoted replies, links and footer boilerplate are dropped. If the rest
+    is still too long, the opening lines are kept plus the lines with the
+    most application signal words, in their original order.
+    """
+    budget = (max_tokens or config.PROMPT_BODY_TOKENS) * CHARS_PER_TOKEN
+    
+    lines, seen = [], set()
+    for line in (body or '').splitlines():
+        line = line.strip()
+        if QUOTED_REPLY.match(line):
+            break
+        line = ' '.join(URL.sub(' ', line).split())
+        if len(line) < 2 or line in seen:
+            continue
+        if BOILERPLATE.search(line) and (len(line) < BOILERPLATE_MAX_CHARS or not SIGNAL.search(line)):
+            continue
+        seen.add(line)
+        lines.append(line)
+    
+    text = '\n'.join(lines)
+    if len(text) <= budget:
+        return text
+    
+    ranked = sorted(range(len(lines)),
+                    key=lambda i: (i >= LEAD_LINES, -len(SIGNAL.findall(lines[i])), i))
+    # Long paragraphs are cut so one company intro can't crowd out the rest
+    longest = budget // 4
+    chosen, used = {}, 0
+    for i in ranked:
+        room = budget - used
+        if room < 40:
+            break
+        line = lines[i][:min(room - 1, longest)]
+        chosen[i] = line
+        used += len(line) + 1
+    return '\n'.join(chosen[i] for i in sorted(chosen))
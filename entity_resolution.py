@@ -0,0 +1,183 @@
+import hashlib
+import re
+import struct
+import unicodedata
+from functools import lru_cache
+import config
+from pre_classifier import parse_sender, is_ats_domain, PERSONAL_DOMAINS
+
+# Words that vary between mentions of the same employer ("Google LLC",
+# "Google Careers", "The Google Team"); dropped unless nothing else is left
+COMPANY_NOISE = {
+    'inc', 'incorporated', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'plc',
+    'gmbh', 'ag', 'sa', 'bv', 'nv', 'pty', 'lp', 'llp', 'group', 'holdings',
+    'careers', 'career', 'jobs', 'recruiting', 'recruitment', 'talent', 'acquisition',
+    'hiring', 'team', 'hr', 'people', 'the', 'via', 'unknown'
+}
+# Industry words shared by thousands of employers ("Acme Labs", "Bolt Labs").
+# They stay in the key but are left out of its MinHash signature, or
+# every company with one would land in the same LSH buckets.
+GENERIC_COMPANY_WORDS = {
+    'and', 'of', 'labs', 'lab', 'systems', 'technologies', 'technology', 'tech', 'solutions',
+    'software', 'health', 'healthcare', 'bank', 'capital', 'partners', 'services', 'consulting',
+    'digital', 'global', 'international', 'media', 'energy', 'financial', 'networks', 'analytics',
+    'studios', 'studio', 'ventures', 'industries', 'enterprises', 'associates', 'robotics',
+    'ai', 'data', 'cloud', 'games', 'therapeutics', 'bio', 'usa', 'america', 'north'
+}
+WEB_SUFFIX = re.compile(r'\.(com|io|ai|co|net|org|dev|app)\b')
+
+ROLE_ABBREVIATIONS = {
+    'sr': 'senior', 'jr': 'junior', 'eng': 'engineer', 'engr': 'engineer',
+    'swe': 'software engineer', 'sde': 'software development engineer',
+    'mgr': 'manager', 'dev': 'developer', 'ml': 'machine learning',
+    '1': 'i', '2': 'ii', '3': 'iii', '4': 'iv', '5': 'v'
+}
+ROLE_NOISE = {'the', 'a', 'an', 'position', 'role', 'job', 'opening', 'remote', 'hybrid',
+              'onsite', 'unknown'}
+# Requisition ids like "R12345", "JR-004521" or "#88231"
+REQUISITION_ID = re.compile(r'#\d+|\b[a-z]*\d{4,}[a-z0-9]*\b')
+# Tokens that make two otherwise similar titles different jobs
+LEVEL_WORDS = {'intern', 'internship', 'junior', 'associate', 'senior', 'staff', 'principal',
+               'lead', 'head', 'director', 'vp', 'chief', 'i', 'ii', 'iii', 'iv', 'v'}
+
+# MinHash signature of a key's trigrams, cut into bands for locality
+# sensitive hashing. Two keys share a band with probability
+# 1 - (1 - s^3)^8 for trigram Jaccard similarity s: about 0.85 at s = 0.6
+# and 0.97 at s = 0.7. Each trigram's blake2b digest supplies all 24
+# 16-bit hash functions at once. Changing these means re-indexing.
+MINHASH_SIZE = 24
+MINHASH_BAND_ROWS = 3
+# Keys with different numbers never match, so a hash of the numbers is
+# part of every band: "Stripe 1" .. "Stripe 9999" share no buckets
+NUMBER_SALTS = 511
+
+def fold(text):
+    """Lowercase ASCII version of `text`"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    return text.encode('ascii', 'ignore').decode('ascii').lower()
+
+def company_key(name):
+    """Canonical form of a company name ('' if unknown).
+    
+    "Google LLC", "Google Careers" and "google.com" all become "google".
+    """
+    text = WEB_SUFFIX.sub(' ', fold(name).replace("'", '').replace('&', ' and '))
+    tokens = re.findall(r'[a-z0-9]+', text)
+    kept = [token for token in tokens if token not in COMPANY_NOISE]
+    # "Johnson & Johnson" keeps its "and", "JPMorgan Chase & Co." loses it
+    while kept and kept[-1] == 'and':
+        kept.pop()
+    if not kept and tokens != ['unknown']:
+        kept = tokens
+    return ' '.join(kept)
+
+def role_key(role):
+    """Canonical form of a job title ('' if unknown).
+    
+    Abbreviations are expanded, requisition ids and filler words dropped
+    and the words sorted, so "Sr. Backend Engineer (R1234)" and "Senior
+    Engineer, Backend" get the same key.
+    """
+    text = REQUISITION_ID.sub(' ', fold(role))
+    text = re.sub(r'(?<=[a-z])-(?=[a-z])', '', text)
+    tokens = []
+    for token in re.findall(r'[a-z0-9]+', text):
+        tokens.extend(ROLE_ABBREVIATIONS.get(token, token).split())
+    return ' '.join(sorted(token for token in tokens if token not in ROLE_NOISE))
+
+def company_domain(sender):
+    """The employer's own mail domain ("google.com" for careers.google.com), or None.
+    
+    Applicant tracking systems and personal mail send for many employers,
+    so they never identify a company.
+    """
+    _, _, domain = parse_sender(sender or '')
+    if not domain or is_ats_domain(domain) or domain in PERSONAL_DOMAINS:
+        return None
+    labels = domain.split('.')
+    # Keep the registrable part: google.com, but bbc.co.uk
+    size = 3 if len(labels) > 2 and labels[-2] in ('co', 'com', 'ac', 'org', 'net') else 2
+    return '.'.join(labels[-size:])
+
+@lru_cache(maxsize=65536)
+def trigrams(key):
+    """Character trigrams of a key, padded so word starts and ends count"""
+    padded = f'  {key} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def similarity(a, b):
+    """Jaccard similarity of two keys' trigrams"""
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b)
+
+def numbers(key):
+    return {token for token in key.split() if token.isdigit()}
+
+def levels(key):
+    return {token for token in key.split() if token in LEVEL_WORDS or token.isdigit()}
+
+@lru_cache(maxsize=65536)
+def gram_hashes(gram):
+    """MINHASH_SIZE independent 16-bit hashes of one trigram"""
+    digest = hashlib.blake2b(gram.encode(), digest_size=MINHASH_SIZE * 2).digest()
+    return struct.unpack(f'<{MINHASH_SIZE}H', digest)
+
+def number_salt(key):
+    """0 for a key without numbers, else 1..NUMBER_SALTS from a hash of them"""
+    found = numbers(key)
+    if not found:
+        return 0
+    digest = hashlib.blake2b(' '.join(sorted(found)).encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'little') % NUMBER_SALTS + 1
+
+def lsh_bands(key):
+    """LSH band values of the key's MinHash signature, as 64-bit ints"""
+    distinctive = ' '.join(token for token in key.split() if token not in GENERIC_COMPANY_WORDS)
+    hashes = [gram_hashes(gram) for gram in trigrams(distinctive or key)]
+    signature = [min(column) for column in zip(*hashes)]
+    # A band is its number, the number salt and its three 16-bit minimums
+    # packed into one integer (under 63 bits, as SQLite integers are signed)
+    salt = number_salt(key) * MINHASH_SIZE
+    bands = []
+    for start in range(0, MINHASH_SIZE, MINHASH_BAND_ROWS):
+        band = salt + start
+        for value in signature[start:start + MINHASH_BAND_ROWS]:
+            band = band << 16 | value
+        bands.append(band)
+    return bands
+
+def same_company(a, b):
+    """Whether two company keys name the same employer.
+    
+    Differing numbers always mean different companies ("Studio 3" and
+    "Studio 4"); otherwise the names must be close in spelling.
+    """
+    if a == b:
+        return True
+    if not a or not b or numbers(a) != numbers(b):
+        return False
+    return similarity(a, b) >= config.COMPANY_MATCH_THRESHOLD
+
+def shares_token(a, b):
+    return bool(set(a.split()) & set(b.split()))
+
+def best_match(role, candidates):
+    """The candidate application (at the same company) that a job with this role key is.
+    
+    `candidates` are dicts with a 'role_key'. Titles at different levels
+    never match. When either side's title is unknown the job can only be
+    matched if the company has exactly one application. Returns None when
+    nothing matches.
+    """
+    if len(candidates) == 1 and (not role or not candidates[0]['role_key']):
+        return candidates[0]
+    
+    best, best_score = None, 0
+    for candidate in candidates:
+        other = candidate['role_key']
+        if not role or not other or levels(role) != levels(other):
+            continue
+        score = 1.0 if role == other else similarity(role, other)
+        if score >= config.ROLE_MATCH_THRESHOLD and score > best_score:
+            best, best_score = candidate, score
+    return best
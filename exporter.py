@@ -0,0 +1,129 @@
+import csv
+import io
+import tempfile
+import config
+import database
+
+# Spreadsheet header -> job_applications column
+EXPORT_COLUMNS = {
+    'Company': 'company',
+    'Role': 'role',
+    'Date Applied': 'date_applied',
+    'Status': 'status',
+    'Email Subject': 'email_subject',
+    'Email From': 'email_from',
+    'Notes': 'notes'
+}
+
+EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def iter_job_chunks(chunk_size=None):
+    """Yield lists of job rows (in EXPORT_COLUMNS order), newest first.
+    
+    Reads the table a page at a time with keyset pagination, so memory
+    use stays flat however many applications there are.
+    """
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    fields = list(EXPORT_COLUMNS.values())
+    cursor = None
+    
+    while True:
+        jobs, cursor = database.get_jobs(limit=chunk_size, cursor=cursor, fields=fields)
+        if jobs:
+            yield [[job[field] for field in fields] for job in jobs]
+        if cursor is None:
+            break
+
+def csv_blocks():
+    """Yield the export as CSV, one encoded block per chunk of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in iter_job_chunks():
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def write_csv(stream):
+    """Write the export as CSV to a binary stream"""
+    for block in csv_blocks():
+        stream.write(block)
+
+def write_xlsx(stream):
+    """Write the export as an Excel workbook using openpyxl's write-only mode"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Applications')
+    sheet.append(list(EXPORT_COLUMNS))
+    for rows in iter_job_chunks():
+        for row in rows:
+            sheet.append(row)
+    workbook.save(stream)
+
+def write_parquet(stream):
+    """Write the export as Parquet, one row group per chunk (needs pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([(name, pa.string()) for name in EXPORT_COLUMNS])
+    with pq.ParquetWriter(stream, schema) as writer:
+        for rows in iter_job_chunks():
+            columns = [list(column) for column in zip(*rows)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+WRITERS = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'parquet': write_parquet
+}
+
+def check_format(fmt):
+    """Raise ValueError unless `fmt` can be exported here"""
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Parquet export needs pyarrow (pip install pyarrow)')
+
+def export_to_file(path, fmt='xlsx'):
+    """Write every job application to `path`"""
+    check_format(fmt)
+    with open(path, 'wb') as stream:
+        WRITERS[fmt](stream)
+
+def stream_export(fmt, block_size=64 * 1024):
+    """Yield the export as byte blocks for a streamed HTTP response.
+    
+    CSV is sent chunk by chunk as rows are read. xlsx and Parquet can't be
+    written to a non-seekable stream, so they are built in a temporary
+    file that spills to disk past a few MB and read back in blocks; either
+    way the whole export is never held in memory. Call check_format first,
+    since errors here only surface once the response has started.
+    """
+    if fmt == 'csv':
+        # CSV needs no seeking, so rows go out as soon as they are read
+        yield from csv_blocks()
+        return
+    
+    with tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024) as spool:
+        WRITERS[fmt](spool)
+        spool.seek(0)
+        while True:
+            block = spool.read(block_size)
+            if not block:
+                break
+            yield block
+
+if __name__ == "__main__":
+    export_to_file(config.OUTPUT_FILE)
+    print(f"✓ Exported to {config.OUTPUT_FILE}")
@@ -1,13 +1,41 @@
-import React, { useEffect, useState } from 'react'
+import React, { useEffect, useRef, useState } from 'react'
 import Header from './components/Header'
 import SimpleStats from './components/SimpleStats'
 import SimpleScanPanel from './components/SimpleScanPanel'
 import SimpleFilterBar from './components/SimpleFilterBar'
 import SimpleJobCard from './components/SimpleJobCard'
 import JobModal from './components/JobModal'
-import { fetchJobs, fetchStats } from './services/api'
+import { fetchJobs, fetchJob, fetchJobChanges, fetchStats, searchJobs, exportUrl } from './services/api'
 import { mockInit } from './data/mock'
 
+// List order of the loaded pages: date_applied desc, then id desc, as the server sorts them
+function compareJobs(a, b) {
+  const dateA = a.date_applied || ''
+  const dateB = b.date_applied || ''
+  if (dateA !== dateB) return dateA < dateB ? 1 : -1
+  return b.id - a.id
+}
+
+// Apply a delta from fetchJobChanges to the loaded pages: deleted jobs go,
+// loaded ones are patched, and jobs that no longer match the status filter
+// are dropped. A changed job is only kept if it sorts within the loaded
+// window; while more pages remain, anything after the last loaded job is
+// left for "Load more" to fetch, so it never shows up twice.
+function mergeJobChanges(jobs, { jobs: changed, deleted }, filter, hasMore) {
+  const gone = new Set(deleted)
+  const updates = new Map(changed.map(job => [job.id, job]))
+  const loaded = new Set(jobs.map(job => job.id))
+  const last = jobs[jobs.length - 1]
+  return [
+    ...jobs.filter(job => !gone.has(job.id))
+      .map(job => updates.has(job.id) ? { ...job, ...updates.get(job.id) } : job),
+    ...changed.filter(job => !loaded.has(job.id))
+  ]
+    .filter(job => filter === 'all' || job.status === filter)
+    .filter(job => !hasMore || !last || compareJobs(job, last) <= 0)
+    .sort(compareJobs)
+}
+
 function App() {
   // initialize mock in dev
   // if (import.meta.env.MODE === 'development') {
@@ -15,24 +43,34 @@ function App() {
   // }
 
   const [jobs, setJobs] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [filter, setFilter] = useState('all')
   const [searchTerm, setSearchTerm] = useState('')
+  const [searchResults, setSearchResults] = useState(null)
   const [stats, setStats] = useState({ total: 0, status_counts: {} })
   const [loading, setLoading] = useState(false)
   const [isModalOpen, setIsModalOpen] = useState(false)
   const [editingJob, setEditingJob] = useState(null)
   const [currentView, setCurrentView] = useState('dashboard')
+  // Change cursor of the loaded list; refreshes only fetch what changed after it
+  const syncCursor = useRef(null)
 
   useEffect(() => {
-    loadJobs()
     loadStats()
   }, [])
 
+  // Status filtering happens server-side, so refetch when it changes
+  useEffect(() => {
+    loadJobs()
+  }, [filter])
+
   async function loadJobs() {
     setLoading(true)
     try {
-      const data = await fetchJobs()
-      setJobs(data)
+      const data = await fetchJobs({ status: filter })
+      setJobs(data.jobs)
+      setNextCursor(data.next_cursor)
+      syncCursor.current = data.sync_cursor
     } catch (err) {
       console.error(err)
     } finally {
@@ -40,6 +78,48 @@ function App() {
     }
   }
 
+  // Bring the loaded list up to date without refetching it
+  async function syncJobs() {
+    if (syncCursor.current == null) return loadJobs()
+    try {
+      let more = true
+      while (more) {
+        const delta = await fetchJobChanges(syncCursor.current)
+        setJobs(prev => mergeJobChanges(prev, delta, filter, nextCursor != null))
+        syncCursor.current = delta.cursor
+        more = delta.more
+      }
+    } catch (err) {
+      console.error(err)
+    }
+  }
+
+  // Search runs server-side over all applications, shortly after typing stops
+  useEffect(() => {
+    if (!searchTerm.trim()) {
+      setSearchResults(null)
+      return
+    }
+    const timer = setTimeout(async () => {
+      try {
+        setSearchResults(await searchJobs(searchTerm, { status: filter }))
+      } catch (err) {
+        console.error(err)
+      }
+    }, 250)
+    return () => clearTimeout(timer)
+  }, [searchTerm, filter])
+
+  async function loadMoreJobs() {
+    try {
+      const data = await fetchJobs({ status: filter, cursor: nextCursor })
+      setJobs(prev => [...prev, ...data.jobs])
+      setNextCursor(data.next_cursor)
+    } catch (err) {
+      console.error(err)
+    }
+  }
+
   async function loadStats() {
     try {
       const s = await fetchStats()
@@ -49,11 +129,27 @@ function App() {
     }
   }
 
-  const handleEditJob = (job) => {
-    setEditingJob(job)
+  const handleEditJob = async (job) => {
+    // List pages only carry LIST_FIELDS; the modal needs notes and subject too
+    try {
+      setEditingJob(await fetchJob(job.id))
+    } catch (err) {
+      console.error(err)
+      setEditingJob(job)
+    }
     setIsModalOpen(true)
   }
 
+  // Jobs saved by a running scan arrive as events; show them without refetching
+  const handleJobsAdded = (newJobs) => {
+    const visible = newJobs.filter(job => filter === 'all' || job.status === filter)
+    setJobs(prev => {
+      const known = new Set(prev.map(job => job.id))
+      return [...visible.filter(job => !known.has(job.id)), ...prev]
+    })
+    loadStats()
+  }
+
   const handleAddJob = () => {
     setEditingJob(null)
     setIsModalOpen(true)
@@ -65,23 +161,14 @@ function App() {
       console.log('Saving job:', jobData)
       
       // For now, just refresh the data
-      await loadJobs()
+      await syncJobs()
       await loadStats()
     } catch (err) {
       console.error('Error saving job:', err)
     }
   }
 
-  const filteredJobs = jobs
-    .filter(job => {
-      const matchesStatus = filter === 'all' || job.status === filter
-      const matchesSearch = !searchTerm || 
-        job.company.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        job.role.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        (job.notes && job.notes.toLowerCase().includes(searchTerm.toLowerCase())) ||
-        job.email_subject.toLowerCase().includes(searchTerm.toLowerCase())
-      return matchesStatus && matchesSearch
-    })
+  const filteredJobs = searchResults || jobs
 
   return (
     <div className="min-h-screen bg-gray-50">
@@ -239,7 +326,7 @@ function App() {
                       <p className="text-gray-600 text-base">Automatically detect job applications</p>
                     </div>
                   </div>
-                  <SimpleScanPanel onScanComplete={() => { loadJobs(); loadStats(); }} />
+                  <SimpleScanPanel onScanComplete={() => { loadStats(); syncJobs() }} onJobsAdded={handleJobsAdded} />
                 </div>
 
                 {/* Recent Applications */}
@@ -249,7 +336,7 @@ function App() {
                     <SimpleFilterBar 
                       current={filter} 
                       onChange={setFilter} 
-                      onRefresh={loadJobs}
+                      onRefresh={syncJobs}
                       searchTerm={searchTerm}
                       onSearchChange={setSearchTerm}
                     />
@@ -318,7 +405,7 @@ function App() {
                   <SimpleFilterBar 
                     current={filter} 
                     onChange={setFilter} 
-                    onRefresh={loadJobs}
+                    onRefresh={syncJobs}
                     searchTerm={searchTerm}
                     onSearchChange={setSearchTerm}
                   />
@@ -348,6 +435,14 @@ function App() {
                     ))
                   )}
                 </div>
+
+                {!loading && !searchResults && nextCursor && (
+                  <div className="flex justify-center mt-6">
+                    <button onClick={loadMoreJobs} className="btn-primary text-lg px-6 py-3">
+                      Load more
+                    </button>
+                  </div>
+                )}
               </div>
             </div>
           )}
@@ -358,11 +453,23 @@ function App() {
               <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
                 <div className="card p-8">
                   <h2 className="text-2xl font-semibold mb-6">Application Timeline</h2>
-                  <div className="text-center p-12">
-                    <div className="text-5xl mb-4">📊</div>
-                    <div className="text-gray-900 font-semibold text-xl mb-2">Coming Soon</div>
-                    <div className="text-gray-600 text-base">Advanced analytics and charts will be available here</div>
-                  </div>
+                  {stats.weekly?.length ? (
+                    <div className="flex items-end gap-1 h-48">
+                      {stats.weekly.slice(-26).map(({ week, count }) => (
+                        <div
+                          key={week}
+                          title={`Week of ${week}: ${count}`}
+                          className="flex-1 bg-indigo-500 rounded-t"
+                          style={{ height: `${count / Math.max(...stats.weekly.slice(-26).map(w => w.count)) * 100}%` }}
+                        />
+                      ))}
+                    </div>
+                  ) : (
+                    <div className="text-center p-12">
+                      <div className="text-5xl mb-4">📊</div>
+                      <div className="text-gray-600 text-base">Applications per week will show up here</div>
+                    </div>
+                  )}
                 </div>
 
                 <div className="card p-8">
@@ -371,7 +478,13 @@ function App() {
                     <div className="flex justify-between items-center py-3">
                       <span className="text-gray-600 text-base">Response Rate</span>
                       <span className="font-semibold text-lg">
-                        {stats.total > 0 ? Math.round((stats.status_counts?.Interview || 0) / stats.total * 100) : 0}%
+                        {Math.round((stats.response_rate || 0) * 100)}%
+                      </span>
+                    </div>
+                    <div className="flex justify-between items-center py-3">
+                      <span className="text-gray-600 text-base">Avg. Days to Response</span>
+                      <span className="font-semibold text-lg">
+                        {stats.avg_days_to_response ?? '–'}
                       </span>
                     </div>
                     <div className="flex justify-between items-center py-3">
@@ -424,10 +537,15 @@ function App() {
                 <div className="card p-8">
                   <h2 className="text-2xl font-semibold mb-6">Data Management</h2>
                   <div className="space-y-4">
-                    <button className="w-full text-left px-4 py-3 bg-gray-50 hover:bg-gray-100 rounded-lg transition-colors">
+                    <a href={exportUrl('xlsx')} className="block w-full text-left px-4 py-3 bg-gray-50 hover:bg-gray-100 rounded-lg transition-colors">
                       <div className="font-medium text-base text-gray-900">Export Data</div>
-                      <div className="text-gray-600 text-sm">Download all your applications</div>
-                    </button>
+                      <div className="text-gray-600 text-sm">Download all your applications as Excel</div>
+                    </a>
+
+                    <a href={exportUrl('csv')} className="block w-full text-left px-4 py-3 bg-gray-50 hover:bg-gray-100 rounded-lg transition-colors">
+                      <div className="font-medium text-base text-gray-900">Export CSV</div>
+                      <div className="text-gray-600 text-sm">Download all your applications as CSV</div>
+                    </a>
                     
                     <button className="w-full text-left px-4 py-3 bg-gray-50 hover:bg-gray-100 rounded-lg transition-colors">
                       <div className="font-medium text-base text-gray-900">Import Data</div>
@@ -1,5 +1,6 @@
-import React, { useState } from 'react'
+import React, { useEffect, useState } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
+import { fetchJobTimeline } from '../services/api'
 
 export default function JobModal({ isOpen, onClose, job, onSave }) {
   const [formData, setFormData] = useState({
@@ -12,6 +13,18 @@ export default function JobModal({ isOpen, onClose, job, onSave }) {
   })
 
   const [errors, setErrors] = useState({})
+  const [timeline, setTimeline] = useState([])
+
+  // Every status email seen for this application, oldest first
+  useEffect(() => {
+    if (!isOpen || !job?.id) {
+      setTimeline([])
+      return
+    }
+    fetchJobTimeline(job.id)
+      .then(data => setTimeline(data.events))
+      .catch(err => console.error(err))
+  }, [isOpen, job?.id])
 
   const handleChange = (e) => {
     const { name, value } = e.target
@@ -173,6 +186,25 @@ export default function JobModal({ isOpen, onClose, job, onSave }) {
                 />
               </div>
 
+              {timeline.length > 0 && (
+                <div>
+                  <label className="block text-sm font-medium text-gray-700 mb-2">
+                    Timeline
+                  </label>
+                  <ol className="border-l-2 border-purple-200 pl-4 space-y-2">
+                    {timeline.map((event, index) => (
+                      <li key={index} className="text-sm">
+                        <span className="font-medium text-gray-800">{event.status}</span>
+                        <span className="text-gray-500"> · {event.event_date}</span>
+                        {event.email_subject && (
+                          <div className="text-gray-500 truncate">{event.email_subject}</div>
+                        )}
+                      </li>
+                    ))}
+                  </ol>
+                </div>
+              )}
+
               <div className="flex gap-3 pt-4">
                 <motion.button
                   type="button"
@@ -10,6 +10,13 @@ function statusColor(status) {
   return colors[status] || 'bg-gray-500 text-white'
 }
 
+// Search snippets mark hits as <mark>...</mark>; render those as elements
+// and everything else as plain text, since snippets come from email bodies
+function Snippet({ text }) {
+  const parts = text.split(/<mark>(.*?)<\/mark>/)
+  return parts.map((part, i) => (i % 2 ? <mark key={i}>{part}</mark> : part))
+}
+
 export default function SimpleJobCard({ job, onEdit }) {
   return (
     <div className="bg-white rounded-lg shadow-md p-6 hover:shadow-lg transition-shadow">
@@ -29,9 +36,11 @@ export default function SimpleJobCard({ job, onEdit }) {
           <span>{new Date(job.date_applied).toLocaleDateString()}</span>
         </div>
         
-        <div className="bg-gray-50 p-3 rounded text-sm text-gray-700">
-          {job.email_subject}
-        </div>
+        {(job.snippet || job.email_subject) && (
+          <div className="bg-gray-50 p-3 rounded text-sm text-gray-700">
+            {job.snippet ? <Snippet text={job.snippet} /> : job.email_subject}
+          </div>
+        )}
       </div>
 
       {job.notes && (
@@ -1,13 +1,53 @@
-import React, { useState } from "react";
-import { startScan as startScanBackend, fetchScanStatus } from "../services/api";
+import React, { useEffect, useRef, useState } from "react";
+import { startScan as startScanBackend, cancelScan, openScanEvents } from "../services/api";
 
-export default function SimpleScanPanel({ onScanComplete }) {
+export default function SimpleScanPanel({ onScanComplete, onJobsAdded }) {
   const [running, setRunning] = useState(false);
   const [days, setDays] = useState(60);
   const [progress, setProgress] = useState(0);
+  const [jobId, setJobId] = useState(null);
   const [statusMessage, setStatusMessage] = useState("");
   const [error, setError] = useState("");
 
+  // The event stream outlives renders, so read the latest callbacks through a ref
+  const callbacks = useRef({});
+  callbacks.current = { onScanComplete, onJobsAdded };
+
+  // The server pushes scan progress, so there is nothing to poll
+  useEffect(() => {
+    const showStatus = (status) => {
+      setRunning(status.running);
+      setProgress(status.progress || 0);
+      if (status.job_id) setJobId(status.job_id);
+      if (status.running) setStatusMessage(status.message || "Processing...");
+    };
+
+    const source = openScanEvents({
+      status: showStatus,
+      queued: showStatus,
+      started: showStatus,
+      progress: showStatus,
+      jobs: (jobs) => callbacks.current.onJobsAdded && callbacks.current.onJobsAdded(jobs),
+      complete: (status) => {
+        showStatus(status);
+        setStatusMessage(status.message || "Scan completed!");
+        callbacks.current.onScanComplete();
+        setTimeout(() => setStatusMessage(""), 3000);
+      },
+      cancelled: (status) => {
+        showStatus(status);
+        setStatusMessage(status.message || "Scan cancelled");
+        setTimeout(() => setStatusMessage(""), 3000);
+      },
+      failed: (status) => {
+        showStatus(status);
+        setStatusMessage("");
+        setError(status.message || "Scan failed. Please try again.");
+      },
+    });
+    return () => source.close();
+  }, []);
+
   async function startScan() {
     setRunning(true);
     setProgress(0);
@@ -15,29 +55,8 @@ export default function SimpleScanPanel({ onScanComplete }) {
     setError("");
 
     try {
-      await startScanBackend(days);
-      setStatusMessage("Scanning emails...");
-
-      const poll = setInterval(async () => {
-        try {
-          const status = await fetchScanStatus();
-          setProgress(status.progress || 0);
-          setStatusMessage(status.message || "Processing...");
-
-          if (!status.running) {
-            clearInterval(poll);
-            setStatusMessage("Scan completed!");
-            onScanComplete();
-            setRunning(false);
-            setTimeout(() => setStatusMessage(""), 3000);
-          }
-        } catch (pollErr) {
-          clearInterval(poll);
-          setError("Error checking scan status");
-          setRunning(false);
-        }
-      }, 1000);
-
+      const data = await startScanBackend(days);
+      setJobId(data.job_id);
     } catch (err) {
       setRunning(false);
       setError("Scan failed. Please try again.");
@@ -45,6 +64,15 @@ export default function SimpleScanPanel({ onScanComplete }) {
     }
   }
 
+  async function stopScan() {
+    try {
+      await cancelScan(jobId);
+      setStatusMessage("Cancelling scan...");
+    } catch (err) {
+      setError("Could not cancel the scan.");
+    }
+  }
+
   return (
     <div>
 
@@ -73,6 +101,12 @@ export default function SimpleScanPanel({ onScanComplete }) {
         >
           {running ? `Scanning ${progress}%` : 'Start Scan'}
         </button>
+
+        {running && jobId && (
+          <button onClick={stopScan} className="btn-secondary">
+            Cancel
+          </button>
+        )}
       </div>
 
       {/* Progress Bar */}
@@ -1,20 +1,79 @@
 import axios from 'axios'
 
-export async function fetchJobs() {
-  const res = await axios.get('/api/jobs')
+// Columns the list views need; the full row comes from fetchJob
+export const LIST_FIELDS = ['id', 'company', 'role', 'status', 'date_applied']
+
+// Fetch one page of jobs. Returns { jobs, next_cursor }; pass next_cursor
+// back as `cursor` to get the following page.
+export async function fetchJobs({ status, company, dateFrom, dateTo, sort = 'date_applied',
+                                  order = 'desc', limit = 50, cursor, fields = LIST_FIELDS } = {}) {
+  const params = { sort, order, limit, fields: fields.join(',') }
+  if (status && status !== 'all') params.status = status
+  if (company) params.company = company
+  if (dateFrom) params.date_from = dateFrom
+  if (dateTo) params.date_to = dateTo
+  if (cursor) params.cursor = cursor
+  const res = await axios.get('/api/jobs', { params })
+  return res.data
+}
+
+// What changed after a sync_cursor from fetchJobs (or a cursor from here):
+// { jobs: [changed rows], deleted: [ids], cursor, more }. Unchanged lists
+// come back as 304s, so polling this is cheap.
+export async function fetchJobChanges(since) {
+  const res = await axios.get('/api/jobs', { params: { since } })
+  return res.data
+}
+
+export async function fetchJob(id) {
+  const res = await axios.get(`/api/job/${id}`)
+  return res.data
+}
+
+export async function fetchJobTimeline(id) {
+  const res = await axios.get(`/api/job/${id}/timeline`)
   return res.data
 }
 
+// Ranked full-text search; each result carries a `snippet` with <mark>ed hits
+export async function searchJobs(q, { status, limit = 50 } = {}) {
+  const params = { q, limit }
+  if (status && status !== 'all') params.status = status
+  const res = await axios.get('/api/search', { params })
+  return res.data
+}
+
+// Export downloads stream straight from the server, so link to them rather than fetch
+export function exportUrl(format = 'xlsx') {
+  return `/api/export?format=${format}`
+}
+
 export async function fetchStats() {
   const res = await axios.get('/api/stats')
   return res.data
 }
 
-export async function startScan(days_back) {
-  const res = await axios.post('/api/scan', { days_back })
+export async function startScan(days_back, mode = 'full') {
+  const res = await axios.post('/api/scan', { days_back, mode })
   return res.data
 }
 
+export async function cancelScan(jobId) {
+  const res = await axios.post(`/api/scan/${jobId}/cancel`)
+  return res.data
+}
+
+// Live scan updates: `status` on connect, then `queued`, `started`, `progress`,
+// `email`, `jobs` (newly saved rows), `complete`, `cancelled` and `failed`.
+// Each carries JSON data.
+export function openScanEvents(handlers) {
+  const source = new EventSource('/api/scan/events')
+  for (const [type, handler] of Object.entries(handlers)) {
+    source.addEventListener(type, (e) => handler(JSON.parse(e.data)))
+  }
+  return source
+}
+
 export async function fetchScanStatus() {
   const res = await axios.get('/api/scan/status')
   return res.data
@@ -0,0 +1,167 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PREFIX = 'job_tracker_'
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+_lock = threading.Lock()
+_registry = []
+# Per-scan totals of the scan running in this context, see scan_breakdown()
+_breakdown = ContextVar('scan_breakdown', default=None)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_string(key):
+    """Readable form of a series' labels, e.g. call=messages.list"""
+    return ','.join(f'{name}={value}' for name, value in key)
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+class Metric:
+    """A named family of series, one per set of label values.
+    
+    Everything recorded also goes into the breakdown of the scan running
+    in the caller's context, if any.
+    """
+    kind = None
+    
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+        _registry.append(self)
+    
+    def _record(self, value, labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._add(key, value)
+            breakdown = _breakdown.get()
+            if breakdown is not None:
+                entry = breakdown.setdefault(self.name, {}).setdefault(label_string(key), {'count': 0, 'sum': 0})
+                entry['count'] += 1
+                entry['sum'] += value
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        self._record(amount, labels)
+    
+    def snapshot(self):
+        """Copy of every series: labels -> value"""
+        with _lock:
+            return {label_string(key): value for key, value in self._series.items()}
+    
+    def _add(self, key, value):
+        self._series[key] = self._series.get(key, 0) + value
+    
+    def _lines(self):
+        for key, value in sorted(self._series.items()):
+            yield f'{PREFIX}{self.name}{format_labels(key)} {value}'
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+    
+    def observe(self, value, **labels):
+        self._record(value, labels)
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the `with` block takes, in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def snapshot(self):
+        """Copy of every series: labels -> (per-bucket counts, sum, count)"""
+        with _lock:
+            return {label_string(key): (list(counts), total, count)
+                    for key, (counts, total, count) in self._series.items()}
+    
+    def _add(self, key, value):
+        series = self._series.get(key)
+        if series is None:
+            # Per-bucket counts (the last is +Inf), then sum and count
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+    
+    def _lines(self):
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield f'{PREFIX}{self.name}_bucket{format_labels(key + (("le", bound),))} {cumulative}'
+            yield f'{PREFIX}{self.name}_sum{format_labels(key)} {total}'
+            yield f'{PREFIX}{self.name}_count{format_labels(key)} {count}'
+
+GMAIL_REQUEST_SECONDS = Histogram(
+    'gmail_request_seconds', 'Gmail API round trips, by call')
+GMAIL_QUOTA_WAIT_SECONDS = Counter(
+    'gmail_quota_wait_seconds_total', 'Time spent waiting for Gmail API quota, by account')
+EMAIL_DECODE_SECONDS = Histogram(
+    'email_decode_seconds', 'Time to decode one email body')
+OLLAMA_REQUEST_SECONDS = Histogram(
+    'ollama_request_seconds', 'Ollama generate requests, by outcome')
+OLLAMA_PROMPT_TOKENS = Histogram(
+    'ollama_prompt_tokens', 'Prompt tokens per Ollama request', TOKEN_BUCKETS)
+OLLAMA_EVAL_TOKENS = Histogram(
+    'ollama_eval_tokens', 'Generated tokens per Ollama request', TOKEN_BUCKETS)
+OLLAMA_PROMPT_EVAL_SECONDS = Counter(
+    'ollama_prompt_eval_seconds_total', 'Time Ollama reports spending on prompt processing')
+OLLAMA_EVAL_SECONDS = Counter(
+    'ollama_eval_seconds_total', 'Time Ollama reports spending on generating tokens')
+LLM_PARSE_FAILURES = Counter(
+    'llm_parse_failures_total', 'Model replies that could not be parsed, by prompt kind')
+LLM_REPAIRS = Counter(
+    'llm_repairs_total', 'Follow-up requests for invalid extraction fields, by result')
+TEMPLATE_LOOKUPS = Counter(
+    'template_lookups_total', 'Emails checked against learned sender templates, by result')
+DB_WRITE_SECONDS = Histogram(
+    'db_write_seconds', 'Database write transactions, by operation')
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f'# HELP {PREFIX}{metric.name} {metric.help}')
+            lines.append(f'# TYPE {PREFIX}{metric.name} {metric.kind}')
+            lines.extend(metric._lines())
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def scan_breakdown():
+    """Collect what a scan records into a dict of metric -> labels -> count and sum.
+    
+    Covers the calling thread and any work it hands to other threads
+    under a copy of its context (contextvars.copy_context().run), so
+    scans running side by side don't mix their numbers.
+    """
+    breakdown = {}
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+def current_breakdown():
+    """The breakdown being collected in this context, or None"""
+    return _breakdown.get()
@@ -0,0 +1,125 @@
+import re
+import config
+
+# Built once at import; a single alternation regex scans each email in one pass
+JOB_PATTERN = re.compile(
+    '|'.join(re.escape(keyword) for keyword in config.JOB_KEYWORDS), re.IGNORECASE
+)
+PROMO_PATTERN = re.compile(
+    '|'.join(re.escape(keyword) for keyword in config.PROMO_KEYWORDS), re.IGNORECASE
+)
+
+# Words that only show up in real hiring mail (unlike "noreply" or "linkedin")
+STRONG_JOB_PATTERN = re.compile(
+    r'\b(applications?|applied|applying|interview\w*|assessment|candidate|candidacy|'
+    r'position|recruit\w*|hiring|resume|offer letter)\b',
+    re.IGNORECASE
+)
+MARKETING_SENDER_PATTERN = re.compile(
+    r'^(deals?|promo\w*|offers?|marketing|newsletters?|news|sales|shop)@', re.IGNORECASE
+)
+
+CONFIRMATION_PATTERN = re.compile(
+    r"thank(s| you) for (applying|your application)|"
+    r"application (was |has been )?(received|submitted)|"
+    r"we('ve| have) received your application",
+    re.IGNORECASE
+)
+REJECTION_PATTERN = re.compile(
+    r"not (be )?mov(e|ing) forward|decided to (pursue|move forward with) other|"
+    r"no longer (under consideration|being considered)|position has been filled|"
+    r"unfortunately,? (we|after careful)",
+    re.IGNORECASE
+)
+
+ROLE_AT_COMPANY_PATTERN = re.compile(
+    r"\b(?:for|to) (?:the )?(?!applying\b|your\b)(?P<role>[^,:;!|]+?)(?: position| role| job| opening)? at "
+    r"(?P<company>[^,:;!|]+?)\s*[!.]?$",
+    re.IGNORECASE
+)
+ROLE_IN_BODY_PATTERN = re.compile(
+    r"\b(?:for|to) the (?P<role>[A-Z][\w/&,\- ]{2,60}?) (?:position|role|opening)\b"
+)
+
+SENDER_PATTERN = re.compile(r'^\s*"?(?P<name>[^"<]*?)"?\s*<(?P<address>[^>]+)>\s*$')
+SENDER_NAME_SUFFIXES = re.compile(
+    r'\s+(careers?|recruiting|recruitment|talent( acquisition)?|jobs|hiring( team)?|'
+    r'team|hr|people)$',
+    re.IGNORECASE
+)
+PERSONAL_DOMAINS = {'gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'icloud.com'}
+
+def parse_sender(sender):
+    """Split 'Name <user@domain>' into (name, address, domain)"""
+    match = SENDER_PATTERN.match(sender)
+    if match:
+        name, address = match.group('name').strip(), match.group('address').strip()
+    else:
+        name, address = '', sender.strip()
+    domain = address.rsplit('@', 1)[-1].lower() if '@' in address else ''
+    return name, address.lower(), domain
+
+def is_ats_domain(domain):
+    """True for applicant tracking systems that send on behalf of employers"""
+    return any(domain == ats or domain.endswith('.' + ats) for ats in config.ATS_SENDER_DOMAINS)
+
+def company_from_sender(sender):
+    """Best-effort company name from the sender, or None"""
+    name, address, domain = parse_sender(sender)
+    
+    if name:
+        company = SENDER_NAME_SUFFIXES.sub('', name).strip()
+        if company and not JOB_PATTERN.fullmatch(company):
+            return company
+    
+    if domain and not is_ats_domain(domain) and domain not in PERSONAL_DOMAINS:
+        label = domain.split('.')[-2] if domain.count('.') else domain
+        return label.capitalize()
+    
+    return None
+
+def extract_company_role(subject, sender, body):
+    """Pull (company, role) from a templated subject/body, or (None, None)"""
+    match = ROLE_AT_COMPANY_PATTERN.search(subject)
+    if match:
+        return match.group('company').strip(), match.group('role').strip()
+    
+    role_match = ROLE_IN_BODY_PATTERN.search(body[:2000])
+    company = company_from_sender(sender)
+    if role_match and company:
+        return company, role_match.group('role').strip()
+    
+    return None, None
+
+def classify_email(email_data):
+    """Decide high-confidence cases without the LLM.
+    
+    Returns an extraction dict shaped like the LLM's (company, role, status,
+    is_job_related), or None when the email is ambiguous and must be
+    escalated to the model.
+    """
+    subject = email_data.get('subject', '')
+    sender = email_data.get('from', '')
+    body = email_data.get('body', '')
+    
+    _, address, domain = parse_sender(sender)
+    text = f"{subject}\n{body[:2000]}"
+    has_job_words = STRONG_JOB_PATTERN.search(text) is not None
+    
+    # Obvious promotions
+    if not has_job_words and not is_ats_domain(domain):
+        if PROMO_PATTERN.search(subject) or MARKETING_SENDER_PATTERN.match(address):
+            return {'company': '', 'role': '', 'status': 'Other', 'is_job_related': False}
+    
+    if REJECTION_PATTERN.search(text) and has_job_words:
+        status = 'Rejected'
+    elif CONFIRMATION_PATTERN.search(text):
+        status = 'Applied'
+    else:
+        return None
+    
+    company, role = extract_company_role(subject, sender, body)
+    if not company or not role:
+        return None
+    
+    return {'company': company, 'role': role, 'status': status, 'is_job_related': True}
@@ -0,0 +1,85 @@
+import json
+import threading
+from collections import deque
+import config
+
+class EventBus:
+    """Thread-safe scan state plus a stream of scan events.
+    
+    The scan thread changes the state and publishes events through the
+    bus; request threads read snapshots or wait for new events. Recent
+    events are kept so a client that reconnects with Last-Event-ID can
+    catch up on what it missed.
+    """
+    
+    def __init__(self, state, history=None):
+        self._condition = threading.Condition()
+        self._state = dict(state)
+        self._events = deque(maxlen=history or config.SCAN_EVENT_HISTORY)
+        self._last_id = 0
+    
+    def __getitem__(self, key):
+        with self._condition:
+            return self._state[key]
+    
+    @property
+    def last_id(self):
+        with self._condition:
+            return self._last_id
+    
+    def snapshot(self):
+        """Copy of the current state"""
+        with self._condition:
+            return dict(self._state)
+    
+    def publish(self, event_type, data):
+        """Add an event and wake everyone waiting for one"""
+        with self._condition:
+            self._last_id += 1
+            self._events.append({'id': self._last_id, 'type': event_type, 'data': data})
+            self._condition.notify_all()
+    
+    def update(self, event_type='progress', **changes):
+        """Change the state and publish the new state as an event"""
+        with self._condition:
+            self._state.update(changes)
+            self.publish(event_type, dict(self._state))
+    
+    def update_account(self, account, event_type='progress', **changes):
+        """Change one account's scan state and publish the combined state.
+        
+        Scans of several accounts run at once. `accounts` keeps each one's
+        state; the top-level fields add them up: running while any scan
+        is, progress averaged over the running scans, and the job, account
+        and message of the latest change.
+        """
+        with self._condition:
+            accounts = dict(self._state.get('accounts', {}))
+            state = accounts[account] = dict(accounts.get(account, {}), **changes)
+            running = [entry for entry in accounts.values() if entry.get('running')]
+            combined = running or [state]
+            self.update(
+                event_type,
+                accounts=accounts,
+                account=account,
+                job_id=state.get('job_id'),
+                running=bool(running),
+                progress=sum(entry.get('progress', 0) for entry in combined) // len(combined),
+                message=state.get('message', ''),
+                total_emails=sum(entry.get('total_emails', 0) for entry in combined),
+                processed=sum(entry.get('processed', 0) for entry in combined)
+            )
+    
+    def wait_for_events(self, after_id, timeout=None):
+        """Events newer than `after_id`, waiting up to `timeout` seconds for one.
+        
+        Returns an empty list on timeout. If the client is so far behind
+        that events were dropped, it gets what is still kept.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._last_id > after_id, timeout)
+            return [event for event in self._events if event['id'] > after_id]
+
+def format_sse(event):
+    """Encode an event in the text/event-stream wire format"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -0,0 +1,115 @@
+import threading
+from collections import deque
+import config
+import database
+import metrics
+
+class ScanCancelled(Exception):
+    """Raised inside a scan that stopped because it was cancelled"""
+
+class ScanRunner:
+    """Runs scans as background jobs on a fixed pool of worker threads.
+    
+    Jobs are kept in the scan_jobs table and move from queued to running
+    to cancelled, done or failed. Queued jobs start in order, but two
+    scans of the same account never run at once since they share its
+    checkpoint. Cancelling a running job is cooperative: the scan
+    function gets a `cancelled()` callable to check between emails and
+    raises ScanCancelled when it returns True. Each job runs inside its
+    own metrics.scan_breakdown().
+    """
+    
+    def __init__(self, run, workers=None):
+        self._run = run  # run(job, cancelled) -> dict of scan_jobs fields to save
+        self._workers = workers or config.SCAN_WORKERS
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._active = {}  # Running job id -> account
+        self._cancelled = set()
+        self._threads = []
+    
+    def start(self):
+        """Start the workers, once, and requeue jobs a previous process left unfinished"""
+        with self._condition:
+            if self._threads:
+                return
+            
+            for job in database.get_unfinished_scan_jobs():
+                if job['cancel_requested']:
+                    database.update_scan_job(job['id'], 'finished_at', state='cancelled')
+                else:
+                    database.update_scan_job(job['id'], state='queued')
+                    self._queue.append(job)
+            
+            for number in range(self._workers):
+                thread = threading.Thread(target=self._work, name=f'scan-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def submit(self, account, days_back, mode):
+        """Queue a scan and return its job"""
+        self.start()
+        job = database.create_scan_job(account, days_back, mode)
+        with self._condition:
+            self._queue.append(job)
+            self._condition.notify_all()
+        return job
+    
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns it, or None if there is no such job.
+        
+        A queued job is cancelled at once. A running one is only flagged
+        and stops at its next check.
+        """
+        with self._condition:
+            queued = next((job for job in self._queue if job['id'] == job_id), None)
+            if queued:
+                self._queue.remove(queued)
+                database.update_scan_job(job_id, 'finished_at', state='cancelled')
+            elif job_id in self._active:
+                self._cancelled.add(job_id)
+                database.update_scan_job(job_id, cancel_requested=1)
+        return database.get_scan_job(job_id)
+    
+    def has_jobs(self, account):
+        """True if the account has a scan queued or running"""
+        with self._condition:
+            return (account in self._active.values()
+                    or any(job['account'] == account for job in self._queue))
+    
+    def is_cancelled(self, job_id):
+        with self._condition:
+            return job_id in self._cancelled
+    
+    def _next_job(self):
+        """Wait for a queued job whose account has no scan running, and claim it"""
+        with self._condition:
+            while True:
+                busy = set(self._active.values())
+                job = next((job for job in self._queue if job['account'] not in busy), None)
+                if job:
+                    self._queue.remove(job)
+                    self._active[job['id']] = job['account']
+                    return job
+                self._condition.wait()
+    
+    def _work(self):
+        while True:
+            job = self._next_job()
+            job_id = job['id']
+            database.update_scan_job(job_id, 'started_at', state='running')
+            
+            try:
+                with metrics.scan_breakdown():
+                    fields = dict(self._run(job, lambda: self.is_cancelled(job_id)) or {}, state='done')
+            except ScanCancelled:
+                fields = {'state': 'cancelled', 'message': 'Scan cancelled'}
+            except Exception as e:
+                print(f"Scan job {job_id} failed: {e}")
+                fields = {'state': 'failed', 'message': f'Error: {str(e)}'}
+            
+            database.update_scan_job(job_id, 'finished_at', **fields)
+            with self._condition:
+                del self._active[job_id]
+                self._cancelled.discard(job_id)
+                self._condition.notify_all()
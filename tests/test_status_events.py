@@ -0,0 +1,50 @@
+"""Application dates worked out from status events, whatever order they arrive in."""
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+def job(status, date, message_id):
+    return {'company': 'Google', 'role': 'Software Engineer', 'status': status,
+            'email_date': date, 'message_id': message_id}
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DB_FILE', str(tmp_path / 'jobs.db'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    yield database
+    database.close_connection()
+
+def dates(db):
+    row = db.get_connection().execute('SELECT date_applied, first_response_at FROM job_applications').fetchone()
+    return tuple(row)
+
+def test_response_saved_before_application(db):
+    # Newest mail is scanned first: the interview invitation, then the confirmation
+    db.add_jobs_to_db([job('Interview', '2025-10-10', 'invite')])
+    db.add_jobs_to_db([job('Applied', '2025-10-01', 'confirmation')])
+    
+    assert dates(db) == ('2025-10-01', '2025-10-10')
+    assert db.get_stats()['avg_days_to_response'] == 9.0
+
+def test_in_order_and_rescanned(db):
+    db.add_jobs_to_db([job('Applied', '2025-10-01', 'confirmation')])
+    db.add_jobs_to_db([job('Interview', '2025-10-10', 'invite')])
+    cursor = db.get_change_cursor()
+    db.add_jobs_to_db([job('Interview', '2025-10-10', 'invite'), job('Applied', '2025-10-01', 'confirmation')])
+    
+    assert dates(db) == ('2025-10-01', '2025-10-10')
+    assert db.get_change_cursor() == cursor
+
+def test_response_before_application_is_not_a_response(db):
+    db.add_jobs_to_db([job('Rejected', '2025-09-01', 'old-rejection')])
+    db.add_jobs_to_db([job('Applied', '2025-10-01', 'confirmation')])
+    
+    assert dates(db) == ('2025-10-01', None)
@@ -0,0 +1,21 @@
+"""Production entry point: python wsgi.py
+
+Serves the app with waitress instead of Flask's development server.
+Waitress runs one process with a pool of threads, so the long-lived
+/api/scan/events streams don't block other requests. It must stay a
+single process: the scan event bus and scan_runner live in memory.
+"""
+import config
+import database
+from app import app, scan_runner
+
+# Schema setup is an explicit step, done before the scan workers start
+database.init_database()
+scan_runner.start()
+
+if __name__ == '__main__':
+    from waitress import serve
+    
+    print(f"🌐 Job Tracker on http://localhost:{config.SERVER_PORT} "
+          f"({config.SERVER_THREADS} threads, {config.SCAN_WORKERS} scan workers)")
+    serve(app, host=config.SERVER_HOST, port=config.SERVER_PORT, threads=config.SERVER_THREADS)